@@ -3,9 +3,28 @@ from rest_framework import serializers, exceptions
 
 
 class UserSerializer(serializers.ModelSerializer):
+    # the denormalized counts of accounts.models.UserStats, read through the
+    # cache, UserService.load_stats loads them for a list of users at once
+    followers_count = serializers.IntegerField(
+        source='cached_stats.followers_count',
+    )
+    followings_count = serializers.IntegerField(
+        source='cached_stats.followings_count',
+    )
+    tweets_count = serializers.IntegerField(
+        source='cached_stats.tweets_count',
+    )
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'email')
+        fields = (
+            'id',
+            'username',
+            'email',
+            'followers_count',
+            'followings_count',
+            'tweets_count',
+        )
 
 
 class UserSerializerForTweet(serializers.ModelSerializer):
@@ -63,6 +63,8 @@ class AccountApiTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertNotEqual(response.data['user'], None)
         self.assertEqual(response.data['user']['email'], 'tester@gmail.com')
+        self.assertEqual(response.data['user']['followers_count'], 0)
+        self.assertEqual(response.data['user']['tweets_count'], 0)
 
         response = self.client.get(LOGIN_STATUS_URL)
         self.assertEqual(response.data['has_logged_in'], True)
@@ -3,6 +3,7 @@ from accounts.api.serializers import (
     SignupSerializer,
     UserSerializer,
 )
+from accounts.services import UserService
 from django.contrib.auth.models import User
 from rest_framework import permissions
 from rest_framework import viewsets
@@ -24,6 +25,12 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def paginate_queryset(self, queryset):
+        users = super().paginate_queryset(queryset)
+        # the counts of the whole page are read with one cache get_many
+        UserService.load_stats(users)
+        return users
+
 
 class AccountViewSet(viewsets.ViewSet):
     permission_classes = (AllowAny,)
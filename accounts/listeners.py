@@ -0,0 +1,7 @@
+def create_user_stats(sender, instance, created, **kwargs):
+    # import here to avoid the circular import with accounts.models
+    from accounts.models import UserStats
+
+    if not created:
+        return
+    UserStats.objects.get_or_create(user_id=instance.id)
@@ -0,0 +1,99 @@
+from accounts.models import UserStats
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from friendships.models import Friendship
+from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
+
+COUNT_FIELDS = ('followers_count', 'followings_count', 'tweets_count')
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill the UserStats of every user, and fix the followers, '
+        'followings and tweets counts which have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='How many users are checked in one round.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = 0
+        last_id = 0
+        chunk_size = options['chunk_size']
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            fixed += self.reconcile(user_ids)
+            last_id = user_ids[-1]
+        self.stdout.write('{} users fixed'.format(fixed))
+
+    def count_by(self, queryset, field, user_ids):
+        return dict(
+            queryset.filter(**{field + '__in': user_ids})
+            .values_list(field)
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+    def reconcile(self, user_ids):
+        """
+        Count a chunk of users with one GROUP BY query per count, create the
+        missing rows and update the drifted ones only.
+        """
+        counts_maps = {
+            'followers_count': self.count_by(
+                Friendship.objects.all(),
+                'to_user_id',
+                user_ids,
+            ),
+            'followings_count': self.count_by(
+                Friendship.objects.all(),
+                'from_user_id',
+                user_ids,
+            ),
+            'tweets_count': self.count_by(
+                Tweet.objects.all(),
+                'user_id',
+                user_ids,
+            ),
+        }
+        stats = {
+            row[0]: row[1:]
+            for row in UserStats.objects.filter(user_id__in=user_ids)
+            .values_list('user_id', *COUNT_FIELDS)
+        }
+
+        fixed = 0
+        missing_stats = []
+        for user_id in user_ids:
+            counts = {
+                field: counts_maps[field].get(user_id, 0)
+                for field in COUNT_FIELDS
+            }
+            if user_id not in stats:
+                missing_stats.append(UserStats(user_id=user_id, **counts))
+                continue
+            if tuple(counts.values()) == stats[user_id]:
+                continue
+            UserStats.objects.filter(user_id=user_id).update(**counts)
+            MemcachedHelper.invalidate_cached_object(UserStats, user_id)
+            fixed += 1
+        UserStats.objects.bulk_create(missing_stats, ignore_conflicts=True)
+        for user_stats in missing_stats:
+            MemcachedHelper.invalidate_cached_object(
+                UserStats,
+                user_stats.user_id,
+            )
+        return fixed + len(missing_stats)
@@ -0,0 +1,75 @@
+from django.db import migrations
+from django.db.models import Count
+
+CHUNK_SIZE = 1000
+
+
+def count_by(queryset, field, user_ids):
+    return dict(
+        queryset.filter(**{field + '__in': user_ids})
+        .values_list(field)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def backfill_user_stats(apps, schema_editor):
+    # The users created before UserStats have no stats row, their counts would
+    # read as 0 until reconcile_user_stats runs, e.g. a popular account would
+    # be pushed to all its followers. The missing rows are counted here, a
+    # chunk of users at a time.
+    User = apps.get_model('auth', 'User')
+    UserStats = apps.get_model('accounts', 'UserStats')
+    Friendship = apps.get_model('friendships', 'Friendship')
+    Tweet = apps.get_model('tweets', 'Tweet')
+
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:CHUNK_SIZE]
+        )
+        if not user_ids:
+            break
+        last_id = user_ids[-1]
+        existing_ids = set(
+            UserStats.objects.filter(user_id__in=user_ids)
+            .values_list('user_id', flat=True)
+        )
+        user_ids = [
+            user_id
+            for user_id in user_ids
+            if user_id not in existing_ids
+        ]
+        if not user_ids:
+            continue
+        followers = count_by(Friendship.objects.all(), 'to_user_id', user_ids)
+        followings = count_by(
+            Friendship.objects.all(),
+            'from_user_id',
+            user_ids,
+        )
+        tweets = count_by(Tweet.objects.all(), 'user_id', user_ids)
+        UserStats.objects.bulk_create([
+            UserStats(
+                user_id=user_id,
+                followers_count=followers.get(user_id, 0),
+                followings_count=followings.get(user_id, 0),
+                tweets_count=tweets.get(user_id, 0),
+            )
+            for user_id in user_ids
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        ('friendships', '0002_auto_20220603_1510'),
+        ('tweets', '0003_denormalized_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
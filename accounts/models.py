@@ -0,0 +1,50 @@
+from accounts.listeners import create_user_stats
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from utils.memcached_helper import MemcachedHelper, invalidate_object_cache
+
+
+class UserStats(models.Model):
+    # The counts shown on the profile of a user, so that they are not counted
+    # over Friendship and Tweet on every read. They are maintained by
+    # friendships/listeners.py and tweets/listeners.py with atomic F()
+    # updates, `manage.py reconcile_user_stats` fixes the drift.
+    #
+    # The primary key is the id of the user, the stats are read through the
+    # cache by the user id
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    followers_count = models.IntegerField(default=0)
+    followings_count = models.IntegerField(default=0)
+    tweets_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '{} stats'.format(self.user_id)
+
+
+def get_cached_stats(user):
+    # Kept on the user instance, the serializer reads several counts of the
+    # same user
+    if not hasattr(user, '_cached_stats'):
+        user._cached_stats = MemcachedHelper.get_object_through_cache(
+            UserStats,
+            user.id,
+        ) or UserStats(user_id=user.id)
+    return user._cached_stats
+
+
+User.cached_stats = property(get_cached_stats)
+
+
+# Users are cached by utils.memcached_helper when rendering tweets, delete the
+# cached user when the user changes
+post_save.connect(invalidate_object_cache, sender=User)
+post_delete.connect(invalidate_object_cache, sender=User)
+post_save.connect(create_user_stats, sender=User)
+post_save.connect(invalidate_object_cache, sender=UserStats)
+post_delete.connect(invalidate_object_cache, sender=UserStats)
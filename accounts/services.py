@@ -0,0 +1,20 @@
+from accounts.models import UserStats
+from utils.memcached_helper import MemcachedHelper
+
+
+class UserService(object):
+
+    @classmethod
+    def load_stats(cls, users):
+        """
+        Set the cached stats of every user in a list with one cache get_many,
+        UserSerializer reads the counts without a query per user.
+        """
+        stats = MemcachedHelper.get_objects_through_cache(
+            UserStats,
+            {user.id for user in users},
+        )
+        for user in users:
+            user._cached_stats = stats.get(user.id) or UserStats(
+                user_id=user.id,
+            )
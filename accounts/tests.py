@@ -0,0 +1,71 @@
+from accounts.models import UserStats
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from friendships.models import Friendship
+from io import StringIO
+from testing.testcases import TestCase
+
+
+class UserStatsTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.cosmo = self.create_user('cosmo')
+
+    def test_denormalized_counts(self):
+        self.assertEqual(UserStats.objects.count(), 2)
+        friendship = Friendship.objects.create(
+            from_user=self.cosmo,
+            to_user=self.lucky,
+        )
+        tweet = self.create_tweet(self.lucky)
+        lucky_stats = UserStats.objects.get(user=self.lucky)
+        cosmo_stats = UserStats.objects.get(user=self.cosmo)
+        self.assertEqual(lucky_stats.followers_count, 1)
+        self.assertEqual(lucky_stats.followings_count, 0)
+        self.assertEqual(lucky_stats.tweets_count, 1)
+        self.assertEqual(cosmo_stats.followings_count, 1)
+
+        friendship.delete()
+        tweet.delete()
+        lucky_stats.refresh_from_db()
+        self.assertEqual(lucky_stats.followers_count, 0)
+        self.assertEqual(lucky_stats.tweets_count, 0)
+
+    def test_cached_stats(self):
+        Friendship.objects.create(from_user=self.cosmo, to_user=self.lucky)
+        lucky = User.objects.get(id=self.lucky.id)
+        self.assertEqual(lucky.cached_stats.followers_count, 1)
+
+        # read from the cache
+        lucky = User.objects.get(id=self.lucky.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(lucky.cached_stats.followers_count, 1)
+
+        # the cached stats are deleted when the counts change
+        Friendship.objects.create(from_user=self.lucky, to_user=self.cosmo)
+        lucky = User.objects.get(id=self.lucky.id)
+        self.assertEqual(lucky.cached_stats.followings_count, 1)
+
+    def test_reconcile_user_stats(self):
+        Friendship.objects.create(from_user=self.cosmo, to_user=self.lucky)
+        self.create_tweet(self.lucky)
+        # the counts drifted, and the stats of cosmo are missing
+        UserStats.objects.filter(user=self.lucky).update(
+            followers_count=5,
+            tweets_count=0,
+        )
+        UserStats.objects.filter(user=self.cosmo).delete()
+
+        out = StringIO()
+        call_command('reconcile_user_stats', chunk_size=1, stdout=out)
+        self.assertEqual('2 users fixed' in out.getvalue(), True)
+        lucky_stats = UserStats.objects.get(user=self.lucky)
+        cosmo_stats = UserStats.objects.get(user=self.cosmo)
+        self.assertEqual(lucky_stats.followers_count, 1)
+        self.assertEqual(lucky_stats.tweets_count, 1)
+        self.assertEqual(cosmo_stats.followings_count, 1)
+
+        out = StringIO()
+        call_command('reconcile_user_stats', stdout=out)
+        self.assertEqual('0 users fixed' in out.getvalue(), True)
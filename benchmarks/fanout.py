@@ -0,0 +1,226 @@
+from benchmarks.services import SeedService
+from django.db import connection, transaction
+from django.test import override_settings
+from friendships.models import Friendship
+from friendships.services import FriendshipService
+from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
+from tweets.models import Tweet
+from utils.snowflake import generate_ids
+import sys
+import time
+import tracemalloc
+
+
+def iter_chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class FanoutBenchmark(object):
+    # Every strategy writes one newsfeed per follower of the author of the
+    # tweet, they only differ in how the followers are read and how the rows
+    # are inserted.
+    STRATEGIES = (
+        'users_list',
+        'chunked_bulk_create',
+        'streaming_ids',
+        'raw_insert',
+    )
+
+    @classmethod
+    def fanout_users_list(cls, tweet, chunk_size, batch_size):
+        # the original fanout: every follower is loaded as a User and all the
+        # newsfeeds go to one bulk_create
+        followers = FriendshipService.get_followers(tweet.user)
+        NewsFeed.objects.bulk_create([
+            NewsFeed(user=follower, tweet=tweet, created_at=tweet.created_at)
+            for follower in followers
+        ])
+
+    @classmethod
+    def fanout_chunked_bulk_create(cls, tweet, chunk_size, batch_size):
+        # the same list of users, inserted batch_size rows per INSERT
+        followers = FriendshipService.get_followers(tweet.user)
+        NewsFeed.objects.bulk_create(
+            [
+                NewsFeed(
+                    user=follower,
+                    tweet=tweet,
+                    created_at=tweet.created_at,
+                )
+                for follower in followers
+            ],
+            batch_size=batch_size,
+        )
+
+    @classmethod
+    def fanout_streaming_ids(cls, tweet, chunk_size, batch_size):
+        # the fanout job as it is, the follower ids are streamed chunk by
+        # chunk with values_list and every chunk has its own bulk_create. The
+        # author is never pulled here, whatever the followers count.
+        with override_settings(
+            NEWSFEED_FANOUT_CHUNK_SIZE=chunk_size,
+            NEWSFEED_FANOUT_BATCH_SIZE=batch_size,
+            NEWSFEED_PUSH_MAX_FOLLOWERS=sys.maxsize,
+        ):
+            NewsFeedService.batch_fanout_to_followers(tweet)
+
+    @classmethod
+    def fanout_raw_insert(cls, tweet, chunk_size, batch_size):
+        # the streamed follower ids written with hand-written multi-row
+        # INSERTs, no NewsFeed instance is created at all
+        fields = ('id', 'user_id', 'tweet_id', 'created_at')
+        quote_name = connection.ops.quote_name
+        sql = '{} {} ({}) VALUES '.format(
+            connection.ops.insert_statement(ignore_conflicts=True),
+            quote_name(NewsFeed._meta.db_table),
+            ', '.join(quote_name(field) for field in fields),
+        )
+        created_at = connection.ops.adapt_datetimefield_value(
+            tweet.created_at,
+        )
+        # SQLite limits the number of parameters of a statement
+        batch_size = min(
+            batch_size,
+            connection.ops.bulk_batch_size(fields, range(batch_size)),
+        )
+        follower_ids = FriendshipService.iter_follower_ids(
+            tweet.user_id,
+            chunk_size,
+        )
+        with connection.cursor() as cursor:
+            for user_ids in iter_chunks(follower_ids, batch_size):
+                params = []
+                for newsfeed_id, user_id in zip(
+                    generate_ids(len(user_ids)),
+                    user_ids,
+                ):
+                    params.extend((newsfeed_id, user_id, tweet.id, created_at))
+                cursor.execute(
+                    sql + ', '.join(['(%s, %s, %s, %s)'] * len(user_ids)),
+                    params,
+                )
+
+    @classmethod
+    def create_author(cls, followers_count, batch_size):
+        user_ids = SeedService.create_users(
+            followers_count + 1,
+            'fanout{}_'.format(followers_count),
+            batch_size,
+        )
+        author_id, follower_ids = user_ids[0], user_ids[1:]
+        Friendship.objects.bulk_create(
+            [
+                Friendship(from_user_id=user_id, to_user_id=author_id)
+                for user_id in follower_ids
+            ],
+            batch_size=batch_size,
+        )
+        return author_id
+
+    @classmethod
+    def measure(cls, strategy, tweet, chunk_size, batch_size, trace_memory):
+        """
+        Run the strategy in a savepoint which is rolled back, every run
+        starts from the same tables. Return (seconds, peak bytes, rows).
+        """
+        fanout = getattr(cls, 'fanout_' + strategy)
+        with transaction.atomic():
+            peak = None
+            if trace_memory:
+                tracemalloc.start()
+            try:
+                start = time.perf_counter()
+                fanout(tweet, chunk_size, batch_size)
+                duration = time.perf_counter() - start
+                if trace_memory:
+                    peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                if trace_memory:
+                    tracemalloc.stop()
+            rows = NewsFeed.objects.filter(tweet=tweet).count()
+            transaction.set_rollback(True)
+        return duration, peak, rows
+
+    @classmethod
+    def run(
+        cls,
+        followers_counts,
+        strategies=STRATEGIES,
+        chunk_size=1000,
+        batch_size=500,
+    ):
+        """
+        Measure every strategy for every followers count. tracemalloc slows
+        the code down several times, the wall time and the peak memory come
+        from two separate runs. Everything runs in a transaction which is
+        rolled back, the commit is not measured and nothing is left in the
+        database. Return one dict per (followers count, strategy).
+        """
+        results = []
+        with transaction.atomic():
+            for followers_count in followers_counts:
+                author_id = cls.create_author(followers_count, batch_size)
+                tweet = Tweet.objects.create(
+                    user_id=author_id,
+                    content='fanout benchmark',
+                )
+                for strategy in strategies:
+                    results.append(cls.run_strategy(
+                        strategy,
+                        tweet,
+                        followers_count,
+                        chunk_size,
+                        batch_size,
+                    ))
+            transaction.set_rollback(True)
+        return results
+
+    @classmethod
+    def run_strategy(
+        cls,
+        strategy,
+        tweet,
+        followers_count,
+        chunk_size,
+        batch_size,
+    ):
+        result = {
+            'strategy': strategy,
+            'followers': followers_count,
+            'database': connection.vendor,
+        }
+        try:
+            seconds, _, rows = cls.measure(
+                strategy,
+                tweet,
+                chunk_size,
+                batch_size,
+                trace_memory=False,
+            )
+            _, peak, _ = cls.measure(
+                strategy,
+                tweet,
+                chunk_size,
+                batch_size,
+                trace_memory=True,
+            )
+        except Exception as e:
+            # e.g. too many SQL variables on SQLite or a statement larger
+            # than max_allowed_packet on MySQL, a result in itself
+            result['error'] = '{}: {}'.format(e.__class__.__name__, e)
+            return result
+        result.update({
+            'rows': rows,
+            'seconds': round(seconds, 6),
+            'rows_per_second': round(rows / seconds) if seconds else None,
+            'peak_memory_bytes': peak,
+        })
+        return result
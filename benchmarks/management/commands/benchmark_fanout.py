@@ -0,0 +1,84 @@
+from benchmarks.fanout import FanoutBenchmark
+from django.core.management.base import BaseCommand
+from django.db import connection
+from utils.time_helpers import utc_now
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the wall time, the peak memory and the rows per second of '
+        'the fanout strategies for growing followers counts. Run it once '
+        'with the SQLite settings and once with the MySQL settings to '
+        'compare the databases, nothing is left in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--followers',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000, 10000, 100000],
+            help='Followers counts to measure, e.g. 10 1000 1000000.',
+        )
+        parser.add_argument(
+            '--strategies',
+            nargs='+',
+            choices=FanoutBenchmark.STRATEGIES,
+            default=list(FanoutBenchmark.STRATEGIES),
+            help='Strategies to measure, all of them by default.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='How many follower ids are read in one query.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Max number of rows in one INSERT statement.',
+        )
+        parser.add_argument(
+            '--output',
+            default='fanout-benchmark.json',
+            help='Path of the JSON results.',
+        )
+
+    def handle(self, *args, **options):
+        results = FanoutBenchmark.run(
+            options['followers'],
+            strategies=options['strategies'],
+            chunk_size=options['chunk_size'],
+            batch_size=options['batch_size'],
+        )
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'created_at': utc_now().isoformat(),
+                'database': connection.vendor,
+                'chunk_size': options['chunk_size'],
+                'batch_size': options['batch_size'],
+                'results': results,
+            }, f, indent=2)
+
+        row_format = '{:>9} {:<20} {:>10} {:>12} {:>12}'
+        self.stdout.write(row_format.format(
+            'followers', 'strategy', 'seconds', 'rows/sec', 'peak KB',
+        ))
+        for result in results:
+            if 'error' in result:
+                self.stdout.write('{:>9} {:<20} {}'.format(
+                    result['followers'],
+                    result['strategy'],
+                    result['error'][:80],
+                ))
+                continue
+            self.stdout.write(row_format.format(
+                result['followers'],
+                result['strategy'],
+                '{:.4f}'.format(result['seconds']),
+                result['rows_per_second'],
+                result['peak_memory_bytes'] // 1024,
+            ))
+        self.stdout.write('Results written to {}'.format(options['output']))
@@ -0,0 +1,97 @@
+from benchmarks.services import BenchmarkService
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from utils.time_helpers import utc_now
+import json
+import logging
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the list endpoints through the url routes and report the '
+        'p50 / p95 / p99 latency and the query count of every endpoint, the '
+        'results are written as JSON so that runs can be compared. Seed the '
+        'database with `manage.py seed_social_graph` first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=100,
+            help='How many measured requests per endpoint.',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='How many requests per endpoint before measuring.',
+        )
+        parser.add_argument(
+            '--cold-cache',
+            action='store_true',
+            help='Clear the cache before every request.',
+        )
+        parser.add_argument(
+            '--username',
+            help=(
+                'Read as this user, by default the user who follows the '
+                'most users.'
+            ),
+        )
+        parser.add_argument(
+            '--output',
+            default='benchmark.json',
+            help='Path of the JSON results.',
+        )
+
+    def handle(self, *args, **options):
+        targets = BenchmarkService.get_default_targets()
+        if targets is None:
+            raise CommandError(
+                'Nothing to benchmark, run manage.py seed_social_graph first.',
+            )
+        user, tweet, celebrity = targets
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    'User {} does not exist.'.format(options['username']),
+                )
+
+        # SQLInstrumentationMiddleware logs every request, the cost of the
+        # logging is measured but the lines are not printed
+        logging.getLogger('twitter.sql').setLevel(logging.WARNING)
+        endpoints = BenchmarkService.get_endpoints(user, tweet, celebrity)
+        results = BenchmarkService.run(
+            user,
+            endpoints,
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            cold_cache=options['cold_cache'],
+        )
+
+        with open(options['output'], 'w') as f:
+            json.dump({
+                'created_at': utc_now().isoformat(),
+                'database': connection.vendor,
+                'username': user.username,
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'cold_cache': options['cold_cache'],
+                'endpoints': results,
+            }, f, indent=2)
+
+        self.stdout.write('{:<28} {:>9} {:>9} {:>9} {:>8}'.format(
+            'endpoint', 'p50 ms', 'p95 ms', 'p99 ms', 'queries',
+        ))
+        for name, result in results.items():
+            self.stdout.write('{:<28} {:>9} {:>9} {:>9} {:>8}'.format(
+                name,
+                result['p50_ms'],
+                result['p95_ms'],
+                result['p99_ms'],
+                result['queries_max'],
+            ))
+        self.stdout.write('Results written to {}'.format(options['output']))
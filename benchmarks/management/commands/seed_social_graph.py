@@ -0,0 +1,94 @@
+from benchmarks.services import SEED_PASSWORD, SeedService
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a production-shaped social graph for local load tests: '
+        'users with a power-law follower distribution, their tweets, '
+        'comments, likes and newsfeeds. Run it against a scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='How many users are created.',
+        )
+        parser.add_argument(
+            '--followings',
+            type=int,
+            default=20,
+            help='Mean number of users a user follows.',
+        )
+        parser.add_argument(
+            '--tweets',
+            type=int,
+            default=10,
+            help='Mean number of tweets per user.',
+        )
+        parser.add_argument(
+            '--comments',
+            type=int,
+            default=2,
+            help='Mean number of comments per tweet.',
+        )
+        parser.add_argument(
+            '--likes',
+            type=int,
+            default=5,
+            help='Mean number of likes per tweet.',
+        )
+        parser.add_argument(
+            '--exponent',
+            type=float,
+            default=1.0,
+            help=(
+                'Exponent of the power law, the higher the more followers '
+                'go to the most popular users.'
+            ),
+        )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Prefix of the usernames, change it to seed again.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed, the same seed generates the same graph.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Max number of rows in one INSERT statement.',
+        )
+
+    def handle(self, *args, **options):
+        # nothing is left behind when the seeding fails half way
+        with transaction.atomic():
+            summary = SeedService.seed(
+                options['users'],
+                followings=options['followings'],
+                tweets=options['tweets'],
+                comments=options['comments'],
+                likes=options['likes'],
+                exponent=options['exponent'],
+                prefix=options['prefix'],
+                random_seed=options['seed'],
+                batch_size=options['batch_size'],
+            )
+        for table, count in summary.items():
+            self.stdout.write('{} {} created'.format(count, table))
+        self.stdout.write(
+            'Log in as {}0 .. {}{} with the password "{}"'.format(
+                options['prefix'],
+                options['prefix'],
+                options['users'] - 1,
+                SEED_PASSWORD,
+            ),
+        )
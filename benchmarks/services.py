@@ -0,0 +1,423 @@
+from accounts.models import UserStats
+from comments.models import Comment
+from contextlib import ExitStack
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from friendships.models import Friendship
+from itertools import accumulate
+from likes.models import Like
+from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
+from tweets.models import Tweet
+from utils.middlewares import QueryCollector
+import math
+import random
+import time
+
+SEED_PASSWORD = 'generic password'
+
+
+class SeedService(object):
+    # Every table is written with bulk_create, which skips the post_save
+    # listeners. The denormalized counts (UserStats, likes_count and
+    # comments_count) are computed while the rows are generated and written
+    # with the rows, so the seeded graph passes `manage.py
+    # reconcile_user_stats` and `manage.py reconcile_counts` unchanged.
+
+    @classmethod
+    def seed(
+        cls,
+        users_count,
+        followings=20,
+        tweets=10,
+        comments=2,
+        likes=5,
+        exponent=1.0,
+        prefix='seed',
+        random_seed=0,
+        batch_size=1000,
+    ):
+        """
+        Generate users_count users with a power-law follower distribution:
+        the user of popularity rank r is followed with a probability
+        proportional to 1 / r ** exponent, so a few users have most of the
+        followers, like in production. followings, tweets, comments and likes
+        are the mean per user, per user, per tweet and per tweet. Return the
+        number of rows written per table.
+        """
+        rng = random.Random(random_seed)
+        user_ids = cls.create_users(users_count, prefix, batch_size)
+        edges = cls.create_friendships(
+            rng,
+            user_ids,
+            followings,
+            exponent,
+            batch_size,
+        )
+        tweets_counts = {
+            user_id: cls.random_count(rng, tweets)
+            for user_id in user_ids
+        }
+        cls.create_user_stats(user_ids, edges, tweets_counts, batch_size)
+
+        summary = {
+            'users': len(user_ids),
+            'friendships': len(edges),
+            'tweets': 0,
+            'comments': 0,
+            'likes': 0,
+            'newsfeeds': 0,
+        }
+        followers = {}
+        for from_user_id, to_user_id in edges:
+            followers.setdefault(to_user_id, []).append(from_user_id)
+        # one chunk of authors at a time, so that the memory does not grow
+        # with the number of tweets
+        for start in range(0, len(user_ids), batch_size):
+            author_ids = user_ids[start:start + batch_size]
+            tweet_rows = cls.create_tweets(
+                rng,
+                author_ids,
+                tweets_counts,
+                user_ids,
+                comments,
+                likes,
+                batch_size,
+            )
+            summary['tweets'] += len(tweet_rows)
+            summary['comments'] += cls.create_comments(
+                rng,
+                tweet_rows,
+                user_ids,
+                batch_size,
+            )
+            summary['likes'] += cls.create_likes(
+                rng,
+                tweet_rows,
+                user_ids,
+                batch_size,
+            )
+            summary['newsfeeds'] += cls.create_newsfeeds(
+                tweet_rows,
+                followers,
+                batch_size,
+            )
+        return summary
+
+    @classmethod
+    def random_count(cls, rng, mean):
+        # uniform around the mean, keeps the totals predictable
+        if mean <= 0:
+            return 0
+        return rng.randint(0, 2 * mean)
+
+    @classmethod
+    def create_users(cls, users_count, prefix, batch_size):
+        # hashing a password takes ~100ms, every seeded user shares one hash
+        # and can log in with SEED_PASSWORD
+        password = make_password(SEED_PASSWORD)
+        usernames = ['{}{}'.format(prefix, i) for i in range(users_count)]
+        User.objects.bulk_create(
+            [
+                User(
+                    username=username,
+                    email='{}@my-twitter.com'.format(username),
+                    password=password,
+                )
+                for username in usernames
+            ],
+            batch_size=batch_size,
+        )
+        # bulk_create does not return the ids on MySQL, read them back
+        user_ids = []
+        for start in range(0, users_count, batch_size):
+            user_ids.extend(
+                User.objects.filter(
+                    username__in=usernames[start:start + batch_size],
+                ).order_by('id').values_list('id', flat=True)
+            )
+        return user_ids
+
+    @classmethod
+    def create_friendships(
+        cls,
+        rng,
+        user_ids,
+        followings,
+        exponent,
+        batch_size,
+    ):
+        # the popularity ranks are shuffled, the most followed users are not
+        # simply the first ones created
+        ranks = list(range(1, len(user_ids) + 1))
+        rng.shuffle(ranks)
+        cum_weights = list(accumulate(1 / rank ** exponent for rank in ranks))
+
+        edges = []
+        for from_user_id in user_ids:
+            count = min(
+                cls.random_count(rng, followings),
+                len(user_ids) - 1,
+            )
+            to_user_ids = set()
+            # rejection of the duplicates and of the user itself, retried a
+            # bounded number of times since the weights are very skewed
+            for _ in range(count * 4):
+                if len(to_user_ids) == count:
+                    break
+                to_user_id = rng.choices(user_ids, cum_weights=cum_weights)[0]
+                if to_user_id != from_user_id:
+                    to_user_ids.add(to_user_id)
+            edges.extend(
+                (from_user_id, to_user_id) for to_user_id in to_user_ids
+            )
+
+        Friendship.objects.bulk_create(
+            [
+                Friendship(from_user_id=from_user_id, to_user_id=to_user_id)
+                for from_user_id, to_user_id in edges
+            ],
+            batch_size=batch_size,
+        )
+        return edges
+
+    @classmethod
+    def create_user_stats(cls, user_ids, edges, tweets_counts, batch_size):
+        followers_counts = {}
+        followings_counts = {}
+        for from_user_id, to_user_id in edges:
+            followings_counts[from_user_id] = (
+                followings_counts.get(from_user_id, 0) + 1
+            )
+            followers_counts[to_user_id] = (
+                followers_counts.get(to_user_id, 0) + 1
+            )
+        UserStats.objects.bulk_create(
+            [
+                UserStats(
+                    user_id=user_id,
+                    followers_count=followers_counts.get(user_id, 0),
+                    followings_count=followings_counts.get(user_id, 0),
+                    tweets_count=tweets_counts[user_id],
+                )
+                for user_id in user_ids
+            ],
+            batch_size=batch_size,
+        )
+
+    @classmethod
+    def create_tweets(
+        cls,
+        rng,
+        author_ids,
+        tweets_counts,
+        user_ids,
+        comments,
+        likes,
+        batch_size,
+    ):
+        """
+        Return [(tweet id, author id, created_at, likes_count,
+        comments_count)] of the tweets of the authors.
+        """
+        tweets = []
+        for author_id in author_ids:
+            for i in range(tweets_counts[author_id]):
+                tweets.append(Tweet(
+                    user_id=author_id,
+                    content='tweet {} of user {}'.format(i, author_id),
+                    likes_count=min(
+                        cls.random_count(rng, likes),
+                        len(user_ids),
+                    ),
+                    comments_count=cls.random_count(rng, comments),
+                ))
+        Tweet.objects.bulk_create(tweets, batch_size=batch_size)
+        return list(
+            Tweet.objects.filter(user_id__in=author_ids)
+            .order_by('id')
+            .values_list(
+                'id',
+                'user_id',
+                'created_at',
+                'likes_count',
+                'comments_count',
+            )
+        )
+
+    @classmethod
+    def create_comments(cls, rng, tweet_rows, user_ids, batch_size):
+        comments = [
+            Comment(
+                user_id=rng.choice(user_ids),
+                tweet_id=tweet_id,
+                content='comment {}'.format(i),
+            )
+            for tweet_id, _, _, _, comments_count in tweet_rows
+            for i in range(comments_count)
+        ]
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        return len(comments)
+
+    @classmethod
+    def create_likes(cls, rng, tweet_rows, user_ids, batch_size):
+        content_type = ContentType.objects.get_for_model(Tweet)
+        likes = [
+            Like(
+                user_id=user_id,
+                content_type=content_type,
+                object_id=tweet_id,
+            )
+            for tweet_id, _, _, likes_count, _ in tweet_rows
+            # a user likes a tweet at most once
+            for user_id in rng.sample(user_ids, likes_count)
+        ]
+        Like.objects.bulk_create(likes, batch_size=batch_size)
+        return len(likes)
+
+    @classmethod
+    def create_newsfeeds(cls, tweet_rows, followers, batch_size):
+        # the same push / pull split as the fanout, the tweets of the users
+        # with too many followers are pulled and have no newsfeed row
+        newsfeeds = []
+        for tweet_id, author_id, created_at, _, _ in tweet_rows:
+            follower_ids = followers.get(author_id, [])
+            if NewsFeedService.is_pulled_user(len(follower_ids)):
+                continue
+            newsfeeds.extend(
+                NewsFeed(
+                    user_id=user_id,
+                    tweet_id=tweet_id,
+                    created_at=created_at,
+                )
+                for user_id in follower_ids
+            )
+        NewsFeed.objects.bulk_create(newsfeeds, batch_size=batch_size)
+        return len(newsfeeds)
+
+
+class BenchmarkService(object):
+    # The endpoints are driven through django.test.Client, every request goes
+    # through the middlewares and the url routes of twitter/urls.py like a
+    # real one, only the network and the web server are skipped.
+
+    @classmethod
+    def get_endpoints(cls, user, tweet, celebrity):
+        """
+        Return [(name, url, params)], read as the user: the newsfeeds of the
+        user, the tweets and the followers of the most followed user, and the
+        comments of the most commented tweet.
+        """
+        return [
+            ('newsfeeds.list', '/api/newsfeeds/', {}),
+            ('tweets.list', '/api/tweets/', {'user_id': celebrity.id}),
+            ('tweets.retrieve', '/api/tweets/{}/'.format(tweet.id), {}),
+            ('comments.list', '/api/comments/', {'tweet_id': tweet.id}),
+            (
+                'friendships.followers',
+                '/api/friendships/{}/followers/'.format(celebrity.id),
+                {},
+            ),
+            (
+                'friendships.followings',
+                '/api/friendships/{}/followings/'.format(user.id),
+                {},
+            ),
+            ('notifications.list', '/api/notifications/', {}),
+            (
+                'notifications.unread_count',
+                '/api/notifications/unread-count/',
+                {},
+            ),
+        ]
+
+    @classmethod
+    def get_default_targets(cls):
+        """
+        The user who follows the most users, the most followed user and the
+        most commented tweet, the heaviest reads of the seeded graph.
+        """
+        stats = UserStats.objects.order_by('-followings_count').first()
+        celebrity_stats = UserStats.objects.order_by(
+            '-followers_count',
+        ).first()
+        if stats is None or celebrity_stats is None:
+            return None
+        tweet = Tweet.objects.order_by('-comments_count', 'id').first()
+        if tweet is None:
+            return None
+        return (
+            User.objects.get(id=stats.user_id),
+            tweet,
+            User.objects.get(id=celebrity_stats.user_id),
+        )
+
+    @classmethod
+    def percentile(cls, values, percent):
+        # nearest-rank percentile of the sorted values
+        if not values:
+            return None
+        rank = math.ceil(percent / 100 * len(values))
+        return values[max(rank, 1) - 1]
+
+    @classmethod
+    def request(cls, client, url, params):
+        """
+        Return (status code, seconds, queries) of one GET request.
+        """
+        collector = QueryCollector()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            start = time.perf_counter()
+            response = client.get(url, params)
+            duration = time.perf_counter() - start
+        return response.status_code, duration, collector.count
+
+    @classmethod
+    def run(cls, user, endpoints, iterations=100, warmup=5, cold_cache=False):
+        """
+        Request every endpoint warmup + iterations times as the user, the
+        warmup requests fill the caches and are not measured. With
+        cold_cache the cache is cleared before every request. Return
+        {endpoint name: stats}, the latencies are in milliseconds.
+        """
+        # localhost is in ALLOWED_HOSTS, the default testserver is not
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+        results = {}
+        for name, url, params in endpoints:
+            for _ in range(warmup):
+                client.get(url, params)
+            durations, query_counts, statuses = [], [], set()
+            for _ in range(iterations):
+                if cold_cache:
+                    cache.clear()
+                status, duration, query_count = cls.request(
+                    client,
+                    url,
+                    params,
+                )
+                statuses.add(status)
+                durations.append(duration * 1000)
+                query_counts.append(query_count)
+            durations.sort()
+            query_counts.sort()
+            results[name] = {
+                'url': url,
+                'params': params,
+                'statuses': sorted(statuses),
+                'iterations': iterations,
+                'mean_ms': round(sum(durations) / len(durations), 3),
+                'p50_ms': round(cls.percentile(durations, 50), 3),
+                'p95_ms': round(cls.percentile(durations, 95), 3),
+                'p99_ms': round(cls.percentile(durations, 99), 3),
+                'max_ms': round(durations[-1], 3),
+                'queries_p50': cls.percentile(query_counts, 50),
+                'queries_max': query_counts[-1],
+            }
+        return results
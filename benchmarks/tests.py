@@ -0,0 +1,151 @@
+from accounts.models import UserStats
+from benchmarks.fanout import FanoutBenchmark
+from benchmarks.services import BenchmarkService, SeedService
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from friendships.models import Friendship
+from io import StringIO
+from newsfeeds.models import NewsFeed
+from testing.testcases import TestCase
+from tweets.models import Tweet
+import json
+import os
+import tempfile
+
+
+class SeedServiceTests(TestCase):
+
+    def test_seed(self):
+        summary = SeedService.seed(
+            50,
+            followings=5,
+            tweets=2,
+            comments=2,
+            likes=3,
+            batch_size=7,
+        )
+        self.assertEqual(summary['users'], 50)
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Friendship.objects.count(), summary['friendships'])
+        self.assertEqual(Tweet.objects.count(), summary['tweets'])
+        self.assertEqual(NewsFeed.objects.count(), summary['newsfeeds'])
+        # nobody follows themselves
+        for from_user_id, to_user_id in Friendship.objects.values_list(
+            'from_user_id',
+            'to_user_id',
+        ):
+            self.assertNotEqual(from_user_id, to_user_id)
+
+        # the denormalized counts are right, nothing to fix
+        out = StringIO()
+        call_command('reconcile_user_stats', stdout=out)
+        self.assertEqual(out.getvalue(), '0 users fixed\n')
+        out = StringIO()
+        call_command('reconcile_counts', stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            '0 tweets fixed\n0 comments fixed\n',
+        )
+
+        # the seeded users can log in
+        self.assertEqual(
+            self.client.login(username='seed0', password='generic password'),
+            True,
+        )
+
+    def test_power_law(self):
+        SeedService.seed(200, followings=10, tweets=0, exponent=1.2)
+        followers_counts = list(
+            UserStats.objects.order_by('-followers_count')
+            .values_list('followers_count', flat=True)
+        )
+        # the top 5% of the users have a lot more followers than the median
+        self.assertEqual(
+            followers_counts[9] > 4 * followers_counts[100],
+            True,
+        )
+
+    def test_same_seed_same_graph(self):
+        SeedService.seed(30, followings=5, tweets=1, prefix='a')
+        SeedService.seed(30, followings=5, tweets=1, prefix='b')
+
+        def get_edges(prefix):
+            return sorted(
+                Friendship.objects.filter(
+                    from_user__username__startswith=prefix,
+                ).values_list('from_user__username', 'to_user__username')
+            )
+
+        self.assertEqual(
+            [(a[1:], b[1:]) for a, b in get_edges('a')],
+            [(a[1:], b[1:]) for a, b in get_edges('b')],
+        )
+
+
+class BenchmarkTests(TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(BenchmarkService.percentile(values, 50), 50)
+        self.assertEqual(BenchmarkService.percentile(values, 95), 95)
+        self.assertEqual(BenchmarkService.percentile(values, 99), 99)
+        self.assertEqual(BenchmarkService.percentile([7], 99), 7)
+        self.assertEqual(BenchmarkService.percentile([], 50), None)
+
+    def test_run_benchmarks(self):
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('run_benchmarks', stdout=out)
+
+        call_command('seed_social_graph', users=20, stdout=out)
+        path = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        call_command(
+            'run_benchmarks',
+            iterations=3,
+            warmup=1,
+            output=path,
+            stdout=out,
+        )
+        with open(path) as f:
+            results = json.load(f)
+        self.assertEqual(results['iterations'], 3)
+        self.assertEqual('newsfeeds.list' in results['endpoints'], True)
+        for result in results['endpoints'].values():
+            self.assertEqual(result['statuses'], [200])
+            self.assertEqual(result['queries_max'] > 0, True)
+            self.assertEqual(
+                result['p50_ms'] <= result['p95_ms'] <= result['p99_ms'],
+                True,
+            )
+
+
+class FanoutBenchmarkTests(TestCase):
+
+    def test_run(self):
+        results = FanoutBenchmark.run([10, 30], batch_size=7, chunk_size=4)
+        self.assertEqual(len(results), 2 * len(FanoutBenchmark.STRATEGIES))
+        for result in results:
+            self.assertEqual('error' in result, False)
+            self.assertEqual(result['rows'], result['followers'])
+            self.assertEqual(result['peak_memory_bytes'] > 0, True)
+            self.assertEqual(result['rows_per_second'] > 0, True)
+        # every run is rolled back
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(NewsFeed.objects.count(), 0)
+
+    def test_benchmark_fanout(self):
+        path = os.path.join(tempfile.mkdtemp(), 'fanout.json')
+        call_command(
+            'benchmark_fanout',
+            followers=[5],
+            strategies=['streaming_ids', 'raw_insert'],
+            output=path,
+            stdout=StringIO(),
+        )
+        with open(path) as f:
+            results = json.load(f)
+        self.assertEqual(
+            [result['strategy'] for result in results['results']],
+            ['streaming_ids', 'raw_insert'],
+        )
+        self.assertEqual(results['results'][1]['rows'], 5)
@@ -0,0 +1,10 @@
+from utils.paginations import EndlessPagination
+
+
+class CommentPagination(EndlessPagination):
+    # The comments of a tweet are read oldest first, ?before= walks down to
+    # the newer comments. The auto increment id is ordered by time like the
+    # created_at, the index of tweet, with the id as its last column, serves
+    # the page.
+    cursor_fields = ('id',)
+    descending = False
@@ -7,8 +7,9 @@ from tweets.models import Tweet
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    user = UserSerializerForComment()
-    likes_count = serializers.SerializerMethodField()
+    user = UserSerializerForComment(source='cached_user')
+    # the snowflake id of the tweet, a string like the id of TweetSerializer
+    tweet_id = serializers.CharField(read_only=True)
     has_liked = serializers.SerializerMethodField()
 
     class Meta:
@@ -23,11 +24,13 @@ class CommentSerializer(serializers.ModelSerializer):
             'has_liked',
         )
 
-    def get_likes_count(self, obj):
-        return obj.like_set.count()
-
+    # The list API loads the comments liked by the current user for the whole
+    # page into the context with CommentService.get_serializer_context
     def get_has_liked(self, obj):
-        return LikeService.has_liked(self.context['request'].user, obj)
+        liked_comments = self.context.get('liked_comments')
+        if liked_comments is None:
+            return LikeService.has_liked(self.context['request'].user, obj)
+        return obj in liked_comments
 
 
 class CommentSerializerForCreate(serializers.ModelSerializer):
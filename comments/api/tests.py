@@ -1,4 +1,6 @@
 from comments.models import Comment
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -68,7 +70,7 @@ class CommentApiTests(TestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['user']['id'], self.lucky.id)
-        self.assertEqual(response.data['tweet_id'], self.tweet.id)
+        self.assertEqual(response.data['tweet_id'], str(self.tweet.id))
         self.assertEqual(response.data['content'], '1')
 
 
@@ -154,6 +156,46 @@ class CommentApiTests(TestCase):
         })
         self.assertEqual(len(response.data['comments']), 2)
 
+    def test_list_pagination(self):
+        comments = [
+            self.create_comment(self.lucky, self.tweet, str(i))
+            for i in range(5)
+        ]
+        # the oldest comments first, ?before= goes on with the newer ones
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'size': 3,
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [comment['content'] for comment in response.data['comments']],
+            ['0', '1', '2'],
+        )
+        self.assertEqual(response.data['before_cursor'], str(comments[2].id))
+
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'size': 3,
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [comment['content'] for comment in response.data['comments']],
+            ['3', '4'],
+        )
+
+        # ?after= goes back to the older ones, in the same order
+        response = self.anonymous_client.get(COMMENT_URL, {
+            'tweet_id': self.tweet.id,
+            'size': 2,
+            'after': comments[3].id,
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [comment['content'] for comment in response.data['comments']],
+            ['1', '2'],
+        )
+
     def test_comments_count(self):
         # test tweet detail api
         tweet = self.create_tweet(self.lucky)
@@ -176,3 +218,24 @@ class CommentApiTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(
             response.data['newsfeeds'][0]['tweet']['comments_count'], 2)
+
+    def test_list_queries_do_not_grow_with_comments_count(self):
+        def get_queries_count():
+            # compare the queries with a cold cache
+            self.clear_cache()
+            with CaptureQueriesContext(connection) as context:
+                response = self.lucky_client.get(COMMENT_URL, {
+                    'tweet_id': self.tweet.id,
+                })
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context)
+
+        self.create_comment(self.cosmo, self.tweet)
+        queries_count = get_queries_count()
+        for i in range(5):
+            comment = self.create_comment(
+                self.create_user('user{}'.format(i)),
+                self.tweet,
+            )
+            self.create_like(self.lucky, comment)
+        self.assertEqual(get_queries_count(), queries_count)
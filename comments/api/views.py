@@ -1,3 +1,4 @@
+from comments.api.paginations import CommentPagination
 from comments.api.permissions import IsObjectOwner
 from comments.api.serializers import (
     CommentSerializer,
@@ -5,7 +6,9 @@ from comments.api.serializers import (
     CommentSerializerForUpdate,
 )
 from comments.models import Comment
-from inbox.services import NotificationService
+from comments.services import CommentService
+from django.db import transaction
+from jobs.services import JobService
 from rest_framework import viewsets, status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
@@ -18,7 +21,8 @@ class CommentViewSet(viewsets.GenericViewSet):
     no need retrieve ( any single comment) method
 
     POST /api/comments/  -> create
-    GET  /api/comments/?tweet_id=1  -> list
+    GET  /api/comments/?tweet_id=1  -> list, oldest first
+    GET  /api/comments/?tweet_id=1&before=<cursor> -> the next comments
     GET /api/comments/1/ -> retrieve (Not Implemented)
     DELETE /api/comments/1/ -> destroy
     PATCH /api/comments/1/  -> partial_update (Not Implemented)
@@ -50,18 +54,22 @@ class CommentViewSet(viewsets.GenericViewSet):
         # comments = Comment.objects.filter(tweet_id=tweet_id)
 
         queryset = self.get_queryset()
-        comments = self.filter_queryset(queryset).\
-            prefetch_related('user').\
-            order_by('created_at')
+        # the oldest comments first, one page at a time with the id as the
+        # cursor, the users of the comments are loaded from the cache
+        paginator = CommentPagination()
+        comments = paginator.paginate_queryset(
+            self.filter_queryset(queryset),
+            request,
+        )
 
         serializer = CommentSerializer(
             comments,
-            context={'request': request},
+            context=CommentService.get_serializer_context(request, comments),
             many=True,
         )
-        return Response(
-            {'comments': serializer.data},
-            status=status.HTTP_200_OK,
+        return paginator.get_paginated_response(
+            serializer.data,
+            key='comments',
         )
 
     def create(self, request, *args, **kwargs):
@@ -81,8 +89,14 @@ class CommentViewSet(viewsets.GenericViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # save will trigle serializer create method
-        comment = serializer.save()
-        NotificationService.send_comment_notification(comment)
+        # the notification is sent by a background job which is written in
+        # the same transaction as the comment
+        with transaction.atomic():
+            comment = serializer.save()
+            JobService.enqueue(
+                'send_comment_notification',
+                comment_id=comment.id,
+            )
         return Response(
             CommentSerializer(comment, context={'request': request}).data,
             status=status.HTTP_201_CREATED,
@@ -0,0 +1,22 @@
+from django.db.models import F
+from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
+
+
+def incr_comments_count(sender, instance, created, **kwargs):
+    if not created or instance.tweet_id is None:
+        return
+    Tweet.objects.filter(id=instance.tweet_id).update(
+        comments_count=F('comments_count') + 1,
+    )
+    # update() does not send post_save, delete the cached tweet by hand
+    MemcachedHelper.invalidate_cached_object(Tweet, instance.tweet_id)
+
+
+def decr_comments_count(sender, instance, **kwargs):
+    if instance.tweet_id is None:
+        return
+    Tweet.objects.filter(id=instance.tweet_id).update(
+        comments_count=F('comments_count') - 1,
+    )
+    MemcachedHelper.invalidate_cached_object(Tweet, instance.tweet_id)
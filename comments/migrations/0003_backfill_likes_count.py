@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.db.models import Count
+
+CHUNK_SIZE = 1000
+
+
+def backfill_likes_count(apps, schema_editor):
+    # likes_count was added with a default of 0, the comments created before
+    # would show no likes until reconcile_counts runs. They are counted here
+    # the same way, a chunk of comments at a time.
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type = ContentType.objects.filter(
+        app_label='comments',
+        model='comment',
+    ).first()
+    # no content type yet, nothing has been liked
+    if content_type is None:
+        return
+
+    last_id = 0
+    while True:
+        rows = list(
+            Comment.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'likes_count')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        last_id = ids[-1]
+        likes_counts = dict(
+            Like.objects.filter(content_type=content_type, object_id__in=ids)
+            .values_list('object_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for comment_id, likes_count in rows:
+            count = likes_counts.get(comment_id, 0)
+            if count == likes_count:
+                continue
+            Comment.objects.filter(id=comment_id).update(likes_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('comments', '0002_denormalized_counts'),
+        ('likes', '0002_snowflake_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_likes_count, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,11 @@
+from comments.listeners import decr_comments_count, incr_comments_count
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from likes.models import Like
 from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
 
 
 class Comment(models.Model):
@@ -15,6 +18,8 @@ class Comment(models.Model):
     content = models.TextField(max_length=140)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # denormalized count of the likes, maintained by likes/listeners.py
+    likes_count = models.IntegerField(default=0)
 
     class Meta:
         # sort all comments of a tweet by comment created_at
@@ -27,10 +32,21 @@ class Comment(models.Model):
             object_id=self.id,
         ).order_by('-created_at')
 
+    @property
+    def cached_user(self):
+        if Comment.user.is_cached(self):
+            return self.user
+        return MemcachedHelper.get_object_through_cache(User, self.user_id)
+
     def __str__(self):
         return '{} - {} says {} at tweet {}'.format(
             self.created_at,
             self.user,
             self.content,
             self.tweet_id,
-        )
\ No newline at end of file
+        )
+
+
+# Keep comments_count of the tweet up to date
+post_save.connect(incr_comments_count, sender=Comment)
+post_delete.connect(decr_comments_count, sender=Comment)
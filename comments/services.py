@@ -0,0 +1,44 @@
+from comments.models import Comment
+from django.contrib.auth.models import User
+from django.db.models import Count
+from likes.services import LikeService
+from utils.memcached_helper import MemcachedHelper
+
+
+class CommentService(object):
+
+    @classmethod
+    def get_comments_count_map(cls, tweet_ids):
+        """
+        Return {tweet_id: comments count} with one GROUP BY query on the
+        index of tweet and created_at.
+        """
+        if not tweet_ids:
+            return {}
+        return dict(
+            Comment.objects.filter(tweet_id__in=tweet_ids)
+            .values_list('tweet_id')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+
+    @classmethod
+    def get_serializer_context(cls, request, comments):
+        """
+        Load everything CommentSerializer needs for a list of comments in a
+        constant number of queries, the serializer reads it from the context
+        instead of querying for every comment.
+        """
+        users = MemcachedHelper.get_objects_through_cache(
+            User,
+            {comment.user_id for comment in comments},
+        )
+        for comment in comments:
+            comment.user = users.get(comment.user_id)
+        return {
+            'request': request,
+            'liked_comments': LikeService.has_liked_batch(
+                request.user,
+                comments,
+            ),
+        }
@@ -3,6 +3,7 @@ from friendships.models import Friendship
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.db import transaction
 
 
 # via source=xxx to get each model instance 's xxx
@@ -68,7 +69,10 @@ class FriendshipSerializerForCreate(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
-        return Friendship.objects.create(
-            from_user_id=validated_data['from_user_id'],
-            to_user_id=validated_data['to_user_id'],
-        )
\ No newline at end of file
+        # the friendship and the counts in UserStats, updated by the post_save
+        # listener, are committed together
+        with transaction.atomic():
+            return Friendship.objects.create(
+                from_user_id=validated_data['from_user_id'],
+                to_user_id=validated_data['to_user_id'],
+            )
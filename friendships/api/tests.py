@@ -1,7 +1,10 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from friendships.models import Friendship
 from testing.testcases import TestCase
 from rest_framework.test import APIClient
+from utils.paginations import EndlessPagination
 
 
 FOLLOW_URL = '/api/friendships/{}/follow/'
@@ -196,4 +199,71 @@ class FriendshipApiTests(TestCase):
         self.assertEqual(
             response.data['followers'][1]['user']['username'],
             'cosmo_follower_0',
-        )
\ No newline at end of file
+        )
+
+    def test_followers_pagination(self):
+        page_size = 20
+        friendships = []
+        for i in range(page_size + 3):
+            follower = self.create_user('lucky_follower_{}'.format(i))
+            friendships.append(Friendship.objects.create(
+                from_user=follower,
+                to_user=self.lucky,
+            ))
+        friendships.reverse()
+
+        url = FOLLOWERS_URL.format(self.lucky.id)
+        response = self.anonymous_client.get(url)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(len(response.data['followers']), page_size)
+        self.assertEqual(
+            response.data['followers'][0]['user']['id'],
+            friendships[0].from_user_id,
+        )
+
+        response = self.anonymous_client.get(url, {
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [
+                follower['user']['id']
+                for follower in response.data['followers']
+            ],
+            [
+                friendship.from_user_id
+                for friendship in friendships[page_size:]
+            ],
+        )
+
+        # new followers are loaded with ?after=
+        follower = self.create_user('lucky_new_follower')
+        Friendship.objects.create(from_user=follower, to_user=self.lucky)
+        response = self.anonymous_client.get(url, {
+            'after': self.encode_cursor(friendships[0]),
+        })
+        self.assertEqual(len(response.data['followers']), 1)
+        self.assertEqual(
+            response.data['followers'][0]['user']['id'],
+            follower.id,
+        )
+
+    def test_followings_queries_do_not_grow_with_page_size(self):
+        def get_queries_count():
+            self.clear_cache()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.anonymous_client.get(
+                    FOLLOWINGS_URL.format(self.lucky.id),
+                )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(captured)
+
+        Friendship.objects.create(from_user=self.lucky, to_user=self.cosmo)
+        queries_count = get_queries_count()
+        for i in range(5):
+            following = self.create_user('lucky_following_{}'.format(i))
+            Friendship.objects.create(from_user=self.lucky, to_user=following)
+        self.assertEqual(get_queries_count(), queries_count)
+
+    def encode_cursor(self, friendship):
+        return EndlessPagination().encode_cursor(friendship)
@@ -8,8 +8,11 @@ from friendships.api.serializers import (
     FollowerSerializer,
     FriendshipSerializerForCreate,
 )
+from friendships.services import FriendshipService
+from utils.paginations import EndlessPagination
 
 from django.contrib.auth.models import User
+from django.db import transaction
 
 
 class FriendshipViewSet(viewsets.GenericViewSet):
@@ -22,27 +25,41 @@ class FriendshipViewSet(viewsets.GenericViewSet):
     # queryset.filter(pk=1) to check if object exists or not
 
     queryset = User.objects.all()
+    pagination_class = EndlessPagination
 
     @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
     def followers(self, request, pk):
         # GET /api/friendships/1/followers/
-        # pk=1,  get all follwers for user_id=1
-        friendships = Friendship.objects.filter(to_user_id=pk)
+        # pk=1,  get the follwers for user_id=1, page by page
+        # GET /api/friendships/1/followers/?before=<cursor> -> older followers
+        # Every page is one range scan of the index of (to_user_id,
+        # created_at), it does not depend on the followers count
+        friendships = self.paginator.paginate_queryset(
+            Friendship.objects.filter(to_user_id=pk),
+            request,
+        )
+        # load the users of the page at once instead of one query per row
+        FriendshipService.load_users(friendships, 'from_user')
         serializer = FollowerSerializer(friendships, many=True)
-        return Response(
-            {'followers': serializer.data},
-            status=status.HTTP_200_OK,
+        return self.paginator.get_paginated_response(
+            serializer.data,
+            key='followers',
         )
 
     @action(methods=['GET'], detail=True, permission_classes=[AllowAny])
     def followings(self, request, pk):
         # GET /api/friendships/1/followings/
-        # pk=1,  get all follwings for user_id=1
-        friendships = Friendship.objects.filter(from_user_id=pk)
+        # pk=1,  get the follwings for user_id=1, page by page, through the
+        # index of (from_user_id, created_at)
+        friendships = self.paginator.paginate_queryset(
+            Friendship.objects.filter(from_user_id=pk),
+            request,
+        )
+        FriendshipService.load_users(friendships, 'to_user')
         serializer = FollowingSerializer(friendships, many=True)
-        return Response(
-            {'followings': serializer.data},
-            status=status.HTTP_200_OK,
+        return self.paginator.get_paginated_response(
+            serializer.data,
+            key='followings',
         )
 
     @action(methods=['POST'], detail=True, permission_classes=[IsAuthenticated])
@@ -106,12 +123,14 @@ class FriendshipViewSet(viewsets.GenericViewSet):
         # pointing at the objects to be deleted will be deleted along with them.
         # So, we set on_delete=on_delete=models.SET_NULL
         # instead of on_delete=models.CASCADE
-        deleted, _ = Friendship.objects.filter(
-            from_user=request.user,
-            to_user=unfollow_user,
-        ).delete()
+        # the post_delete listener updates the counts in UserStats in the
+        # same transaction
+        with transaction.atomic():
+            deleted, _ = Friendship.objects.filter(
+                from_user=request.user,
+                to_user=unfollow_user,
+            ).delete()
         return Response({'success': True, 'deleted': deleted})
 
-
     def list(self, request):
-        return Response({'message': 'this is friendships home page'})
\ No newline at end of file
+        return Response({'message': 'this is friendships home page'})
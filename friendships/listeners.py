@@ -0,0 +1,55 @@
+from accounts.models import UserStats
+from django.db.models import F
+from utils.memcached_helper import MemcachedHelper
+
+
+def update_friendship_counts(friendship, delta):
+    if friendship.to_user_id is not None:
+        UserStats.objects.filter(user_id=friendship.to_user_id).update(
+            followers_count=F('followers_count') + delta,
+        )
+        # update() does not send post_save, delete the cached stats by hand
+        MemcachedHelper.invalidate_cached_object(
+            UserStats,
+            friendship.to_user_id,
+        )
+    if friendship.from_user_id is not None:
+        UserStats.objects.filter(user_id=friendship.from_user_id).update(
+            followings_count=F('followings_count') + delta,
+        )
+        MemcachedHelper.invalidate_cached_object(
+            UserStats,
+            friendship.from_user_id,
+        )
+
+
+def invalidate_pulled_user_ids(friendship, delta):
+    # import here to avoid the circular import with friendships.models
+    from newsfeeds.services import NewsFeedService
+
+    if friendship.from_user_id is not None:
+        NewsFeedService.invalidate_pulled_user_ids(friendship.from_user_id)
+    if friendship.to_user_id is None:
+        return
+    followers_count = UserStats.objects.filter(
+        user_id=friendship.to_user_id,
+    ).values_list('followers_count', flat=True).first()
+    if followers_count is None:
+        return
+    # the followed account crossed NEWSFEED_PUSH_MAX_FOLLOWERS, it is pulled
+    # or pushed from now on for all of its followers
+    if NewsFeedService.is_pulled_user(followers_count) != \
+            NewsFeedService.is_pulled_user(followers_count - delta):
+        NewsFeedService.invalidate_all_pulled_user_ids()
+
+
+def incr_friendship_counts(sender, instance, created, **kwargs):
+    if not created:
+        return
+    update_friendship_counts(instance, 1)
+    invalidate_pulled_user_ids(instance, 1)
+
+
+def decr_friendship_counts(sender, instance, **kwargs):
+    update_friendship_counts(instance, -1)
+    invalidate_pulled_user_ids(instance, -1)
@@ -1,5 +1,10 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.contrib.auth.models import User
+from friendships.listeners import (
+    decr_friendship_counts,
+    incr_friendship_counts,
+)
 
 
 class Friendship(models.Model):
@@ -33,3 +38,6 @@ class Friendship(models.Model):
             self.to_user.username
         )
 
+
+post_save.connect(incr_friendship_counts, sender=Friendship)
+post_delete.connect(decr_friendship_counts, sender=Friendship)
@@ -1,4 +1,8 @@
+from accounts.models import UserStats
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
 from friendships.models import Friendship
+from utils.memcached_helper import MemcachedHelper
 
 
 class FriendshipService(object):
@@ -31,4 +35,94 @@ class FriendshipService(object):
         friendships = Friendship.objects.filter(
             to_user=user,
         ).prefetch_related('from_user')
-        return [friendship.from_user for friendship in friendships]
\ No newline at end of file
+        return [friendship.from_user for friendship in friendships]
+
+    @classmethod
+    def load_users(cls, friendships, user_field):
+        """
+        Set friendship.<user_field> (from_user or to_user) of every friendship
+        in a page with one cache get_many instead of one query per row.
+        """
+        id_field = user_field + '_id'
+        users = MemcachedHelper.get_objects_through_cache(
+            User,
+            {getattr(friendship, id_field) for friendship in friendships},
+        )
+        for friendship in friendships:
+            setattr(
+                friendship,
+                user_field,
+                users.get(getattr(friendship, id_field)),
+            )
+
+    @classmethod
+    def iter_follower_ids(cls, user_id, chunk_size):
+        """
+        Yield the follower ids of user_id, oldest friendship first. The
+        followers are read chunk_size at a time through the index of
+        (to_user_id, created_at), each chunk starts right after the last
+        friendship of the previous one, so there is no OFFSET scan, no User
+        instance is loaded and at most one chunk is held in memory.
+
+        Bulk consumers such as fanout should use it instead of get_followers.
+        """
+        cursor = None
+        while True:
+            friendships = Friendship.objects.filter(to_user_id=user_id)
+            if cursor is not None:
+                created_at, friendship_id = cursor
+                # the id breaks the ties of created_at, it is the last column
+                # of every secondary index in InnoDB
+                friendships = friendships.filter(
+                    Q(created_at__gt=created_at) |
+                    Q(created_at=created_at, id__gt=friendship_id)
+                )
+            friendships = list(
+                friendships.order_by('created_at', 'id')
+                .values_list('created_at', 'id', 'from_user_id')[:chunk_size]
+            )
+            for _, _, from_user_id in friendships:
+                # the follower is deleted
+                if from_user_id is not None:
+                    yield from_user_id
+            if len(friendships) < chunk_size:
+                return
+            cursor = friendships[-1][:2]
+
+    @classmethod
+    def get_following_user_ids(cls, user_id):
+        return list(
+            Friendship.objects.filter(from_user_id=user_id)
+            .values_list('to_user_id', flat=True)
+        )
+
+    @classmethod
+    def get_followers_count_map(cls, user_ids):
+        """
+        Return {user_id: followers count}, read from the denormalized
+        UserStats through the cache with one get_many. The users without a
+        UserStats row yet are counted with one GROUP BY query, a popular
+        account is never taken for one without followers.
+        """
+        stats = MemcachedHelper.get_objects_through_cache(UserStats, user_ids)
+        counts = {
+            user_id: user_stats.followers_count
+            for user_id, user_stats in stats.items()
+        }
+        missing_ids = [
+            user_id
+            for user_id in user_ids
+            if user_id not in counts
+        ]
+        if missing_ids:
+            counts.update(
+                Friendship.objects.filter(to_user_id__in=missing_ids)
+                .values_list('to_user_id')
+                .annotate(count=Count('id'))
+                .order_by()
+            )
+        return {user_id: counts.get(user_id, 0) for user_id in user_ids}
+
+    @classmethod
+    def get_followers_count(cls, user_id):
+        return cls.get_followers_count_map([user_id])[user_id]
@@ -0,0 +1,75 @@
+from accounts.models import UserStats
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from friendships.models import Friendship
+from friendships.services import FriendshipService
+from testing.testcases import TestCase
+
+
+class FriendshipServiceTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.followers = []
+        for i in range(5):
+            follower = self.create_user('lucky_follower_{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.lucky)
+            self.followers.append(follower)
+        # somebody else's follower is not returned
+        Friendship.objects.create(
+            from_user=self.lucky,
+            to_user=self.followers[0],
+        )
+
+    def test_iter_follower_ids(self):
+        follower_ids = [follower.id for follower in self.followers]
+        for chunk_size in range(1, 7):
+            self.assertEqual(
+                list(FriendshipService.iter_follower_ids(
+                    self.lucky.id,
+                    chunk_size,
+                )),
+                follower_ids,
+            )
+
+        # one query per chunk, plus an empty one when the last chunk is full
+        with CaptureQueriesContext(connection) as captured:
+            list(FriendshipService.iter_follower_ids(self.lucky.id, 2))
+        self.assertEqual(len(captured), 3)
+        with CaptureQueriesContext(connection) as captured:
+            list(FriendshipService.iter_follower_ids(self.lucky.id, 5))
+        self.assertEqual(len(captured), 2)
+
+    def test_iter_follower_ids_with_same_created_at(self):
+        Friendship.objects.filter(to_user=self.lucky).update(
+            created_at=Friendship.objects.first().created_at,
+        )
+        follower_ids = list(FriendshipService.iter_follower_ids(
+            self.lucky.id,
+            2,
+        ))
+        self.assertEqual(
+            follower_ids,
+            [follower.id for follower in self.followers],
+        )
+
+    def test_get_followers_count_map(self):
+        self.assertEqual(
+            FriendshipService.get_followers_count_map([
+                self.lucky.id,
+                self.followers[0].id,
+                self.followers[1].id,
+            ]),
+            {
+                self.lucky.id: 5,
+                self.followers[0].id: 1,
+                self.followers[1].id: 0,
+            },
+        )
+
+        # the users created before UserStats are counted
+        UserStats.objects.filter(user_id=self.lucky.id).delete()
+        self.assertEqual(
+            FriendshipService.get_followers_count(self.lucky.id),
+            5,
+        )
@@ -0,0 +1,10 @@
+from django.contrib import admin
+from hashtags.models import TweetHashtag
+
+
+@admin.register(TweetHashtag)
+class TweetHashtagAdmin(admin.ModelAdmin):
+    list_display = (
+        'tag',
+        'tweet',
+    )
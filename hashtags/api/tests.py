@@ -0,0 +1,54 @@
+from hashtags.models import TweetHashtag
+from rest_framework import status
+from rest_framework.test import APIClient
+from testing.testcases import TestCase
+
+TREND_LIST_API = '/api/trends/'
+TWEET_CREATE_API = '/api/tweets/'
+
+
+class TrendApiTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.lucky_client = APIClient()
+        self.lucky_client.force_authenticate(self.lucky)
+
+    def post_tweet(self, content):
+        response = self.lucky_client.post(TWEET_CREATE_API, {
+            'content': content,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def test_list(self):
+        response = self.anonymous_client.get(TREND_LIST_API)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['trends'], [])
+        # the empty trends are cached for TRENDS_CACHE_TIMEOUT seconds
+        self.clear_cache()
+
+        tweet_id = self.post_tweet('hello #Django #python')
+        self.post_tweet('learning #django')
+        self.post_tweet('no tags at all')
+        self.assertEqual(
+            set(TweetHashtag.objects.filter(tweet_id=tweet_id)
+                .values_list('tag', flat=True)),
+            {'django', 'python'},
+        )
+        self.assertEqual(TweetHashtag.objects.count(), 3)
+
+        response = self.anonymous_client.get(TREND_LIST_API)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['trends'], [
+            {'tag': 'django', 'count': 2},
+            {'tag': 'python', 'count': 1},
+        ])
+
+    def test_list_does_not_read_tweets(self):
+        self.post_tweet('hello #django')
+        with self.assertNumQueries(0):
+            response = self.anonymous_client.get(TREND_LIST_API)
+        self.assertEqual(response.data['trends'], [
+            {'tag': 'django', 'count': 1},
+        ])
@@ -0,0 +1,18 @@
+from hashtags.services import TrendService
+from rest_framework import viewsets
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+
+
+class TrendViewSet(viewsets.ViewSet):
+    """
+    GET /api/trends/ -> the hashtags used the most in the last
+    TRENDS_WINDOW_MINUTES minutes, the highest count first
+
+    The trends are read from the cached buckets of TrendService, the tweets
+    are never scanned. The counts are estimates, never below the real counts.
+    """
+    permission_classes = (AllowAny,)
+
+    def list(self, request):
+        return Response({'trends': TrendService.get_trends()})
@@ -0,0 +1,5 @@
+from django.apps import AppConfig
+
+
+class HashtagsConfig(AppConfig):
+    name = 'hashtags'
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tweets', '0003_denormalized_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TweetHashtag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=100)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tweets.tweet')),
+            ],
+            options={
+                'unique_together': {('tag', 'tweet')},
+            },
+        ),
+    ]
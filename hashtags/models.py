@@ -0,0 +1,17 @@
+from django.db import models
+from tweets.models import Tweet
+
+
+class TweetHashtag(models.Model):
+    # The tag -> tweet index, one row per hashtag of a tweet, written by
+    # HashtagService.index_tweet when the tweet is created. The tag is stored
+    # lower cased without the #, the tweets of a tag are read newest first
+    # from the (tag, tweet) index.
+    tag = models.CharField(max_length=100)
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = (('tag', 'tweet'),)
+
+    def __str__(self):
+        return '#{} {}'.format(self.tag, self.tweet_id)
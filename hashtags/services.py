@@ -0,0 +1,216 @@
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from hashtags.models import TweetHashtag
+from jobs.services import JobService
+from utils.metrics import record_cache_reads
+from utils.sketches import CountMinSketch, TopK
+from utils.time_helpers import datetime_to_microseconds, utc_now
+import heapq
+import re
+import time
+
+# a # which does not follow a word character or another #, and a tag with at
+# least one letter: #django and #web2 are tags, #1 and a#b are not
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w*[^\W\d]\w*)')
+HASHTAG_MAX_LENGTH = 100
+
+TRENDS_BUCKET_PATTERN = 'trends_bucket:{minute}'
+TRENDS_LOCK_PATTERN = 'trends_lock:{minute}'
+TRENDS_KEY = 'trends'
+
+
+class HashtagService(object):
+
+    @classmethod
+    def extract_tags(cls, content):
+        """
+        The hashtags of the content without the #, lower cased and without
+        duplicates, in the order they appear.
+        """
+        tags = []
+        for tag in HASHTAG_RE.findall(content):
+            tag = tag.lower()
+            if len(tag) > HASHTAG_MAX_LENGTH or tag in tags:
+                continue
+            tags.append(tag)
+        return tags
+
+    @classmethod
+    def index_tweet(cls, tweet):
+        """
+        Write the tag -> tweet index of a new tweet and count its tags in the
+        trends, return the tags. Call it in the transaction of the tweet, the
+        counting job is committed with the tweet.
+        """
+        tags = cls.extract_tags(tweet.content)
+        if not tags:
+            return tags
+        TweetHashtag.objects.bulk_create([
+            TweetHashtag(tag=tag, tweet=tweet)
+            for tag in tags
+        ])
+        JobService.enqueue(
+            'count_hashtags',
+            tags=tags,
+            minute=TrendService.get_minute(tweet.created_at),
+        )
+        return tags
+
+    @classmethod
+    def get_tweet_ids(cls, tag, limit, before_id=None):
+        """
+        The ids of at most limit tweets with the tag, newest first, older than
+        before_id. Only the (tag, tweet) index is read.
+        """
+        queryset = TweetHashtag.objects.filter(tag=tag.lstrip('#').lower())
+        if before_id is not None:
+            queryset = queryset.filter(tweet_id__lt=before_id)
+        return list(
+            queryset.order_by('-tweet_id')
+            .values_list('tweet_id', flat=True)[:limit]
+        )
+
+
+class TrendService(object):
+    # The tags used in the last TRENDS_WINDOW_MINUTES minutes, counted in one
+    # cached bucket per minute. A bucket holds a count-min sketch of the tags
+    # of the minute and the TRENDS_TOP_K tags with the highest counts, its
+    # size is fixed however many distinct tags there are. The trends of the
+    # window are the candidates of all the buckets ranked by their counts
+    # summed over the sketches of the window, the tweets are never read.
+    # A bucket expires after the window, the window slides by itself.
+
+    @classmethod
+    def get_minute(cls, value):
+        return datetime_to_microseconds(value) // (60 * 10 ** 6)
+
+    @classmethod
+    def get_window_minutes(cls, now=None):
+        current = cls.get_minute(now or utc_now())
+        return range(current - settings.TRENDS_WINDOW_MINUTES + 1, current + 1)
+
+    @classmethod
+    def load_bucket(cls, bucket):
+        if bucket is None:
+            return (
+                CountMinSketch(
+                    settings.TRENDS_SKETCH_WIDTH,
+                    settings.TRENDS_SKETCH_DEPTH,
+                ),
+                TopK(settings.TRENDS_TOP_K),
+            )
+        return (
+            CountMinSketch.from_bytes(
+                settings.TRENDS_SKETCH_WIDTH,
+                settings.TRENDS_SKETCH_DEPTH,
+                bucket['sketch'],
+            ),
+            TopK(settings.TRENDS_TOP_K, bucket['top']),
+        )
+
+    @classmethod
+    @contextmanager
+    def lock_bucket(cls, minute):
+        # The bucket is read, updated and written back, the job workers which
+        # update the same minute take turns. A lock left by a crashed worker
+        # expires after TRENDS_LOCK_TIMEOUT seconds.
+        key = TRENDS_LOCK_PATTERN.format(minute=minute)
+        deadline = time.monotonic() + settings.TRENDS_LOCK_TIMEOUT
+        while not cache.add(key, 1, timeout=settings.TRENDS_LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                # the job is retried
+                raise RuntimeError(
+                    'The trends bucket {} is locked.'.format(minute),
+                )
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            cache.delete(key)
+
+    @classmethod
+    def add_tags(cls, counts_by_minute, now=None):
+        """
+        counts_by_minute: {minute: {tag: count}}, the minutes which have left
+        the window are ignored. The buckets of all the minutes are locked
+        before any of them is written, a job which cannot lock one of them
+        fails without counting anything, its retry does not count twice.
+        """
+        window = cls.get_window_minutes(now)
+        keys = {
+            minute: TRENDS_BUCKET_PATTERN.format(minute=minute)
+            for minute in sorted(counts_by_minute)
+            if minute >= window.start
+        }
+        if not keys:
+            return
+        with ExitStack() as stack:
+            # the locks are taken in the order of the minutes, two jobs never
+            # wait for each other
+            for minute in keys:
+                stack.enter_context(cls.lock_bucket(minute))
+            buckets = cache.get_many(list(keys.values()))
+            updated = {}
+            for minute, key in keys.items():
+                sketch, top = cls.load_bucket(buckets.get(key))
+                for tag, count in counts_by_minute[minute].items():
+                    top.push(tag, sketch.add(tag, count))
+                updated[key] = {'sketch': sketch.to_bytes(), 'top': top.counts}
+            cache.set_many(
+                updated,
+                # one more minute, the bucket of the first minute of the
+                # window is still there at the end of the minute
+                timeout=(settings.TRENDS_WINDOW_MINUTES + 1) * 60,
+            )
+
+    @classmethod
+    def compute_trends(cls, now=None):
+        """
+        [{'tag', 'count'}] of the TRENDS_TOP_K tags used the most in the
+        window, the highest count first.
+        """
+        keys = [
+            TRENDS_BUCKET_PATTERN.format(minute=minute)
+            for minute in cls.get_window_minutes(now)
+        ]
+        buckets = [
+            cls.load_bucket(bucket)
+            for bucket in cache.get_many(keys).values()
+        ]
+        candidates = set()
+        for _, top in buckets:
+            candidates.update(top.counts)
+        # a candidate is also counted in the minutes where it was not among
+        # the top tags, from the sketch of the minute
+        counts = {
+            tag: sum(sketch.estimate(tag) for sketch, _ in buckets)
+            for tag in candidates
+        }
+        trends = heapq.nsmallest(
+            settings.TRENDS_TOP_K,
+            counts.items(),
+            key=lambda item: (-item[1], item[0]),
+        )
+        return [{'tag': tag, 'count': count} for tag, count in trends]
+
+    @classmethod
+    def get_trends(cls, limit=None):
+        """
+        The trends are computed at most once per TRENDS_CACHE_TIMEOUT seconds,
+        the other requests read them from the cache.
+        """
+        trends = cache.get(TRENDS_KEY)
+        record_cache_reads(
+            'trends',
+            hits=int(trends is not None),
+            misses=int(trends is None),
+        )
+        if trends is None:
+            trends = cls.compute_trends()
+            cache.set(
+                TRENDS_KEY,
+                trends,
+                timeout=settings.TRENDS_CACHE_TIMEOUT,
+            )
+        return trends[:limit]
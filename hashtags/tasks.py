@@ -0,0 +1,14 @@
+from hashtags.services import TrendService
+from jobs.services import JobService
+
+
+@JobService.register('count_hashtags', batch=True)
+def count_hashtags_task(payloads):
+    # the tags of the whole batch are added up first, a bucket is read and
+    # written once per batch instead of once per tweet
+    counts_by_minute = {}
+    for payload in payloads:
+        counts = counts_by_minute.setdefault(payload['minute'], {})
+        for tag in payload['tags']:
+            counts[tag] = counts.get(tag, 0) + 1
+    TrendService.add_tags(counts_by_minute)
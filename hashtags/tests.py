@@ -0,0 +1,180 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.test import override_settings
+from hashtags.models import TweetHashtag
+from hashtags.services import (
+    HashtagService,
+    TRENDS_BUCKET_PATTERN,
+    TRENDS_LOCK_PATTERN,
+    TrendService,
+)
+from hashtags.tasks import count_hashtags_task
+from jobs.models import Job
+from jobs.services import JobService
+from testing.testcases import TestCase
+from utils.time_helpers import utc_now
+
+
+class HashtagServiceTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+
+    def test_extract_tags(self):
+        self.assertEqual(
+            HashtagService.extract_tags(
+                '#Django and #python, #django again #web2 #1 a#b ##x',
+            ),
+            ['django', 'python', 'web2'],
+        )
+        self.assertEqual(HashtagService.extract_tags('no tags'), [])
+        self.assertEqual(HashtagService.extract_tags('#' + 'a' * 101), [])
+
+    def test_index_tweet(self):
+        tweet1 = self.create_tweet(self.lucky, 'hello #Django #python')
+        tweet2 = self.create_tweet(self.lucky, 'more #django')
+        tweet3 = self.create_tweet(self.lucky, 'nothing here')
+        self.assertEqual(
+            HashtagService.index_tweet(tweet1),
+            ['django', 'python'],
+        )
+        HashtagService.index_tweet(tweet2)
+        self.assertEqual(HashtagService.index_tweet(tweet3), [])
+        self.assertEqual(TweetHashtag.objects.count(), 3)
+
+        # newest first, with a cursor
+        self.assertEqual(
+            HashtagService.get_tweet_ids('#Django', limit=10),
+            [tweet2.id, tweet1.id],
+        )
+        self.assertEqual(
+            HashtagService.get_tweet_ids('django', limit=1),
+            [tweet2.id],
+        )
+        self.assertEqual(
+            HashtagService.get_tweet_ids('django', 10, before_id=tweet2.id),
+            [tweet1.id],
+        )
+        self.assertEqual(HashtagService.get_tweet_ids('flask', 10), [])
+
+        # the index rows go with the tweet
+        tweet1.delete()
+        self.assertEqual(TweetHashtag.objects.count(), 1)
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_index_tweet_enqueues_job(self):
+        tweet = self.create_tweet(self.lucky, 'hello #django')
+        HashtagService.index_tweet(tweet)
+        job = Job.objects.get(name='count_hashtags')
+        self.assertEqual(job.payload, {
+            'tags': ['django'],
+            'minute': TrendService.get_minute(tweet.created_at),
+        })
+        self.assertEqual(TrendService.compute_trends(), [])
+        JobService.run_job(job)
+        self.assertEqual(
+            TrendService.compute_trends(),
+            [{'tag': 'django', 'count': 1}],
+        )
+
+
+class TrendServiceTests(TestCase):
+
+    def setUp(self):
+        self.now = utc_now()
+        self.minute = TrendService.get_minute(self.now)
+
+    def test_sliding_window(self):
+        count_hashtags_task([
+            {'tags': ['django', 'python'], 'minute': self.minute},
+            {'tags': ['django'], 'minute': self.minute},
+            {'tags': ['python', 'flask'], 'minute': self.minute - 10},
+            {'tags': ['flask'], 'minute': self.minute - 10},
+        ])
+        with self.settings(TRENDS_WINDOW_MINUTES=60):
+            # the same counts are ordered by tag
+            self.assertEqual(TrendService.compute_trends(self.now), [
+                {'tag': 'django', 'count': 2},
+                {'tag': 'flask', 'count': 2},
+                {'tag': 'python', 'count': 2},
+            ])
+            # the minute of flask has left the window
+            later = self.now + timedelta(minutes=55)
+            self.assertEqual(TrendService.compute_trends(later), [
+                {'tag': 'django', 'count': 2},
+                {'tag': 'python', 'count': 1},
+            ])
+            later = self.now + timedelta(minutes=60)
+            self.assertEqual(TrendService.compute_trends(later), [])
+
+        # a minute which has already left the window is not written
+        old = self.minute - 60
+        TrendService.add_tags({old: {'django': 1}}, now=self.now)
+        self.assertIsNone(cache.get(TRENDS_BUCKET_PATTERN.format(minute=old)))
+
+    @override_settings(TRENDS_TOP_K=2)
+    def test_bounded_buckets(self):
+        # 100 distinct tags, a bucket only keeps the 2 highest counts
+        TrendService.add_tags({self.minute: {
+            'tag{}'.format(i): i
+            for i in range(1, 101)
+        }})
+        bucket = cache.get(TRENDS_BUCKET_PATTERN.format(minute=self.minute))
+        self.assertEqual(bucket['top'], {'tag100': 100, 'tag99': 99})
+        self.assertEqual(len(bucket['sketch']), 1024 * 4 * 4)
+
+        # a tag of an earlier minute is also counted in the later ones
+        TrendService.add_tags({self.minute - 1: {'tag1': 150, 'tag2': 1}})
+        self.assertEqual(TrendService.compute_trends(self.now), [
+            {'tag': 'tag1', 'count': 151},
+            {'tag': 'tag100', 'count': 100},
+        ])
+
+    def test_get_trends_is_cached(self):
+        TrendService.add_tags({self.minute: {'django': 1}})
+        self.assertEqual(TrendService.get_trends(), [
+            {'tag': 'django', 'count': 1},
+        ])
+        # not computed again until the cached trends expire
+        TrendService.add_tags({self.minute: {'python': 2}})
+        self.assertEqual(TrendService.get_trends(), [
+            {'tag': 'django', 'count': 1},
+        ])
+        cache.delete('trends')
+        self.assertEqual(TrendService.get_trends(limit=1), [
+            {'tag': 'python', 'count': 2},
+        ])
+
+    @override_settings(TRENDS_LOCK_TIMEOUT=0)
+    def test_locked_bucket(self):
+        cache.add(TRENDS_LOCK_PATTERN.format(minute=self.minute), 1)
+        with self.assertRaises(RuntimeError):
+            TrendService.add_tags({self.minute: {'django': 1}})
+        cache.delete(TRENDS_LOCK_PATTERN.format(minute=self.minute))
+        TrendService.add_tags({self.minute: {'django': 1}})
+        # the lock is released
+        self.assertIsNone(
+            cache.get(TRENDS_LOCK_PATTERN.format(minute=self.minute)),
+        )
+
+    @override_settings(TRENDS_LOCK_TIMEOUT=0)
+    def test_locked_bucket_counts_nothing(self):
+        # the later minute is locked, the earlier one is not written either
+        cache.add(TRENDS_LOCK_PATTERN.format(minute=self.minute), 1)
+        counts_by_minute = {
+            self.minute - 1: {'django': 1},
+            self.minute: {'django': 1},
+        }
+        with self.assertRaises(RuntimeError):
+            TrendService.add_tags(counts_by_minute)
+        self.assertEqual(TrendService.compute_trends(), [])
+        self.assertIsNone(
+            cache.get(TRENDS_LOCK_PATTERN.format(minute=self.minute - 1)),
+        )
+
+        # the retry counts every minute once
+        cache.delete(TRENDS_LOCK_PATTERN.format(minute=self.minute))
+        TrendService.add_tags(counts_by_minute)
+        self.assertEqual(TrendService.compute_trends(), [
+            {'tag': 'django', 'count': 2},
+        ])
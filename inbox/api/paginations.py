@@ -0,0 +1,7 @@
+from utils.paginations import EndlessPagination
+
+
+class NotificationPagination(EndlessPagination):
+    # the inbox is sorted by the time of the latest event of a notification,
+    # through the index of (recipient, timestamp)
+    cursor_fields = ('timestamp', 'id')
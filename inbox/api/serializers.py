@@ -0,0 +1,37 @@
+from notifications.models import Notification
+from rest_framework import serializers
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    # the actors of an aggregated notification, "lucky and 41 others liked
+    # your tweet", the latest actor is actor_object_id
+    actor_count = serializers.SerializerMethodField()
+    actor_ids = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = (
+            'id',
+            'recipient',
+            'actor_content_type',
+            'actor_object_id',
+            'actor_count',
+            'actor_ids',
+            'verb',
+            'action_object_content_type',
+            'action_object_object_id',
+            'target_content_type',
+            'target_object_id',
+            'timestamp',
+            'unread',
+        )
+
+    def get_actor_count(self, obj):
+        if not obj.data:
+            return 1
+        return obj.data.get('actor_count', 1)
+
+    def get_actor_ids(self, obj):
+        if not obj.data:
+            return [int(obj.actor_object_id)]
+        return obj.data.get('actor_ids', [int(obj.actor_object_id)])
@@ -1,9 +1,13 @@
 from notifications.models import Notification
-from testing.testcases import TestCase
+from testing.testcases import TestCase, TransactionTestCase
 
 
 COMMENT_URL = '/api/comments/'
 LIKE_URL = '/api/likes/'
+NOTIFICATION_URL = '/api/notifications/'
+UNREAD_COUNT_URL = '/api/notifications/unread-count/'
+MARK_AS_READ_URL = '/api/notifications/{}/mark-as-read/'
+MARK_ALL_AS_READ_URL = '/api/notifications/mark-all-as-read/'
 
 
 class NotificationTests(TestCase):
@@ -27,4 +31,115 @@ class NotificationTests(TestCase):
             'content_type': 'tweet',
             'object_id': self.cosmo_tweet.id,
         })
-        self.assertEqual(Notification.objects.count(), 1)
\ No newline at end of file
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class NotificationApiTests(TransactionTestCase):
+    # the unread counter is adjusted after the commit, the data of a test is
+    # committed
+
+    def setUp(self):
+        self.lucky, self.lucky_client = self.create_user_and_client('lucky')
+        self.cosmo, self.cosmo_client = self.create_user_and_client('cosmo')
+        self.lucky_tweet = self.create_tweet(self.lucky)
+
+    def like_tweets(self, count):
+        # one notification per tweet, likes of different tweets are not
+        # aggregated
+        for i in range(count):
+            tweet = self.create_tweet(self.lucky)
+            self.cosmo_client.post(LIKE_URL, {
+                'content_type': 'tweet',
+                'object_id': tweet.id,
+            })
+
+    def test_list(self):
+        response = self.anonymous_client.get(NOTIFICATION_URL)
+        self.assertEqual(response.status_code, 403)
+
+        self.like_tweets(22)
+        response = self.lucky_client.get(NOTIFICATION_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(len(response.data['notifications']), 20)
+        notification = response.data['notifications'][0]
+        self.assertEqual(notification['verb'], 'liked your tweet')
+        self.assertEqual(notification['actor_count'], 1)
+        self.assertEqual(notification['actor_ids'], [self.cosmo.id])
+
+        response = self.lucky_client.get(NOTIFICATION_URL, {
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(len(response.data['notifications']), 2)
+
+        # cosmo has no notification
+        response = self.cosmo_client.get(NOTIFICATION_URL)
+        self.assertEqual(len(response.data['notifications']), 0)
+
+        # filter the unread ones
+        notification = Notification.objects.first()
+        notification.mark_as_read()
+        response = self.lucky_client.get(NOTIFICATION_URL, {'unread': 'true'})
+        self.assertEqual(len(response.data['notifications']), 20)
+
+    def test_unread_count(self):
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 0)
+
+        # the counter is adjusted on send
+        self.like_tweets(2)
+        with self.assertNumQueries(0):
+            response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 2)
+
+        # an aggregated like does not add up
+        _, fan_client = self.create_user_and_client('fan')
+        fan_client.post(LIKE_URL, {
+            'content_type': 'tweet',
+            'object_id': Notification.objects.first().target_object_id,
+        })
+        self.assertEqual(
+            Notification.objects.first().data['actor_count'],
+            2,
+        )
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 2)
+
+        # the counter is counted again on a cache miss
+        self.clear_cache()
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 2)
+
+    def test_mark_as_read(self):
+        self.like_tweets(3)
+        notification = Notification.objects.first()
+        # only the recipient can mark it
+        response = self.cosmo_client.post(
+            MARK_AS_READ_URL.format(notification.id),
+        )
+        self.assertEqual(response.data['marked_count'], 0)
+
+        response = self.lucky_client.post(
+            MARK_AS_READ_URL.format(notification.id),
+        )
+        self.assertEqual(response.data['marked_count'], 1)
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 2)
+
+        # GET is not allowed
+        response = self.lucky_client.get(MARK_ALL_AS_READ_URL)
+        self.assertEqual(response.status_code, 405)
+        # one UPDATE for all the unread notifications
+        with self.assertNumQueries(1):
+            response = self.lucky_client.post(MARK_ALL_AS_READ_URL)
+        self.assertEqual(response.data['marked_count'], 2)
+        self.assertEqual(Notification.objects.unread().count(), 0)
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 0)
+
+        # the counter is counted again, the notifications sent after are not
+        # lost
+        self.like_tweets(1)
+        response = self.lucky_client.get(UNREAD_COUNT_URL)
+        self.assertEqual(response.data['unread_count'], 1)
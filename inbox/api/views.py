@@ -0,0 +1,58 @@
+from inbox.api.paginations import NotificationPagination
+from inbox.api.serializers import NotificationSerializer
+from inbox.services import NotificationService
+from notifications.models import Notification
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+
+class NotificationViewSet(viewsets.GenericViewSet):
+    """
+    GET /api/notifications/ -> the newest notifications of the current user
+    GET /api/notifications/?before=<cursor> -> older notifications
+    GET /api/notifications/?unread=true -> only the unread ones
+    GET /api/notifications/unread-count/
+    POST /api/notifications/<id>/mark-as-read/
+    POST /api/notifications/mark-all-as-read/
+    """
+    serializer_class = NotificationSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = NotificationPagination
+    lookup_value_regex = r'\d+'
+
+    def get_queryset(self):
+        # only the current user's notifications
+        return Notification.objects.filter(recipient=self.request.user)
+
+    def list(self, request):
+        queryset = self.get_queryset()
+        if request.query_params.get('unread') == 'true':
+            queryset = queryset.filter(unread=True)
+        notifications = self.paginator.paginate_queryset(queryset, request)
+        serializer = NotificationSerializer(notifications, many=True)
+        return self.paginator.get_paginated_response(
+            serializer.data,
+            key='notifications',
+        )
+
+    @action(methods=['GET'], detail=False, url_path='unread-count')
+    def unread_count(self, request):
+        # served from the cached counter, no query on a cache hit
+        return Response(
+            {'unread_count': NotificationService.get_unread_count(
+                request.user.id,
+            )},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(methods=['POST'], detail=True, url_path='mark-as-read')
+    def mark_as_read(self, request, pk):
+        updated = NotificationService.mark_as_read(request.user.id, pk)
+        return Response({'marked_count': updated}, status=status.HTTP_200_OK)
+
+    @action(methods=['POST'], detail=False, url_path='mark-all-as-read')
+    def mark_all_as_read(self, request):
+        updated = NotificationService.mark_all_as_read(request.user.id)
+        return Response({'marked_count': updated}, status=status.HTTP_200_OK)
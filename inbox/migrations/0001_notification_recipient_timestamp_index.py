@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+INDEX = models.Index(
+    fields=['recipient', 'timestamp'],
+    name='notification_recipient_ts',
+)
+
+
+def add_index(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    schema_editor.add_index(Notification, INDEX)
+
+
+def remove_index(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    schema_editor.remove_index(Notification, INDEX)
+
+
+class Migration(migrations.Migration):
+    """
+    The inbox API pages through the notifications of a recipient by
+    timestamp. Notification belongs to django-notifications-hq, so the
+    index is added to its table here.
+    """
+
+    dependencies = [
+        ('notifications', '0008_index_together_recipient_unread'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
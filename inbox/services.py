@@ -1,38 +1,334 @@
 from comments.models import Comment
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
-from notifications.signals import notify
+from django.core.cache import cache
+from django.db import transaction
+from notifications.models import Notification
 from tweets.models import Tweet
+from utils.metrics import NOTIFICATIONS_SENT, record_cache_reads
+from utils.time_helpers import utc_now
+
+UNREAD_COUNT_PATTERN = 'unread_notifications_count:{user_id}'
 
 
 class NotificationService(object):
+    # Notifications are written by the background jobs in inbox/tasks.py, a
+    # batch of likes or comments is turned into Notification rows with a few
+    # queries and one bulk_create, instead of notify.send and one INSERT per
+    # like in the request
+
+    VERBS = {
+        Tweet: 'liked your tweet',
+        Comment: 'liked your comment',
+    }
 
     @classmethod
-    def send_like_notification(cls, like):
-        target = like.content_object
-        if like.user == target.user:
-            return
-        if like.content_type == ContentType.objects.get_for_model(Tweet):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb='liked your tweet',
-                target=target,
+    def load_like_targets(cls, likes):
+        """
+        Return {(content_type_id, object_id): liked object}, with one query
+        per content type instead of like.content_object for every like.
+        """
+        object_ids = {}
+        for like in likes:
+            object_ids.setdefault(like.content_type_id, set()).add(
+                like.object_id,
             )
-        if like.content_type == ContentType.objects.get_for_model(Comment):
-            notify.send(
-                like.user,
-                recipient=target.user,
-                verb='liked your comment',
+        targets = {}
+        for content_type_id, ids in object_ids.items():
+            # get_for_id is served from the ContentType cache
+            model_class = ContentType.objects.get_for_id(
+                content_type_id,
+            ).model_class()
+            for object_id, obj in model_class.objects.in_bulk(ids).items():
+                targets[(content_type_id, object_id)] = obj
+        return targets
+
+    @classmethod
+    def build_notification(
+        cls,
+        actor_id,
+        recipient_id,
+        verb,
+        target,
+        timestamp,
+    ):
+        return Notification(
+            recipient_id=recipient_id,
+            actor_content_type=ContentType.objects.get_for_model(User),
+            actor_object_id=actor_id,
+            verb=verb,
+            target_content_type=ContentType.objects.get_for_model(target),
+            target_object_id=target.id,
+            timestamp=timestamp,
+        )
+
+    @classmethod
+    def send_like_notifications(cls, likes):
+        targets = cls.load_like_targets(likes)
+        notifications = []
+        for like in likes:
+            target = targets.get((like.content_type_id, like.object_id))
+            # the liked object has been deleted
+            if target is None or target.__class__ not in cls.VERBS:
+                continue
+            if like.user_id is None or like.user_id == target.user_id:
+                continue
+            notifications.append(cls.build_notification(
+                actor_id=like.user_id,
+                recipient_id=target.user_id,
+                verb=cls.VERBS[target.__class__],
                 target=target,
+                timestamp=like.created_at,
+            ))
+        return cls.save_notifications(notifications)
+
+    @classmethod
+    def send_comment_notifications(cls, comments):
+        tweets = Tweet.objects.in_bulk({
+            comment.tweet_id
+            for comment in comments
+            if comment.tweet_id is not None
+        })
+        notifications = []
+        for comment in comments:
+            tweet = tweets.get(comment.tweet_id)
+            if tweet is None or comment.user_id is None:
+                continue
+            if comment.user_id == tweet.user_id:
+                continue
+            notifications.append(cls.build_notification(
+                actor_id=comment.user_id,
+                recipient_id=tweet.user_id,
+                verb='commented on your tweet',
+                target=tweet,
+                timestamp=comment.created_at,
+            ))
+        return cls.save_notifications(notifications)
+
+    @classmethod
+    def send_mention_notifications(cls, mentions):
+        """
+        One notification per mention, the mentions of the tweets of a batch
+        are written with one bulk_create. A mentioned user is notified once
+        per tweet, there is nothing to aggregate.
+        """
+        notifications = [
+            cls.build_notification(
+                actor_id=mention.tweet.user_id,
+                recipient_id=mention.mentioned_user_id,
+                verb='mentioned you in a tweet',
+                target=mention.tweet,
+                timestamp=mention.created_at,
+            )
+            for mention in mentions
+            if mention.tweet.user_id is not None
+        ]
+        return cls.create_notifications(notifications)
+
+    @classmethod
+    def create_notifications(cls, notifications):
+        notifications = Notification.objects.bulk_create(notifications)
+        NOTIFICATIONS_SENT.inc(len(notifications), result='created')
+        cls.incr_unread_counts(notifications)
+        return notifications
+
+    @classmethod
+    def get_aggregation_key(cls, notification):
+        return (
+            notification.recipient_id,
+            notification.verb,
+            notification.target_content_type_id,
+            str(notification.target_object_id),
+        )
+
+    @classmethod
+    def save_notifications(cls, notifications):
+        """
+        Write the notifications of a batch. With aggregation on, the
+        notifications with the same (recipient, verb, target) collapse into
+        one row, "lucky and 41 others liked your tweet": a new event updates
+        the unread row of the same key whose last event is within
+        NOTIFICATION_AGGREGATION_WINDOW seconds, instead of inserting a row.
+        The row keeps the actor count and the latest actors in data, its
+        actor and timestamp are the ones of the latest event.
+        """
+        if not settings.NOTIFICATION_AGGREGATION_WINDOW:
+            return cls.create_notifications(notifications)
+
+        groups = {}
+        for notification in sorted(notifications, key=lambda n: n.timestamp):
+            groups.setdefault(
+                cls.get_aggregation_key(notification),
+                [],
+            ).append(notification)
+        if not groups:
+            return []
+
+        with transaction.atomic():
+            existing = cls.get_aggregated_notifications(groups.keys())
+            created, updated = [], []
+            for key, group in groups.items():
+                notification = existing.get(key)
+                if notification is None:
+                    notification = group[0]
+                    notification.data = {'actor_count': 0, 'actor_ids': []}
+                    created.append(notification)
+                else:
+                    updated.append(notification)
+                for event in group:
+                    cls.add_actor(notification, event)
+            Notification.objects.bulk_create(created)
+            Notification.objects.bulk_update(
+                updated,
+                ['actor_object_id', 'timestamp', 'data'],
             )
+        NOTIFICATIONS_SENT.inc(len(created), result='created')
+        NOTIFICATIONS_SENT.inc(
+            len(notifications) - len(created),
+            result='aggregated',
+        )
+        # the updated rows were unread already
+        cls.incr_unread_counts(created)
+        return created + updated
+
+    @classmethod
+    def get_aggregated_notifications(cls, keys):
+        """
+        Return {aggregation key: notification} of the unread notifications a
+        batch can be aggregated into, with one query through the index of
+        (recipient, unread). The rows are locked until the batch is saved, so
+        that two workers do not lose each other's actors.
+        """
+        since = utc_now() - timedelta(
+            seconds=settings.NOTIFICATION_AGGREGATION_WINDOW,
+        )
+        candidates = Notification.objects.filter(
+            recipient_id__in={key[0] for key in keys},
+            unread=True,
+            verb__in={key[1] for key in keys},
+            target_object_id__in={key[3] for key in keys},
+            timestamp__gte=since,
+        ).order_by('timestamp').select_for_update()
+        # the latest row of a key wins
+        notifications = {
+            cls.get_aggregation_key(notification): notification
+            for notification in candidates
+        }
+        return {
+            key: notifications[key]
+            for key in keys
+            if key in notifications
+        }
+
+    @classmethod
+    def add_actor(cls, notification, event):
+        data = notification.data or {'actor_count': 1, 'actor_ids': [
+            int(notification.actor_object_id),
+        ]}
+        actor_id = int(event.actor_object_id)
+        # an actor who unliked and liked again is only counted once as long
+        # as it is one of the latest actors
+        if actor_id in data['actor_ids']:
+            data['actor_ids'].remove(actor_id)
+        else:
+            data['actor_count'] += 1
+        data['actor_ids'] = (
+            [actor_id] + data['actor_ids']
+        )[:settings.NOTIFICATION_LATEST_ACTORS]
+        notification.data = data
+        notification.actor_object_id = event.actor_object_id
+        notification.timestamp = max(notification.timestamp, event.timestamp)
+
+    @classmethod
+    def send_like_notification(cls, like):
+        cls.send_like_notifications([like])
 
     @classmethod
     def send_comment_notification(cls, comment):
-        if comment.user == comment.tweet.user:
-            return
-        notify.send(
-            comment.user,
-            recipient=comment.tweet.user,
-            verb='liked your comment',
-            target=comment.tweet,
-        )
\ No newline at end of file
+        cls.send_comment_notifications([comment])
+
+    # The unread count is polled by the clients all the time, it is kept as
+    # a counter in the cache which is adjusted when notifications are sent
+    # and read, a hit does not touch the database. A missing counter is
+    # counted again through the index of (recipient, unread).
+
+    @classmethod
+    def get_unread_count(cls, user_id):
+        key = UNREAD_COUNT_PATTERN.format(user_id=user_id)
+        count = cache.get(key)
+        record_cache_reads(
+            'unread_count',
+            hits=int(count is not None),
+            misses=int(count is None),
+        )
+        if count is not None:
+            return count
+        count = Notification.objects.filter(
+            recipient_id=user_id,
+            unread=True,
+        ).count()
+        # add() does not overwrite a counter set by a concurrent request, the
+        # counter it set may be newer than this count
+        if not cache.add(
+            key,
+            count,
+            timeout=settings.NOTIFICATION_UNREAD_COUNT_TIMEOUT,
+        ):
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        return count
+
+    @classmethod
+    def incr_unread_count(cls, user_id, delta):
+        # The counter is adjusted after the commit. A miss counted before the
+        # commit does not see the new rows yet, the counter it caches would
+        # miss them for good if it was adjusted before.
+        transaction.on_commit(
+            lambda: cls.incr_cached_unread_count(user_id, delta),
+        )
+
+    @classmethod
+    def incr_cached_unread_count(cls, user_id, delta):
+        try:
+            cache.incr(UNREAD_COUNT_PATTERN.format(user_id=user_id), delta)
+        except ValueError:
+            # the counter is not cached, the next read counts it
+            pass
+
+    @classmethod
+    def incr_unread_counts(cls, notifications):
+        deltas = {}
+        for notification in notifications:
+            deltas[notification.recipient_id] = (
+                deltas.get(notification.recipient_id, 0) + 1
+            )
+        for user_id, delta in deltas.items():
+            cls.incr_unread_count(user_id, delta)
+
+    @classmethod
+    def mark_as_read(cls, user_id, notification_id):
+        updated = Notification.objects.filter(
+            id=notification_id,
+            recipient_id=user_id,
+            unread=True,
+        ).update(unread=False)
+        if updated:
+            cls.incr_unread_count(user_id, -updated)
+        return updated
+
+    @classmethod
+    def mark_all_as_read(cls, user_id):
+        # one UPDATE for all the unread notifications of the user
+        updated = Notification.objects.filter(
+            recipient_id=user_id,
+            unread=True,
+        ).update(unread=False)
+        # The counter is deleted after the commit, the next read counts it
+        # again. Setting it to 0 would lose the increments of the
+        # notifications committed meanwhile.
+        key = UNREAD_COUNT_PATTERN.format(user_id=user_id)
+        transaction.on_commit(lambda: cache.delete(key))
+        return updated
@@ -0,0 +1,35 @@
+from comments.models import Comment
+from inbox.services import NotificationService
+from jobs.services import JobService
+from likes.models import Like
+from tweets.models import TweetMention
+
+
+# The handlers take the whole batch of claimed jobs, the likes, comments or
+# mentions of the batch are loaded with one query, the ones deleted before the
+# job runs are skipped
+
+
+@JobService.register('send_like_notification', batch=True)
+def send_like_notifications_task(payloads):
+    likes = Like.objects.filter(
+        id__in=[payload['like_id'] for payload in payloads],
+    ).order_by('id')
+    NotificationService.send_like_notifications(list(likes))
+
+
+@JobService.register('send_comment_notification', batch=True)
+def send_comment_notifications_task(payloads):
+    comments = Comment.objects.filter(
+        id__in=[payload['comment_id'] for payload in payloads],
+    ).order_by('id')
+    NotificationService.send_comment_notifications(list(comments))
+
+
+@JobService.register('send_mention_notifications', batch=True)
+def send_mention_notifications_task(payloads):
+    # the mentions of a deleted tweet are deleted with it
+    mentions = TweetMention.objects.filter(
+        tweet_id__in=[payload['tweet_id'] for payload in payloads],
+    ).select_related('tweet').order_by('id')
+    NotificationService.send_mention_notifications(list(mentions))
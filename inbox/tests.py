@@ -1,6 +1,13 @@
-from testing.testcases import TestCase
-from inbox.services import NotificationService
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.test import override_settings
+from testing.testcases import TestCase, TransactionTestCase
+from utils.time_helpers import utc_now
+from inbox.services import UNREAD_COUNT_PATTERN, NotificationService
+from inbox.tasks import send_mention_notifications_task
 from notifications.models import Notification
+from tweets.models import TweetMention
 
 
 class NotificationServiceTests(TestCase):
@@ -32,5 +39,131 @@ class NotificationServiceTests(TestCase):
         NotificationService.send_like_notification(like)
         self.assertEqual(Notification.objects.count(), 1)
 
+    def test_send_like_notifications_in_batch(self):
+        comment = self.create_comment(self.lucky, self.lucky_tweet)
+        likes = []
+        for i in range(3):
+            user = self.create_user('fan_{}'.format(i))
+            likes.append(self.create_like(user, self.lucky_tweet))
+            likes.append(self.create_like(user, comment))
+        # a self like does not notify
+        likes.append(self.create_like(self.lucky, self.lucky_tweet))
+
+        # one query per content type of the targets, one query for the rows
+        # to aggregate into and one INSERT, in a savepoint
+        with self.assertNumQueries(6):
+            NotificationService.send_like_notifications(likes)
+        # the likes of the same target are aggregated into one row
+        self.assertEqual(Notification.objects.count(), 2)
+        notification = Notification.objects.get(verb='liked your tweet')
+        self.assertEqual(notification.recipient, self.lucky)
+        self.assertEqual(notification.target, self.lucky_tweet)
+        self.assertEqual(notification.actor, likes[4].user)
+        self.assertEqual(notification.data['actor_count'], 3)
+        self.assertEqual(
+            notification.data['actor_ids'],
+            [likes[4].user_id, likes[2].user_id, likes[0].user_id],
+        )
+
+    def test_send_comment_notifications_in_batch(self):
+        comments = [
+            self.create_comment(self.cosmo, self.lucky_tweet)
+            for i in range(3)
+        ]
+        NotificationService.send_comment_notifications(comments)
+        notification = Notification.objects.get(
+            recipient=self.lucky,
+            verb='commented on your tweet',
+        )
+        # the same actor is counted once
+        self.assertEqual(notification.data['actor_count'], 1)
+
+    def test_send_mention_notifications_in_batch(self):
+        tweets = [self.create_tweet(self.cosmo) for i in range(2)]
+        users = [self.create_user('fan_{}'.format(i)) for i in range(3)]
+        TweetMention.objects.bulk_create([
+            TweetMention(
+                mentioned_user=user,
+                tweet=tweet,
+                created_at=tweet.created_at,
+            )
+            for tweet in tweets
+            for user in users
+        ])
+        # one query for the mentions and their tweets, one INSERT for all the
+        # notifications of the batch
+        with self.assertNumQueries(2):
+            send_mention_notifications_task([
+                {'tweet_id': tweet.id}
+                for tweet in tweets
+            ])
+        self.assertEqual(Notification.objects.count(), 6)
+        notification = Notification.objects.filter(recipient=users[0]).first()
+        self.assertEqual(notification.actor, self.cosmo)
+        self.assertEqual(notification.verb, 'mentioned you in a tweet')
+        self.assertIn(notification.target, tweets)
+        self.assertEqual(NotificationService.get_unread_count(users[0].id), 2)
+
+        # the mentions of a deleted tweet are gone with it
+        tweets[0].delete()
+        send_mention_notifications_task([{'tweet_id': tweets[0].id}])
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_aggregate_notifications(self):
+        NotificationService.send_like_notification(
+            self.create_like(self.cosmo, self.lucky_tweet),
+        )
+        notification = Notification.objects.get()
+        self.assertEqual(notification.data['actor_count'], 1)
+
+        # updated in place
+        fan = self.create_user('fan')
+        NotificationService.send_like_notification(
+            self.create_like(fan, self.lucky_tweet),
+        )
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor, fan)
+        self.assertEqual(notification.data['actor_count'], 2)
+
+        # a read notification is not updated, a new row is inserted
+        notification.mark_as_read()
+        another_fan = self.create_user('another_fan')
+        NotificationService.send_like_notification(
+            self.create_like(another_fan, self.lucky_tweet),
+        )
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.objects.unread().count(), 1)
+
+        # out of the window, a new row is inserted
+        Notification.objects.update(timestamp=utc_now() - timedelta(days=1))
+        NotificationService.send_like_notification(
+            self.create_like(self.create_user('late_fan'), self.lucky_tweet),
+        )
+        self.assertEqual(Notification.objects.count(), 3)
+
+    @override_settings(NOTIFICATION_AGGREGATION_WINDOW=0)
+    def test_aggregation_off(self):
+        for i in range(3):
+            NotificationService.send_like_notification(self.create_like(
+                self.create_user('fan_{}'.format(i)),
+                self.lucky_tweet,
+            ))
+        self.assertEqual(Notification.objects.count(), 3)
+
 
+class UnreadCountTests(TransactionTestCase):
 
+    def test_incr_after_commit(self):
+        lucky = self.create_user('lucky')
+        cosmo = self.create_user('cosmo')
+        tweet = self.create_tweet(lucky)
+        key = UNREAD_COUNT_PATTERN.format(user_id=lucky.id)
+        with transaction.atomic():
+            NotificationService.send_like_notification(
+                self.create_like(cosmo, tweet),
+            )
+            # a concurrent request counts before the commit, it does not see
+            # the new notification
+            cache.add(key, 0)
+            self.assertEqual(cache.get(key), 0)
+        self.assertEqual(NotificationService.get_unread_count(lucky.id), 1)
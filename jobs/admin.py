@@ -0,0 +1,16 @@
+from django.contrib import admin
+from jobs.models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'payload',
+        'status',
+        'attempts',
+        'created_at',
+    )
+    list_filter = ('name', 'status')
+    date_hierarchy = 'created_at'
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsConfig(AppConfig):
+    name = 'jobs'
+
+    def ready(self):
+        # import <app>/tasks.py of every installed app so that all the job
+        # handlers are registered before the worker starts to run jobs
+        autodiscover_modules('tasks')
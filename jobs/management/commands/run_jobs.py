@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+from jobs.services import JobService
+import multiprocessing
+import time
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs stored in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='How many jobs are claimed in one round.',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when there is no pending job.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when there is no pending job left.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='How many worker processes to run.',
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            self.work(options)
+            return
+
+        # The forked workers must not share the database connection of the
+        # parent, every worker opens its own connection
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=self.work, args=(options,))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def work(self, options):
+        while True:
+            jobs = JobService.claim_jobs(options['batch_size'])
+            if not jobs:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+            for job, succeeded in JobService.run_jobs(jobs):
+                self.stdout.write('{} {}'.format(
+                    'done' if succeeded else 'failed',
+                    job,
+                ))
@@ -0,0 +1,23 @@
+# Generated by Django 3.1.3 on 2026-10-18 20:37
+
+from django.db import migrations, models
+import utils.time_helpers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='available_at',
+            field=models.DateTimeField(default=utils.time_helpers.utc_now),
+        ),
+        migrations.AlterIndexTogether(
+            name='job',
+            index_together={('status', 'available_at')},
+        ),
+    ]
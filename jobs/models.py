@@ -0,0 +1,47 @@
+from django.db import models
+from utils.time_helpers import utc_now
+
+
+class Job(models.Model):
+    """
+    A background job stored in the database, it works as the outbox of the
+    side effects of a write. Jobs are enqueued by JobService.enqueue in the
+    same transaction as the row that causes them, so a job exists if and
+    only if the row is committed, and executed by `python manage.py
+    run_jobs`. Finished jobs are deleted, failed jobs are retried with
+    backoff and kept with the error after the last attempt.
+    """
+    PENDING = 0
+    RUNNING = 1
+    FAILED = 2
+    STATUS_CHOICES = (
+        (PENDING, 'pending'),
+        (RUNNING, 'running'),
+        (FAILED, 'failed'),
+    )
+
+    # the name that the handler is registered with
+    name = models.CharField(max_length=64)
+    # keyword arguments of the handler, only ids, never model instances
+    payload = models.JSONField(default=dict)
+    status = models.SmallIntegerField(choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # A pending job runs after this time, it is pushed back after a failure.
+    # A running job is leased to its worker until this time, the job is
+    # claimed again if the worker dies before finishing it.
+    available_at = models.DateTimeField(default=utc_now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # worker gets the jobs which are available now
+        index_together = (('status', 'available_at'),)
+
+    def __str__(self):
+        return '{} {}({}) {}'.format(
+            self.id,
+            self.name,
+            self.payload,
+            self.get_status_display(),
+        )
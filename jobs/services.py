@@ -0,0 +1,192 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from jobs.models import Job
+from utils.time_helpers import utc_now
+import traceback
+
+
+class JobService(object):
+    # job name -> handler function, filled by @JobService.register
+    handlers = {}
+    # names of the jobs whose handler takes a batch of payloads
+    batch_handlers = set()
+
+    @classmethod
+    def register(cls, name, batch=False):
+        """
+        @JobService.register('some_job') registers the decorated function as
+        the handler of 'some_job'. Handlers live in <app>/tasks.py, they are
+        called with the payload of the job as keyword arguments.
+
+        A handler registered with batch=True is called once for all the jobs
+        of that name in a claimed batch, with the list of their payloads, so
+        that it can read and write the whole batch with a few queries.
+        """
+        def decorator(func):
+            cls.handlers[name] = func
+            if batch:
+                cls.batch_handlers.add(name)
+            return func
+        return decorator
+
+    @classmethod
+    def call_handler(cls, name, payloads):
+        if name in cls.batch_handlers:
+            cls.handlers[name](payloads)
+            return
+        for payload in payloads:
+            cls.handlers[name](**payload)
+
+    @classmethod
+    def enqueue(cls, name, **payload):
+        """
+        Call it inside the transaction.atomic() of the write which causes the
+        job, the job is committed or rolled back together with the write and
+        the request only pays for one INSERT.
+        """
+        if name not in cls.handlers:
+            raise ValueError('Job {} is not registered.'.format(name))
+        # In unit tests, run the job right away instead of waiting for a worker
+        if settings.JOBS_ALWAYS_EAGER:
+            cls.call_handler(name, [payload])
+            return None
+        return Job.objects.create(name=name, payload=payload)
+
+    @classmethod
+    def claim_jobs(cls, batch_size):
+        """
+        Lease at most batch_size available jobs to the current worker. Jobs
+        are available when they are pending and due, or running but the lease
+        of their worker has expired.
+
+        Every claim counts as an attempt, so a job which kills or hangs its
+        worker is not leased again and again: it is marked as failed when its
+        lease expires after the last attempt.
+        """
+        now = utc_now()
+        lease_until = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+        Job.objects.filter(
+            status=Job.RUNNING,
+            available_at__lte=now,
+            attempts__gte=settings.JOBS_MAX_ATTEMPTS,
+        ).update(
+            status=Job.FAILED,
+            error='The lease expired before the job finished.',
+        )
+        jobs = Job.objects.filter(
+            status__in=(Job.PENDING, Job.RUNNING),
+            available_at__lte=now,
+        ).order_by('available_at', 'id')
+
+        if connection.features.has_select_for_update_skip_locked:
+            # SELECT ... FOR UPDATE SKIP LOCKED, the workers never wait for
+            # each other, every worker gets the rows the others have not
+            # locked
+            with transaction.atomic():
+                job_ids = list(
+                    jobs.select_for_update(skip_locked=True)
+                    .values_list('id', flat=True)[:batch_size]
+                )
+                Job.objects.filter(id__in=job_ids).update(
+                    status=Job.RUNNING,
+                    available_at=lease_until,
+                    attempts=F('attempts') + 1,
+                )
+        else:
+            # SQLite in local runs has no row lock. Only the worker which
+            # moves available_at of the job from the value it has read runs
+            # it, the other workers get 0 updated rows and skip it
+            job_ids = []
+            candidates = jobs.values_list('id', 'available_at')[:batch_size]
+            for job_id, available_at in candidates:
+                updated = Job.objects.filter(
+                    id=job_id,
+                    available_at=available_at,
+                ).update(
+                    status=Job.RUNNING,
+                    available_at=lease_until,
+                    attempts=F('attempts') + 1,
+                )
+                if updated:
+                    job_ids.append(job_id)
+
+        return list(Job.objects.filter(id__in=job_ids).order_by('id'))
+
+    @classmethod
+    def get_retry_delay(cls, attempts):
+        # exponential backoff: 10s, 20s, 40s, ...
+        return settings.JOBS_RETRY_BACKOFF * 2 ** (attempts - 1)
+
+    @classmethod
+    def run_job(cls, job):
+        """
+        Run a claimed job, return True if the job succeeded.
+        """
+        try:
+            cls.call_handler(job.name, [job.payload])
+        except Exception:
+            cls.fail_job(job, traceback.format_exc())
+            return False
+        return True
+
+    @classmethod
+    def run_job_group(cls, name, jobs):
+        """
+        Run claimed jobs of the same name with their batch handler, return the
+        list of (job, succeeded). The batch is written in one transaction.
+        When the handler fails, the batch is rolled back and its jobs are run
+        again one at a time, only the bad job is retried and the others are
+        not held back by it.
+        """
+        try:
+            with transaction.atomic():
+                cls.call_handler(name, [job.payload for job in jobs])
+        except Exception:
+            if len(jobs) == 1:
+                cls.fail_job(jobs[0], traceback.format_exc())
+                return [(jobs[0], False)]
+            return [(job, cls.run_job(job)) for job in jobs]
+        return [(job, True) for job in jobs]
+
+    @classmethod
+    def run_jobs(cls, jobs):
+        """
+        Run a batch of claimed jobs, the succeeded ones are deleted with one
+        DELETE. Return the list of (job, succeeded).
+        """
+        results = []
+        groups = {}
+        for job in jobs:
+            if job.name in cls.batch_handlers:
+                groups.setdefault(job.name, []).append(job)
+            else:
+                results.append((job, cls.run_job(job)))
+        for name, group in groups.items():
+            results.extend(cls.run_job_group(name, group))
+
+        Job.objects.filter(
+            id__in=[job.id for job, succeeded in results if succeeded],
+        ).delete()
+        return results
+
+    @classmethod
+    def fail_job(cls, job, error):
+        # the attempt is already counted when the job is claimed
+        attempts = job.attempts
+        if attempts >= settings.JOBS_MAX_ATTEMPTS:
+            Job.objects.filter(id=job.id).update(
+                status=Job.FAILED,
+                attempts=attempts,
+                error=error,
+            )
+            return
+        Job.objects.filter(id=job.id).update(
+            status=Job.PENDING,
+            attempts=attempts,
+            error=error,
+            available_at=utc_now() + timedelta(
+                seconds=cls.get_retry_delay(attempts),
+            ),
+        )
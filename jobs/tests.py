@@ -0,0 +1,164 @@
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import transaction
+from django.test import override_settings
+from friendships.models import Friendship
+from io import StringIO
+from jobs.models import Job
+from jobs.services import JobService
+from newsfeeds.models import NewsFeed
+from testing.testcases import TestCase
+from utils.time_helpers import utc_now
+
+
+@JobService.register('failing_job')
+def failing_job(message):
+    raise RuntimeError(message)
+
+
+batches = []
+
+
+@JobService.register('batch_job', batch=True)
+def batch_job(payloads):
+    batches.append(payloads)
+    for payload in payloads:
+        if payload.get('fail'):
+            raise RuntimeError('bad payload')
+
+
+@override_settings(JOBS_ALWAYS_EAGER=False)
+class JobTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.cosmo = self.create_user('cosmo')
+        Friendship.objects.create(from_user=self.cosmo, to_user=self.lucky)
+
+    def test_enqueue(self):
+        with self.assertRaises(ValueError):
+            JobService.enqueue('not_registered_job')
+
+        tweet = self.create_tweet(self.lucky)
+        job = JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claim_jobs(self):
+        tweet = self.create_tweet(self.lucky)
+        for i in range(3):
+            JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+        jobs = JobService.claim_jobs(batch_size=2)
+        self.assertEqual(len(jobs), 2)
+        self.assertEqual(jobs[0].status, Job.RUNNING)
+        # the running jobs can not be claimed again
+        jobs = JobService.claim_jobs(batch_size=2)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(JobService.claim_jobs(batch_size=2), [])
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2)
+    def test_run_jobs_command(self):
+        tweet = self.create_tweet(self.lucky)
+        JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+        JobService.enqueue('failing_job', message='oops')
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual(
+            NewsFeed.objects.filter(user=self.cosmo, tweet=tweet).exists(),
+            True,
+        )
+        # succeeded job is deleted, failed job is retried with backoff
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'failing_job')
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual('oops' in job.error, True)
+        self.assertEqual(job.available_at > utc_now(), True)
+        self.assertEqual(JobService.claim_jobs(batch_size=10), [])
+
+        # the job is kept as failed after the last attempt
+        Job.objects.update(available_at=utc_now())
+        call_command('run_jobs', once=True, stdout=StringIO())
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(JobService.claim_jobs(batch_size=10), [])
+
+    def test_claim_jobs_with_expired_lease(self):
+        tweet = self.create_tweet(self.lucky)
+        JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+        job = JobService.claim_jobs(batch_size=1)[0]
+        self.assertEqual(JobService.claim_jobs(batch_size=1), [])
+
+        # the worker died while running the job
+        Job.objects.update(available_at=utc_now() - timedelta(seconds=1))
+        self.assertEqual(JobService.claim_jobs(batch_size=1), [job])
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2)
+    def test_claim_jobs_counts_attempts(self):
+        tweet = self.create_tweet(self.lucky)
+        JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+        job = JobService.claim_jobs(batch_size=1)[0]
+        self.assertEqual(job.attempts, 1)
+
+        # the job kills its worker every time, it is not leased forever
+        Job.objects.update(available_at=utc_now() - timedelta(seconds=1))
+        job = JobService.claim_jobs(batch_size=1)[0]
+        self.assertEqual(job.attempts, 2)
+        Job.objects.update(available_at=utc_now() - timedelta(seconds=1))
+        self.assertEqual(JobService.claim_jobs(batch_size=1), [])
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('lease expired', job.error)
+
+    def test_enqueue_in_transaction(self):
+        tweet = self.create_tweet(self.lucky)
+        try:
+            with transaction.atomic():
+                JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+                raise RuntimeError('the write failed')
+        except RuntimeError:
+            pass
+        # the job is rolled back with the write
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_run_batch_jobs(self):
+        del batches[:]
+        for i in range(3):
+            JobService.enqueue('batch_job', number=i)
+        JobService.enqueue('failing_job', message='oops')
+
+        results = JobService.run_jobs(JobService.claim_jobs(batch_size=10))
+        self.assertEqual(len(results), 4)
+        # the batch handler is called once with all the payloads
+        self.assertEqual(
+            batches,
+            [[{'number': 0}, {'number': 1}, {'number': 2}]],
+        )
+        self.assertEqual(Job.objects.get().name, 'failing_job')
+
+    def test_run_batch_jobs_with_a_bad_job(self):
+        del batches[:]
+        JobService.enqueue('batch_job', number=0)
+        bad_job = JobService.enqueue('batch_job', number=1, fail=True)
+        JobService.enqueue('batch_job', number=2)
+
+        results = JobService.run_jobs(JobService.claim_jobs(batch_size=10))
+        self.assertEqual(
+            [(job.payload['number'], succeeded) for job, succeeded in results],
+            [(0, True), (1, False), (2, True)],
+        )
+        # the batch failed, then the jobs ran one at a time
+        self.assertEqual(len(batches), 4)
+        self.assertEqual(batches[1:], [
+            [{'number': 0}],
+            [{'number': 1, 'fail': True}],
+            [{'number': 2}],
+        ])
+        # only the bad job is left to retry
+        job = Job.objects.get()
+        self.assertEqual(job.id, bad_job.id)
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('bad payload', job.error)
@@ -1,3 +1,8 @@
+from django.core.management import call_command
+from django.test import override_settings
+from io import StringIO
+from jobs.models import Job
+from notifications.models import Notification
 from rest_framework import status
 from testing.testcases import TestCase
 
@@ -55,6 +60,28 @@ class LikeApiTests(TestCase):
         self.cosmo_client.post(LIKE_BASE_URL, data)
         self.assertEqual(tweet.like_set.count(), 2)
 
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_like_writes_notification_job(self):
+        tweet = self.create_tweet(self.lucky)
+        response = self.cosmo_client.post(LIKE_BASE_URL, {
+            'content_type': 'tweet',
+            'object_id': tweet.id,
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'send_like_notification')
+        self.assertEqual(Notification.objects.count(), 0)
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual(Notification.objects.count(), 1)
+
+        # liking twice does not enqueue another notification
+        self.cosmo_client.post(LIKE_BASE_URL, {
+            'content_type': 'tweet',
+            'object_id': tweet.id,
+        })
+        self.assertEqual(Job.objects.count(), 0)
+
     def test_comment_likes(self):
         tweet = self.create_tweet(self.lucky)
         comment = self.create_comment(self.cosmo, tweet)
@@ -1,4 +1,5 @@
-from inbox.services import NotificationService
+from django.db import transaction
+from jobs.services import JobService
 from likes.api.serializers import (
     LikeSerializer,
     LikeSerializerForCancel,
@@ -28,9 +29,15 @@ class LikeViewSet(viewsets.GenericViewSet):
                 'message': 'Please check input',
                 'errors': serializer.errors,
             }, status=status.HTTP_400_BAD_REQUEST)
-        instance, created = serializer.get_or_create()
-        if created:
-            NotificationService.send_like_notification(instance)
+        # the notification is sent by a background job which is written in
+        # the same transaction as the like
+        with transaction.atomic():
+            instance, created = serializer.get_or_create()
+            if created:
+                JobService.enqueue(
+                    'send_like_notification',
+                    like_id=instance.id,
+                )
         return Response(
             LikeSerializer(instance).data,
             status=status.HTTP_201_CREATED,
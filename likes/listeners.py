@@ -0,0 +1,30 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from utils.memcached_helper import MemcachedHelper
+
+
+def get_liked_model_class(like):
+    # get_for_id is cached by ContentType manager, no query
+    content_type = ContentType.objects.get_for_id(like.content_type_id)
+    return content_type.model_class()
+
+
+def incr_likes_count(sender, instance, created, **kwargs):
+    if not created:
+        return
+    # UPDATE ... SET likes_count = likes_count + 1 is atomic in the database,
+    # no lost update when two users like the same object at the same time
+    model_class = get_liked_model_class(instance)
+    model_class.objects.filter(id=instance.object_id).update(
+        likes_count=F('likes_count') + 1,
+    )
+    # update() does not send post_save, delete the cached object by hand
+    MemcachedHelper.invalidate_cached_object(model_class, instance.object_id)
+
+
+def decr_likes_count(sender, instance, **kwargs):
+    model_class = get_liked_model_class(instance)
+    model_class.objects.filter(id=instance.object_id).update(
+        likes_count=F('likes_count') - 1,
+    )
+    MemcachedHelper.invalidate_cached_object(model_class, instance.object_id)
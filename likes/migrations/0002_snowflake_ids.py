@@ -0,0 +1,18 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('likes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='like',
+            name='object_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -2,11 +2,14 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from likes.listeners import decr_likes_count, incr_likes_count
 
 
 class Like(models.Model):
     # https://docs.djangoproject.com/en/3.1/ref/contrib/contenttypes/#generic-relations
-    object_id = models.PositiveIntegerField()  # comment id or tweet id
+    # comment id or tweet id, the tweet ids are 64 bits snowflake ids
+    object_id = models.PositiveBigIntegerField()
     content_type = models.ForeignKey(
         ContentType,
         on_delete=models.SET_NULL,
@@ -34,3 +37,8 @@ class Like(models.Model):
             self.content_type,
             self.object_id,
         )
+
+
+# Keep likes_count of the liked tweet or comment up to date
+post_save.connect(incr_likes_count, sender=Like)
+post_delete.connect(decr_likes_count, sender=Like)
@@ -1,3 +1,5 @@
+from collections import defaultdict
+from django.db.models import Count
 from likes.models import Like
 from  django.contrib.contenttypes.models import ContentType
 
@@ -12,4 +14,50 @@ class LikeService(object):
             content_type=ContentType.objects.get_for_model(target.__class__),
             object_id=target.id,
             user=user,
-        ).exists()
\ No newline at end of file
+        ).exists()
+
+    @classmethod
+    def get_likes_count_map(cls, model_class, object_ids):
+        """
+        Return {object_id: likes count} of a page of tweets or comments with
+        one GROUP BY query on the index of content_type and object_id.
+        """
+        if not object_ids:
+            return {}
+        return dict(
+            Like.objects.filter(
+                content_type=ContentType.objects.get_for_model(model_class),
+                object_id__in=object_ids,
+            ).values_list('object_id').annotate(count=Count('id')).order_by()
+        )
+
+    @classmethod
+    def has_liked_batch(cls, user, targets):
+        """
+        Return the set of the targets (tweets or comments) that the user has
+        liked, check it with `target in liked_targets`. The targets are
+        grouped by content type and each group costs one
+        `object_id IN (...)` query on the unique index of user, content_type
+        and object_id, instead of one query per target. Model instances are
+        compared by model and id, so a tweet and a comment with the same id
+        never get mixed up.
+        """
+        if user.is_anonymous:
+            return set()
+        targets_by_content_type = defaultdict(dict)
+        for target in targets:
+            content_type = ContentType.objects.get_for_model(target.__class__)
+            targets_by_content_type[content_type][target.id] = target
+
+        liked_targets = set()
+        for content_type, targets_map in targets_by_content_type.items():
+            liked_ids = Like.objects.filter(
+                user=user,
+                content_type=content_type,
+                object_id__in=targets_map.keys(),
+            ).values_list('object_id', flat=True)
+            liked_targets.update(
+                targets_map[object_id]
+                for object_id in liked_ids
+            )
+        return liked_targets
@@ -0,0 +1,44 @@
+from django.contrib.auth.models import AnonymousUser
+from likes.services import LikeService
+from testing.testcases import TestCase
+
+
+class LikeServiceTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.cosmo = self.create_user('cosmo')
+        self.tweets = [self.create_tweet(self.cosmo) for i in range(3)]
+        self.comments = [
+            self.create_comment(self.cosmo, self.tweets[0])
+            for i in range(3)
+        ]
+
+    def test_has_liked_batch(self):
+        self.create_like(self.lucky, self.tweets[1])
+        self.create_like(self.lucky, self.comments[0])
+        self.create_like(self.cosmo, self.tweets[0])
+
+        # one query per content type
+        with self.assertNumQueries(1):
+            liked_tweets = LikeService.has_liked_batch(self.lucky, self.tweets)
+        self.assertEqual(liked_tweets, {self.tweets[1]})
+
+        with self.assertNumQueries(2):
+            liked_targets = LikeService.has_liked_batch(
+                self.lucky,
+                self.tweets + self.comments,
+            )
+        # a tweet and a comment with the same id are not mixed up
+        self.assertEqual(liked_targets, {self.tweets[1], self.comments[0]})
+        for target in self.tweets + self.comments:
+            self.assertEqual(
+                target in liked_targets,
+                LikeService.has_liked(self.lucky, target),
+            )
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                LikeService.has_liked_batch(AnonymousUser(), self.tweets),
+                set(),
+            )
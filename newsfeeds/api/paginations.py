@@ -0,0 +1,9 @@
+from utils.paginations import EndlessPagination
+
+
+class NewsFeedPagination(EndlessPagination):
+    # The pushed newsfeeds and the pulled tweets are merged into one feed, so
+    # both are sorted by the id of the tweet, which is ordered by time. A
+    # tweet which is both pushed and pulled only shows up once.
+    cursor_fields = ('tweet_id',)
+    unique_field = 'tweet_id'
@@ -4,8 +4,12 @@ from tweets.api.serializers import TweetSerializer
 
 
 class NewsFeedSerializer(serializers.ModelSerializer):
-    tweet = TweetSerializer()
+    # snowflake ids go past 2 ** 53, a JavaScript number would round them.
+    # null for the tweets pulled at read time, they have no newsfeed row
+    id = serializers.CharField(read_only=True, allow_null=True)
+    # the tweet is read through the cache, not queried for every newsfeed
+    tweet = TweetSerializer(source='cached_tweet')
 
     class Meta:
         model = NewsFeed
-        fields = ('id', 'created_at', 'tweet')
\ No newline at end of file
+        fields = ('id', 'created_at', 'tweet')
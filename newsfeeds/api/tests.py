@@ -1,8 +1,14 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from newsfeeds.models import NewsFeed
 from friendships.models import Friendship
 from rest_framework.test import APIClient
 from testing.testcases import TestCase
 from rest_framework import status
+from unittest import mock
+from utils.snowflake import get_generator
+import json
 
 NEWSFEEDS_URL = '/api/newsfeeds/'
 POST_TWEETS_URL = '/api/tweets/'
@@ -50,4 +56,226 @@ class NewsFeedApiTests(TestCase):
         self.assertEqual(
             response.data['newsfeeds'][0]['tweet']['id'],
             posted_tweet_id
-        )
\ No newline at end of file
+        )
+
+    def test_ids_are_json_strings(self):
+        tweet = self.create_tweet(self.cosmo)
+        newsfeed = self.create_newsfeed(self.lucky, tweet)
+        response = self.lucky_client.get(NEWSFEEDS_URL)
+        data = json.loads(response.content)
+        self.assertEqual(data['newsfeeds'][0]['id'], str(newsfeed.id))
+        self.assertEqual(data['newsfeeds'][0]['tweet']['id'], str(tweet.id))
+
+    def test_pagination(self):
+        page_size = 20
+        newsfeeds = [
+            self.create_newsfeed(self.lucky, self.create_tweet(self.cosmo))
+            for i in range(page_size + 5)
+        ]
+        newsfeeds.reverse()
+
+        # the newest page
+        response = self.lucky_client.get(NEWSFEEDS_URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(len(response.data['newsfeeds']), page_size)
+        for i in range(page_size):
+            self.assertEqual(
+                response.data['newsfeeds'][i]['id'],
+                str(newsfeeds[i].id),
+            )
+        # the cursor is the id of the tweet, which is ordered by time
+        self.assertEqual(
+            response.data['before_cursor'],
+            str(newsfeeds[page_size - 1].tweet_id),
+        )
+
+        # scroll down to the older newsfeeds
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(len(response.data['newsfeeds']), 5)
+        self.assertEqual(
+            response.data['newsfeeds'][-1]['id'],
+            str(newsfeeds[-1].id),
+        )
+
+        # pull to refresh, nothing new yet
+        response = self.lucky_client.get(NEWSFEEDS_URL)
+        after_cursor = response.data['after_cursor']
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'after': after_cursor,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(len(response.data['newsfeeds']), 0)
+
+        # new newsfeeds do not move the cursor, only the new ones come back
+        new_newsfeeds = [
+            self.create_newsfeed(self.lucky, self.create_tweet(self.cosmo))
+            for i in range(3)
+        ]
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'after': after_cursor,
+            'size': 2,
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [newsfeed['id'] for newsfeed in response.data['newsfeeds']],
+            [str(new_newsfeeds[1].id), str(new_newsfeeds[0].id)],
+        )
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'after': response.data['after_cursor'],
+            'size': 2,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            response.data['newsfeeds'][0]['id'],
+            str(new_newsfeeds[2].id),
+        )
+
+        # invalid cursor
+        response = self.lucky_client.get(NEWSFEEDS_URL, {'before': 'abc'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(NEWSFEED_PUSH_MAX_FOLLOWERS=1)
+    def test_pull_tweets_of_popular_accounts(self):
+        # star has 2 followers, above the limit, the tweets of star are pulled
+        star, star_client = self.create_user_and_client('star')
+        Friendship.objects.create(from_user=self.lucky, to_user=star)
+        Friendship.objects.create(from_user=self.cosmo, to_user=star)
+        # cosmo has 1 follower, the tweets of cosmo are pushed
+        Friendship.objects.create(from_user=self.lucky, to_user=self.cosmo)
+
+        # pushed before star became popular, only shows up once
+        old_tweet = self.create_tweet(star)
+        self.create_newsfeed(self.lucky, old_tweet)
+
+        tweet_ids = [str(old_tweet.id)]
+        for i in range(3):
+            for client in [star_client, self.cosmo_client]:
+                response = client.post(POST_TWEETS_URL, {
+                    'content': 'tweet number {}'.format(i),
+                })
+                tweet_ids.append(response.data['id'])
+        tweet_ids.reverse()
+        # no newsfeed is written for the followers of star
+        self.assertEqual(
+            NewsFeed.objects.filter(user=self.lucky, tweet__user=star).count(),
+            1,
+        )
+
+        # the pushed and the pulled tweets are merged by time
+        response = self.lucky_client.get(NEWSFEEDS_URL)
+        self.assertEqual(
+            [newsfeed['tweet']['id'] for newsfeed in response.data['newsfeeds']],
+            tweet_ids,
+        )
+
+        # scroll down page by page, every tweet shows up once in order
+        results = []
+        params = {'size': 2}
+        while True:
+            response = self.lucky_client.get(NEWSFEEDS_URL, params)
+            results.extend(
+                newsfeed['tweet']['id']
+                for newsfeed in response.data['newsfeeds']
+            )
+            if not response.data['has_next_page']:
+                break
+            params['before'] = response.data['before_cursor']
+        self.assertEqual(results, tweet_ids)
+
+        # walk up from the bottom through both pushed and pulled tweets
+        after_cursor = response.data['after_cursor']
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'after': after_cursor,
+            'size': 2,
+        })
+        self.assertEqual(
+            [newsfeed['tweet']['id'] for newsfeed in response.data['newsfeeds']],
+            tweet_ids[-3:-1],
+        )
+        self.assertEqual(response.data['has_next_page'], True)
+
+        # the author always sees its own tweets, they are pulled
+        response = star_client.get(NEWSFEEDS_URL)
+        self.assertEqual(len(response.data['newsfeeds']), 4)
+
+        # a pulled tweet has no newsfeed row, reading it again returns the
+        # same ids and takes no snowflake id
+        generator = get_generator()
+        with mock.patch.object(
+            generator,
+            'next_ids',
+            wraps=generator.next_ids,
+        ) as next_ids:
+            ids = [
+                [
+                    newsfeed['id']
+                    for newsfeed in self.lucky_client.get(
+                        NEWSFEEDS_URL,
+                    ).data['newsfeeds']
+                ]
+                for _ in range(2)
+            ]
+        self.assertEqual(next_ids.call_count, 0)
+        self.assertEqual(ids[0], ids[1])
+        # only the old tweet and the tweets of cosmo were pushed
+        self.assertEqual(
+            len([newsfeed_id for newsfeed_id in ids[0] if newsfeed_id]),
+            4,
+        )
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        def get_queries_count():
+            # compare the queries with a cold cache
+            self.clear_cache()
+            with CaptureQueriesContext(connection) as context:
+                response = self.lucky_client.get(NEWSFEEDS_URL)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context)
+
+        tweet = self.create_tweet(self.cosmo)
+        self.create_newsfeed(self.lucky, tweet)
+        queries_count = get_queries_count()
+
+        for i in range(5):
+            tweet = self.create_tweet(self.create_user('user{}'.format(i)))
+            self.create_newsfeed(self.lucky, tweet)
+            self.create_comment(self.cosmo, tweet)
+            self.create_like(self.lucky, tweet)
+        self.assertEqual(get_queries_count(), queries_count)
+
+    @override_settings(NEWSFEED_CACHE_LIMIT=3)
+    def test_pagination_past_cached_newsfeeds(self):
+        newsfeeds = [
+            self.create_newsfeed(self.lucky, self.create_tweet(self.cosmo))
+            for i in range(5)
+        ]
+        newsfeeds.reverse()
+
+        response = self.lucky_client.get(NEWSFEEDS_URL, {'size': 2})
+        self.assertEqual(
+            [newsfeed['id'] for newsfeed in response.data['newsfeeds']],
+            [str(newsfeeds[0].id), str(newsfeeds[1].id)],
+        )
+        # the next page goes beyond the cached list and reads the database
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'before': response.data['before_cursor'],
+            'size': 2,
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [newsfeed['id'] for newsfeed in response.data['newsfeeds']],
+            [str(newsfeeds[2].id), str(newsfeeds[3].id)],
+        )
+        response = self.lucky_client.get(NEWSFEEDS_URL, {
+            'before': response.data['before_cursor'],
+            'size': 2,
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [newsfeed['id'] for newsfeed in response.data['newsfeeds']],
+            [str(newsfeeds[4].id)],
+        )
@@ -1,13 +1,20 @@
-from rest_framework import viewsets, status
-from rest_framework.decorators import permission_classes
+from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from newsfeeds.models import NewsFeed
+from newsfeeds.api.paginations import NewsFeedPagination
 from newsfeeds.api.serializers import NewsFeedSerializer
+from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
+from tweets.services import TweetService
 
 
 class NewsFeedViewSet(viewsets.GenericViewSet):
+    """
+    GET /api/newsfeeds/ -> the newest page of the current user's newsfeed
+    GET /api/newsfeeds/?before=<cursor>&size=20 -> older newsfeeds
+    GET /api/newsfeeds/?after=<cursor>&size=20 -> newer newsfeeds
+    """
     permission_classes = (IsAuthenticated,)
+    pagination_class = NewsFeedPagination
 
     def get_queryset(self):
         # Self define the querset since get newsfeed has permission
@@ -17,11 +24,26 @@ class NewsFeedViewSet(viewsets.GenericViewSet):
         return NewsFeed.objects.filter(user=self.request.user)
 
     def list(self, request):
+        # The pushed newsfeeds are merged with the tweets pulled from the
+        # accounts which have too many followers to push to. The first pages
+        # of the pushed newsfeeds come from the cached list of the user, the
+        # rest is fetched with the compound index of user and tweet, never
+        # with an OFFSET scan.
+        page = self.paginator.paginate_querysets(
+            NewsFeedService.get_newsfeed_querysets(request.user),
+            request,
+        )
+        newsfeeds = NewsFeedService.to_newsfeeds(request.user, page)
+        # The tweets of the page are loaded with one query, and everything the
+        # tweets need is loaded before serializing, the number of queries
+        # does not grow with the page size
+        tweets = TweetService.load_tweets(newsfeeds)
         serializer = NewsFeedSerializer(
-            self.get_queryset(),
-            context={'request': request},
+            newsfeeds,
+            context=TweetService.get_serializer_context(request, tweets),
             many=True,
         )
-        return Response({
-            'newsfeeds': serializer.data,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        return self.paginator.get_paginated_response(
+            serializer.data,
+            key='newsfeeds',
+        )
@@ -0,0 +1,27 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:20
+
+from django.db import migrations, models
+import utils.snowflake
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsfeeds', '0002_newsfeed_created_at_from_tweet'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='newsfeed',
+            options={'ordering': ('user', '-tweet_id')},
+        ),
+        migrations.AlterField(
+            model_name='newsfeed',
+            name='id',
+            field=models.BigIntegerField(default=utils.snowflake.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='newsfeed',
+            index_together=set(),
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations
+from django.db.models import F, OuterRef, Subquery
+
+CHUNK_SIZE = 1000
+
+
+def backfill_created_at(apps, schema_editor):
+    # 0002_newsfeed_created_at_from_tweet only changed the default of
+    # created_at, the newsfeeds written before it keep the time of the fanout.
+    # They are set to the time of their tweet here, the pushed and the pulled
+    # tweets sort the same way in the newsfeeds. A chunk of newsfeeds at a
+    # time, the rows which are right already are not written.
+    NewsFeed = apps.get_model('newsfeeds', 'NewsFeed')
+    Tweet = apps.get_model('tweets', 'Tweet')
+
+    last_id = None
+    while True:
+        newsfeeds = NewsFeed.objects.order_by('id')
+        if last_id is not None:
+            newsfeeds = newsfeeds.filter(id__gt=last_id)
+        newsfeed_ids = list(
+            newsfeeds.values_list('id', flat=True)[:CHUNK_SIZE],
+        )
+        if not newsfeed_ids:
+            break
+        last_id = newsfeed_ids[-1]
+        NewsFeed.objects.filter(
+            id__in=newsfeed_ids,
+            tweet__isnull=False,
+        ).exclude(
+            created_at=F('tweet__created_at'),
+        ).update(
+            created_at=Subquery(
+                Tweet.objects.filter(id=OuterRef('tweet_id'))
+                .values('created_at')[:1]
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsfeeds', '0003_snowflake_ids'),
+        ('tweets', '0005_snowflake_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+    ]
@@ -1,18 +1,36 @@
 from django.db import models
 from django.contrib.auth.models import User
 from tweets.models import Tweet
+from utils.memcached_helper import MemcachedHelper
+from utils.snowflake import generate_id
+from utils.time_helpers import utc_now
 
 
 class NewsFeed(models.Model):
+    # a snowflake id, see utils/snowflake.py
+    id = models.BigIntegerField(
+        primary_key=True,
+        default=generate_id,
+        editable=False,
+    )
     # user, who will receive the tweet, not the one who post the tweet
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     tweet = models.ForeignKey(Tweet, on_delete=models.SET_NULL, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # the time of the tweet rather than the time of the fanout
+    created_at = models.DateTimeField(default=utc_now)
 
     class Meta:
-        index_together = (('user', 'created_at'),)
+        # The newsfeeds of a user are sorted by the tweet id, which is ordered
+        # by time, through the index of (user, tweet) of the unique together
         unique_together = (('user', 'tweet'),)
-        ordering = ('user', '-created_at',)
+        ordering = ('user', '-tweet_id',)
+
+    @property
+    def cached_tweet(self):
+        # the tweet loaded in a batch by TweetService.load_tweets is used as is
+        if NewsFeed.tweet.is_cached(self):
+            return self.tweet
+        return MemcachedHelper.get_object_through_cache(Tweet, self.tweet_id)
 
     def __str__(self):
         return f'{self.created_at} inbox of {self.user}: {self.tweet}'
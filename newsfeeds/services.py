@@ -1,21 +1,417 @@
-from newsfeeds.models import NewsFeed
+from array import array
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
 from friendships.services import FriendshipService
+from jobs.services import JobService
+from newsfeeds.models import NewsFeed
+from tweets.models import Tweet
+from utils.metrics import FANOUT_ROWS, record_cache_reads
+from utils.paginations import CachedRows
+from utils.snowflake import generate_ids
+from utils.time_helpers import (
+    datetime_to_microseconds,
+    microseconds_to_datetime,
+    utc_now,
+)
+import time
+
+# v2: the cached entries start with the tweet id, the lists cached with the
+# created_at first are not read
+NEWSFEEDS_PATTERN = 'newsfeeds_v2:{user_id}'
+NEWSFEEDS_ACTIVE_PATTERN = 'newsfeeds_active:{user_id}'
+NEWSFEEDS_LOCK_PATTERN = 'newsfeeds_lock:{user_id}'
+PULLED_USERS_PATTERN = 'pulled_users:{user_id}'
+# bumped when an account starts or stops being pulled, the cached pulled
+# followings of every user are read again
+PULLED_USERS_VERSION_KEY = 'pulled_users_version'
 
 
 class NewsFeedService(object):
 
     @classmethod
     def fanout_to_followers(cls, tweet):
-        followers = FriendshipService.get_followers(tweet.user)
+        # The fanout is executed by a background worker, the latency of
+        # posting a tweet does not depend on the followers count. Call it in
+        # the transaction of the tweet, the job is committed with the tweet.
+        # The author sees the tweet right after posting it, the own tweets
+        # are pulled when reading the newsfeeds.
+        JobService.enqueue('fanout_newsfeeds', tweet_id=tweet.id)
+
+    @classmethod
+    def is_pulled_user(cls, followers_count):
+        # Pushing a tweet writes one newsfeed per follower, it does not work
+        # for the accounts with millions of followers. Their tweets are not
+        # pushed, the followers pull them when reading the newsfeeds.
+        return followers_count > settings.NEWSFEED_PUSH_MAX_FOLLOWERS
+
+    @classmethod
+    def batch_fanout_to_followers(cls, tweet):
+        followers_count = FriendshipService.get_followers_count(tweet.user_id)
+        if cls.is_pulled_user(followers_count):
+            return
 
         # Wrong approach: for loop + query, very slow opreation
         # for follower in followers:
         #     NewsFeed.objects.create(user=follower, tweet=tweet)
 
-        # Correct approach: use bulk_create
+        # Correct approach: use bulk_create, one chunk of followers at a time
+        # so that neither the memory of the worker nor the INSERT statement
+        # grows with the followers count
+        chunk_size = settings.NEWSFEED_FANOUT_CHUNK_SIZE
+        follower_ids = []
+        for follower_id in FriendshipService.iter_follower_ids(
+            tweet.user_id,
+            chunk_size,
+        ):
+            follower_ids.append(follower_id)
+            if len(follower_ids) == chunk_size:
+                cls.create_newsfeeds(tweet, follower_ids)
+                follower_ids = []
+        if follower_ids:
+            cls.create_newsfeeds(tweet, follower_ids)
+
+    @classmethod
+    def create_newsfeeds(cls, tweet, user_ids):
+        # the snowflake ids of the chunk are taken at once, not one per row
         newsfeeds = [
-            NewsFeed(user=follower, tweet=tweet)
-            for follower in followers
+            NewsFeed(
+                id=newsfeed_id,
+                user_id=user_id,
+                tweet=tweet,
+                created_at=tweet.created_at,
+            )
+            for newsfeed_id, user_id in zip(
+                generate_ids(len(user_ids)),
+                user_ids,
+            )
+        ]
+        # ignore_conflicts makes it safe to run the fanout job again, the
+        # newsfeeds written by the previous run are skipped
+        NewsFeed.objects.bulk_create(
+            newsfeeds,
+            batch_size=settings.NEWSFEED_FANOUT_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        # the rows skipped as conflicts are counted as well
+        FANOUT_ROWS.inc(len(newsfeeds))
+        cls.push_tweet_to_cache(tweet, user_ids)
+
+    @classmethod
+    def get_pulled_user_ids(cls, user):
+        """
+        Return the ids of the followed accounts whose tweets are pulled. The
+        list is cached per user with the version of the pulled accounts it
+        was computed with, a read costs one get_many instead of loading all
+        the followings and their stats.
+        """
+        key = PULLED_USERS_PATTERN.format(user_id=user.id)
+        cached = cache.get_many([PULLED_USERS_VERSION_KEY, key])
+        version = cached.get(PULLED_USERS_VERSION_KEY, 0)
+        if key in cached and cached[key][0] == version:
+            record_cache_reads('pulled_users', hits=1, misses=0)
+            return cached[key][1]
+        record_cache_reads('pulled_users', hits=0, misses=1)
+
+        following_user_ids = FriendshipService.get_following_user_ids(user.id)
+        followers_count_map = FriendshipService.get_followers_count_map(
+            following_user_ids,
+        )
+        pulled_user_ids = [
+            user_id
+            for user_id, followers_count in followers_count_map.items()
+            if cls.is_pulled_user(followers_count)
         ]
-        newsfeeds.append(NewsFeed(user=tweet.user, tweet=tweet))
-        NewsFeed.objects.bulk_create(newsfeeds)
+        cache.set(
+            key,
+            (version, pulled_user_ids),
+            timeout=settings.NEWSFEED_PULLED_USERS_TIMEOUT,
+        )
+        return pulled_user_ids
+
+    @classmethod
+    def invalidate_pulled_user_ids(cls, user_id):
+        # called when the user follows or unfollows somebody
+        key = PULLED_USERS_PATTERN.format(user_id=user_id)
+        cache.delete(key)
+        # deleted again after the commit, see MemcachedHelper
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: cache.delete(key))
+
+    @classmethod
+    def invalidate_all_pulled_user_ids(cls):
+        """
+        Called when an account starts or stops being pulled. The lists of its
+        followers are not deleted one by one, the version of the pulled
+        accounts changes and every cached list becomes outdated.
+        """
+        def bump_version():
+            cache.set(
+                PULLED_USERS_VERSION_KEY,
+                datetime_to_microseconds(utc_now()),
+                timeout=None,
+            )
+
+        bump_version()
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(bump_version)
+
+    @classmethod
+    def get_newsfeed_querysets(cls, user):
+        """
+        The querysets which make up the newsfeed of the user: the pushed
+        newsfeeds (served from the cached list), and the own tweets of the
+        user together with the tweets of every followed account whose tweets
+        are pulled. The tweets are read with one IN query whatever the number
+        of pulled accounts.
+        """
+        user_ids = [user.id] + cls.get_pulled_user_ids(user)
+        return [
+            cls.get_cached_newsfeeds(user),
+            Tweet.objects.filter(user_id__in=user_ids)
+            .annotate(tweet_id=F('id')),
+        ]
+
+    @classmethod
+    def to_newsfeeds(cls, user, objects):
+        """
+        Turn the pulled tweets in a newsfeed page into unsaved newsfeeds, so
+        that the page renders in the same way as a pushed one. A pulled
+        tweet has no newsfeed row, its id is None rather than a new
+        snowflake id on every read.
+        """
+        return [
+            obj if isinstance(obj, NewsFeed) else NewsFeed(
+                id=None,
+                user=user,
+                tweet=obj,
+                created_at=obj.created_at,
+            )
+            for obj in objects
+        ]
+
+    # The newest pushed newsfeeds of a user are cached as one capped list, the
+    # first pages of the newsfeeds are read without touching the database.
+    # The list is packed into an array of 64 bit integers: the time it was
+    # loaded from the database, followed by one (tweet_id, newsfeed_id,
+    # created_at in microseconds) triple per newsfeed, newest tweet first.
+    # 200 newsfeeds take less than 5KB in memcached.
+
+    @classmethod
+    def serialize_cached_newsfeeds(cls, loaded_at, entries):
+        values = array('q', [loaded_at])
+        for entry in entries:
+            values.extend(entry)
+        return values.tobytes()
+
+    @classmethod
+    def deserialize_cached_newsfeeds(cls, data):
+        values = array('q')
+        values.frombytes(data)
+        entries = [
+            tuple(values[i:i + 3])
+            for i in range(1, len(values), 3)
+        ]
+        return values[0], entries
+
+    @classmethod
+    def to_cache_entry(cls, newsfeed):
+        return (
+            newsfeed.tweet_id,
+            newsfeed.id,
+            datetime_to_microseconds(newsfeed.created_at),
+        )
+
+    @classmethod
+    def load_cached_newsfeed_entries(cls, user):
+        # The newsfeeds of deleted tweets are not shown. They are left out by
+        # the query, not after it: every row loaded is an entry, a list
+        # shorter than the cap then really holds all the newsfeeds
+        newsfeeds = NewsFeed.objects.filter(
+            user=user,
+            tweet_id__isnull=False,
+        ).order_by('-tweet_id')[:settings.NEWSFEED_CACHE_LIMIT]
+        entries = [cls.to_cache_entry(newsfeed) for newsfeed in newsfeeds]
+        # the list is sorted in the same order as the pagination cursor
+        entries.sort(reverse=True)
+        return entries
+
+    @classmethod
+    def get_cached_newsfeeds(cls, user):
+        """
+        Return the pushed newsfeeds of the user as CachedRows, the list is
+        loaded from the database on a cache miss. Reading the newsfeeds also
+        marks the user as active, fanout only pushes into the lists of the
+        active users.
+        """
+        cache.set(
+            NEWSFEEDS_ACTIVE_PATTERN.format(user_id=user.id),
+            True,
+            timeout=settings.NEWSFEED_CACHE_ACTIVE_TIMEOUT,
+        )
+
+        key = NEWSFEEDS_PATTERN.format(user_id=user.id)
+        now = int(utc_now().timestamp())
+        data = cache.get(key)
+        entries = None
+        if data is not None:
+            loaded_at, entries = cls.deserialize_cached_newsfeeds(data)
+            # a push racing with the load of the list can be lost, reloading
+            # the list every now and then bounds how long it stays stale
+            if now - loaded_at > settings.NEWSFEED_CACHE_MAX_AGE:
+                entries = None
+        record_cache_reads(
+            'newsfeeds',
+            hits=int(entries is not None),
+            misses=int(entries is None),
+        )
+        if entries is None:
+            entries = cls.load_cached_newsfeed_entries(user)
+            cache.set(
+                key,
+                cls.serialize_cached_newsfeeds(now, entries),
+                timeout=settings.NEWSFEED_CACHE_ACTIVE_TIMEOUT,
+            )
+
+        newsfeeds = [
+            NewsFeed(
+                id=newsfeed_id,
+                user_id=user.id,
+                tweet_id=tweet_id,
+                created_at=microseconds_to_datetime(created_at),
+            )
+            for tweet_id, newsfeed_id, created_at in entries
+        ]
+        return CachedRows(
+            newsfeeds,
+            NewsFeed.objects.filter(user=user),
+            # a list shorter than the cap holds all the newsfeeds of the user
+            is_complete=len(entries) < settings.NEWSFEED_CACHE_LIMIT,
+        )
+
+    @classmethod
+    def get_active_cached_lists(cls, user_ids):
+        """
+        Return {user_id: cached list} of the users who read the newsfeeds
+        recently and whose list is cached, with one get_many.
+        """
+        active_keys = {
+            user_id: NEWSFEEDS_ACTIVE_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        list_keys = {
+            user_id: NEWSFEEDS_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        cached = cache.get_many(
+            list(active_keys.values()) + list(list_keys.values()),
+        )
+        # the list of a user who stopped reading the newsfeeds is not written
+        # anymore and expires, the next read loads it from the database
+        return {
+            user_id: cached[list_keys[user_id]]
+            for user_id in user_ids
+            if active_keys[user_id] in cached and list_keys[user_id] in cached
+        }
+
+    @classmethod
+    def push_tweet_to_cache(cls, tweet, user_ids):
+        cached_lists = cls.get_active_cached_lists(user_ids)
+        if not cached_lists:
+            return
+        # bulk_create does not return the ids of the newsfeeds, they are read
+        # back for the users whose lists are cached only
+        newsfeed_ids = dict(
+            NewsFeed.objects.filter(
+                tweet=tweet,
+                user_id__in=cached_lists.keys(),
+            ).values_list('user_id', 'id')
+        )
+        cls.push_to_cached_lists(tweet, cached_lists, newsfeed_ids)
+
+    @classmethod
+    def push_to_cached_lists(cls, tweet, cached_lists, newsfeed_ids):
+        # A list is read, updated and written back, two fanout jobs pushing
+        # into the same list at once would lose the tweet of one of them. The
+        # lists are only rewritten under their locks. A job does not wait for
+        # a lock while holding others, it updates the lists it could lock and
+        # tries the busy ones again. A list still locked after
+        # NEWSFEED_CACHE_LOCK_TIMEOUT seconds is deleted instead, the next
+        # read loads it from the database.
+        pending = [
+            user_id
+            for user_id in cached_lists
+            if user_id in newsfeed_ids
+        ]
+        deadline = time.monotonic() + settings.NEWSFEED_CACHE_LOCK_TIMEOUT
+        while pending:
+            locked, pending = cls.lock_cached_lists(pending)
+            if locked:
+                cls.update_cached_lists(tweet, locked, newsfeed_ids)
+            if not pending:
+                break
+            if time.monotonic() > deadline:
+                cache.delete_many([
+                    NEWSFEEDS_PATTERN.format(user_id=user_id)
+                    for user_id in pending
+                ])
+                break
+            time.sleep(0.01)
+
+    @classmethod
+    def lock_cached_lists(cls, user_ids):
+        """
+        Return (locked user ids, busy user ids). A lock left by a crashed
+        worker expires after NEWSFEED_CACHE_LOCK_TIMEOUT seconds.
+        """
+        locked, busy = [], []
+        for user_id in user_ids:
+            if cache.add(
+                NEWSFEEDS_LOCK_PATTERN.format(user_id=user_id),
+                1,
+                timeout=settings.NEWSFEED_CACHE_LOCK_TIMEOUT,
+            ):
+                locked.append(user_id)
+            else:
+                busy.append(user_id)
+        return locked, busy
+
+    @classmethod
+    def update_cached_lists(cls, tweet, user_ids, newsfeed_ids):
+        created_at = datetime_to_microseconds(tweet.created_at)
+        list_keys = {
+            user_id: NEWSFEEDS_PATTERN.format(user_id=user_id)
+            for user_id in user_ids
+        }
+        try:
+            # read again under the locks, another job may have pushed into
+            # the lists since they were read
+            cached = cache.get_many(list(list_keys.values()))
+            updated = {}
+            for user_id, key in list_keys.items():
+                # expired since, the next read loads it from the database
+                if key not in cached:
+                    continue
+                loaded_at, entries = cls.deserialize_cached_newsfeeds(
+                    cached[key],
+                )
+                if any(entry[0] == tweet.id for entry in entries):
+                    continue
+                entries.append((tweet.id, newsfeed_ids[user_id], created_at))
+                # a tweet fanned out late by the job queue can land below the
+                # newer ones
+                entries.sort(reverse=True)
+                updated[key] = cls.serialize_cached_newsfeeds(
+                    loaded_at,
+                    entries[:settings.NEWSFEED_CACHE_LIMIT],
+                )
+            cache.set_many(
+                updated,
+                timeout=settings.NEWSFEED_CACHE_ACTIVE_TIMEOUT,
+            )
+        finally:
+            cache.delete_many([
+                NEWSFEEDS_LOCK_PATTERN.format(user_id=user_id)
+                for user_id in user_ids
+            ])
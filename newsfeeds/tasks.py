@@ -0,0 +1,12 @@
+from jobs.services import JobService
+from newsfeeds.services import NewsFeedService
+from tweets.models import Tweet
+
+
+@JobService.register('fanout_newsfeeds')
+def fanout_newsfeeds_task(tweet_id):
+    tweet = Tweet.objects.filter(id=tweet_id).first()
+    # the tweet has been deleted before the job runs
+    if tweet is None:
+        return
+    NewsFeedService.batch_fanout_to_followers(tweet)
@@ -0,0 +1,212 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from friendships.models import Friendship
+from jobs.models import Job
+from newsfeeds.models import NewsFeed
+from newsfeeds.services import (
+    NEWSFEEDS_LOCK_PATTERN,
+    NEWSFEEDS_PATTERN,
+    NewsFeedService,
+)
+from testing.testcases import TestCase
+
+
+class NewsFeedServiceTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        for i in range(5):
+            follower = self.create_user('lucky_follower_{}'.format(i))
+            Friendship.objects.create(from_user=follower, to_user=self.lucky)
+        self.follower = follower
+
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_fanout_to_followers_enqueue_job(self):
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.fanout_to_followers(tweet)
+
+        # only the job is written in the request
+        self.assertEqual(NewsFeed.objects.count(), 0)
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'fanout_newsfeeds')
+        self.assertEqual(job.payload, {'tweet_id': tweet.id})
+
+    @override_settings(
+        NEWSFEED_FANOUT_CHUNK_SIZE=2,
+        NEWSFEED_FANOUT_BATCH_SIZE=1,
+    )
+    def test_batch_fanout_to_followers(self):
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.batch_fanout_to_followers(tweet)
+        self.assertEqual(NewsFeed.objects.filter(tweet=tweet).count(), 5)
+
+        # run the fanout again, no duplicate newsfeeds
+        NewsFeedService.batch_fanout_to_followers(tweet)
+        self.assertEqual(NewsFeed.objects.filter(tweet=tweet).count(), 5)
+
+    @override_settings(NEWSFEED_PUSH_MAX_FOLLOWERS=4)
+    def test_batch_fanout_to_followers_skips_popular_accounts(self):
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.batch_fanout_to_followers(tweet)
+        self.assertEqual(NewsFeed.objects.filter(tweet=tweet).count(), 0)
+
+    def test_get_cached_newsfeeds(self):
+        tweets = [self.create_tweet(self.lucky) for i in range(3)]
+        for tweet in tweets:
+            NewsFeedService.fanout_to_followers(tweet)
+
+        # cache miss, the list is loaded from the database
+        rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(rows.is_complete, True)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in rows.objects],
+            [tweet.id for tweet in reversed(tweets)],
+        )
+
+        # cache hit, no query
+        with self.assertNumQueries(0):
+            rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(len(rows.objects), 3)
+
+        # fanout pushes the new tweet into the list of the active user
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.fanout_to_followers(tweet)
+        with self.assertNumQueries(0):
+            rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(rows.objects[0].tweet_id, tweet.id)
+        self.assertEqual(
+            rows.objects[0].id,
+            NewsFeed.objects.get(user=self.follower, tweet=tweet).id,
+        )
+
+    @override_settings(NEWSFEED_CACHE_LIMIT=2)
+    def test_cached_newsfeeds_are_capped(self):
+        for i in range(3):
+            NewsFeedService.fanout_to_followers(self.create_tweet(self.lucky))
+        rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(len(rows.objects), 2)
+        # the older newsfeeds are read from the database
+        self.assertEqual(rows.is_complete, False)
+
+        NewsFeedService.fanout_to_followers(self.create_tweet(self.lucky))
+        rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(len(rows.objects), 2)
+
+    @override_settings(NEWSFEED_CACHE_LIMIT=2)
+    def test_cached_newsfeeds_with_deleted_tweets(self):
+        tweets = [self.create_tweet(self.lucky) for i in range(3)]
+        for tweet in tweets:
+            NewsFeedService.fanout_to_followers(tweet)
+        # the newsfeed of a deleted tweet is kept without its tweet
+        tweets[2].delete()
+        rows = NewsFeedService.get_cached_newsfeeds(self.follower)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in rows.objects],
+            [tweets[1].id, tweets[0].id],
+        )
+        # the list is full, older newsfeeds may be left in the database
+        self.assertEqual(rows.is_complete, False)
+
+    def test_fanout_skips_inactive_users(self):
+        follower = self.follower
+        rows = NewsFeedService.get_cached_newsfeeds(follower)
+        self.assertEqual(rows.objects, [])
+
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.fanout_to_followers(tweet)
+        rows = NewsFeedService.get_cached_newsfeeds(follower)
+        self.assertEqual(rows.objects[0].tweet_id, tweet.id)
+
+        # the follower has not read the newsfeeds for a while
+        cache.delete('newsfeeds_active:{}'.format(follower.id))
+        NewsFeedService.fanout_to_followers(self.create_tweet(self.lucky))
+        data = cache.get(NEWSFEEDS_PATTERN.format(user_id=follower.id))
+        _, entries = NewsFeedService.deserialize_cached_newsfeeds(data)
+        self.assertEqual(len(entries), 1)
+
+    def test_push_rereads_the_list_under_the_lock(self):
+        follower = self.follower
+        NewsFeedService.get_cached_newsfeeds(follower)
+        # two fanout jobs read the list before either of them writes it
+        cached_lists = NewsFeedService.get_active_cached_lists([follower.id])
+        first = self.create_tweet(self.lucky)
+        NewsFeedService.fanout_to_followers(first)
+        second = self.create_tweet(self.lucky)
+        newsfeed = self.create_newsfeed(follower, second)
+        NewsFeedService.push_to_cached_lists(
+            second,
+            cached_lists,
+            {follower.id: newsfeed.id},
+        )
+        rows = NewsFeedService.get_cached_newsfeeds(follower)
+        self.assertEqual(
+            [newsfeed.tweet_id for newsfeed in rows.objects],
+            [second.id, first.id],
+        )
+        # the lock is released
+        self.assertEqual(
+            cache.get(NEWSFEEDS_LOCK_PATTERN.format(user_id=follower.id)),
+            None,
+        )
+
+    @override_settings(NEWSFEED_CACHE_LOCK_TIMEOUT=0)
+    def test_push_deletes_a_locked_list(self):
+        follower = self.follower
+        other = User.objects.get(username='lucky_follower_0')
+        NewsFeedService.get_cached_newsfeeds(follower)
+        NewsFeedService.get_cached_newsfeeds(other)
+        # another job holds the lock of the list of follower
+        cache.set(NEWSFEEDS_LOCK_PATTERN.format(user_id=follower.id), 1)
+        tweet = self.create_tweet(self.lucky)
+        NewsFeedService.fanout_to_followers(tweet)
+        self.assertEqual(
+            cache.get(NEWSFEEDS_PATTERN.format(user_id=follower.id)),
+            None,
+        )
+        # the list whose lock was free is updated
+        with self.assertNumQueries(0):
+            rows = NewsFeedService.get_cached_newsfeeds(other)
+        self.assertEqual(rows.objects[0].tweet_id, tweet.id)
+
+    @override_settings(NEWSFEED_PUSH_MAX_FOLLOWERS=1)
+    def test_get_pulled_user_ids(self):
+        # lucky has 5 followers and is pulled
+        star = self.create_user('star')
+        Friendship.objects.create(from_user=self.follower, to_user=star)
+        self.assertEqual(
+            NewsFeedService.get_pulled_user_ids(self.follower),
+            [self.lucky.id],
+        )
+        # cached, no query
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                NewsFeedService.get_pulled_user_ids(self.follower),
+                [self.lucky.id],
+            )
+
+        # star gets a second follower and is pulled from now on
+        other = User.objects.get(username='lucky_follower_0')
+        Friendship.objects.create(from_user=other, to_user=star)
+        self.assertEqual(
+            sorted(NewsFeedService.get_pulled_user_ids(self.follower)),
+            [self.lucky.id, star.id],
+        )
+        self.assertEqual(
+            sorted(NewsFeedService.get_pulled_user_ids(other)),
+            [self.lucky.id, star.id],
+        )
+
+        # follower unfollows lucky
+        Friendship.objects.filter(
+            from_user=self.follower,
+            to_user=self.lucky,
+        ).delete()
+        self.assertEqual(
+            NewsFeedService.get_pulled_user_ids(self.follower),
+            [star.id],
+        )
+
+        # star loses a follower and is pushed again
+        Friendship.objects.filter(from_user=other, to_user=star).delete()
+        self.assertEqual(NewsFeedService.get_pulled_user_ids(self.follower), [])
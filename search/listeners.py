@@ -0,0 +1,25 @@
+def index_tweet(sender, instance, created, **kwargs):
+    # import here to avoid the circular import with search.models
+    from search.models import TweetDocument
+
+    if created:
+        TweetDocument.objects.create(
+            tweet_id=instance.id,
+            content=instance.content,
+        )
+        return
+    updated = TweetDocument.objects.filter(tweet_id=instance.id).update(
+        content=instance.content,
+    )
+    if not updated:
+        # the tweet was written before the search index, or by bulk_create
+        TweetDocument.objects.create(
+            tweet_id=instance.id,
+            content=instance.content,
+        )
+
+
+def unindex_tweet(sender, instance, **kwargs):
+    from search.models import TweetDocument
+
+    TweetDocument.objects.filter(tweet_id=instance.id).delete()
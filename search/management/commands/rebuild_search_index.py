@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from search.models import TweetDocument
+from tweets.models import Tweet
+
+
+class Command(BaseCommand):
+    help = (
+        'Index the tweets which are missing from the search index, e.g. the '
+        'tweets written before it or with bulk_create, and drop the '
+        'documents of the deleted tweets.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='How many tweets are checked in one round.',
+        )
+
+    def handle(self, *args, **options):
+        indexed = deleted = 0
+        last_id = 0
+        chunk_size = options['chunk_size']
+        while True:
+            tweets = list(
+                Tweet.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', 'content')[:chunk_size]
+            )
+            if not tweets:
+                break
+            tweet_ids = [tweet_id for tweet_id, _ in tweets]
+            # the documents in the id range of the chunk without a tweet
+            deleted += TweetDocument.objects.filter(
+                tweet_id__gt=last_id,
+                tweet_id__lte=tweet_ids[-1],
+            ).exclude(tweet_id__in=tweet_ids).delete()[0]
+            last_id = tweet_ids[-1]
+            document_ids = set(
+                TweetDocument.objects.filter(tweet_id__in=tweet_ids)
+                .values_list('tweet_id', flat=True)
+            )
+            documents = TweetDocument.objects.bulk_create([
+                TweetDocument(tweet_id=tweet_id, content=content)
+                for tweet_id, content in tweets
+                if tweet_id not in document_ids
+            ])
+            indexed += len(documents)
+        deleted += TweetDocument.objects.filter(
+            tweet_id__gt=last_id,
+        ).delete()[0]
+        self.stdout.write('{} tweets indexed'.format(indexed))
+        self.stdout.write('{} documents deleted'.format(deleted))
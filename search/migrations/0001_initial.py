@@ -0,0 +1,21 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TweetDocument',
+            fields=[
+                ('tweet_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+SQLITE_CREATE = [
+    # external content: the FTS5 table only keeps the index, the text stays
+    # in search_tweetdocument, the rowid is the tweet id
+    """
+    CREATE VIRTUAL TABLE search_tweetdocument_fts USING fts5(
+        content,
+        content='search_tweetdocument',
+        content_rowid='tweet_id'
+    )
+    """,
+    """
+    CREATE TRIGGER search_tweetdocument_ai AFTER INSERT ON search_tweetdocument
+    BEGIN
+        INSERT INTO search_tweetdocument_fts (rowid, content)
+        VALUES (new.tweet_id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER search_tweetdocument_ad AFTER DELETE ON search_tweetdocument
+    BEGIN
+        INSERT INTO search_tweetdocument_fts (
+            search_tweetdocument_fts, rowid, content
+        )
+        VALUES ('delete', old.tweet_id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER search_tweetdocument_au AFTER UPDATE ON search_tweetdocument
+    BEGIN
+        INSERT INTO search_tweetdocument_fts (
+            search_tweetdocument_fts, rowid, content
+        )
+        VALUES ('delete', old.tweet_id, old.content);
+        INSERT INTO search_tweetdocument_fts (rowid, content)
+        VALUES (new.tweet_id, new.content);
+    END
+    """,
+]
+SQLITE_DROP = [
+    'DROP TRIGGER search_tweetdocument_au',
+    'DROP TRIGGER search_tweetdocument_ad',
+    'DROP TRIGGER search_tweetdocument_ai',
+    'DROP TABLE search_tweetdocument_fts',
+]
+MYSQL_CREATE = [
+    'CREATE FULLTEXT INDEX search_tweetdocument_content '
+    'ON search_tweetdocument (content)',
+]
+MYSQL_DROP = [
+    'DROP INDEX search_tweetdocument_content ON search_tweetdocument',
+]
+
+
+def run_statements(schema_editor, statements):
+    statements = statements.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    run_statements(schema_editor, {
+        'sqlite': SQLITE_CREATE,
+        'mysql': MYSQL_CREATE,
+    })
+
+
+def drop_index(apps, schema_editor):
+    run_statements(schema_editor, {
+        'sqlite': SQLITE_DROP,
+        'mysql': MYSQL_DROP,
+    })
+
+
+class Migration(migrations.Migration):
+    """
+    The full text index of the tweets, FTS5 locally and FULLTEXT in
+    production. Both are inverted indexes of the words of the tweets, see
+    search/services.py for the queries.
+    """
+
+    dependencies = [
+        ('search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:20
+
+from django.db import migrations, models
+import importlib
+
+full_text_index = importlib.import_module(
+    'search.migrations.0002_full_text_index',
+)
+
+SQLITE_REBUILD = [
+    "INSERT INTO search_tweetdocument_fts (search_tweetdocument_fts) "
+    "VALUES ('rebuild')",
+]
+
+
+# SQLite alters a column by copying the table into a new one, the triggers of
+# the FTS5 table go with the old table. They are dropped before and created
+# again after, the FTS5 table is rebuilt from the documents. MySQL keeps the
+# FULLTEXT index through the ALTER TABLE.
+
+
+def drop_sqlite_index(apps, schema_editor):
+    full_text_index.run_statements(schema_editor, {
+        'sqlite': full_text_index.SQLITE_DROP,
+    })
+
+
+def create_sqlite_index(apps, schema_editor):
+    full_text_index.run_statements(schema_editor, {
+        'sqlite': full_text_index.SQLITE_CREATE + SQLITE_REBUILD,
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_full_text_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sqlite_index, create_sqlite_index),
+        migrations.AlterField(
+            model_name='tweetdocument',
+            name='tweet_id',
+            field=models.BigIntegerField(primary_key=True, serialize=False),
+        ),
+        migrations.RunPython(create_sqlite_index, drop_sqlite_index),
+    ]
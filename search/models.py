@@ -0,0 +1,25 @@
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from search.listeners import index_tweet, unindex_tweet
+from tweets.models import Tweet
+
+
+class TweetDocument(models.Model):
+    # The searchable copy of a tweet, written by search/listeners.py when a
+    # tweet is created or deleted. The full text index is built on this table
+    # instead of tweets_tweet, the hot table is not rebuilt to add it and a
+    # search only reads the index. The primary key is the tweet id, the
+    # index gives back the tweet ids directly.
+    #
+    # The index itself depends on the database, see search/migrations:
+    # a FULLTEXT index on MySQL, an FTS5 table kept in sync by triggers on
+    # SQLite.
+    tweet_id = models.BigIntegerField(primary_key=True)
+    content = models.TextField()
+
+    def __str__(self):
+        return '{}: {}'.format(self.tweet_id, self.content)
+
+
+post_save.connect(index_tweet, sender=Tweet)
+post_delete.connect(unindex_tweet, sender=Tweet)
@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.db import connection
+from utils.snowflake import SEQUENCE_BITS, WORKER_ID_BITS
+import re
+
+SQLITE_SEARCH = """
+    SELECT rowid FROM search_tweetdocument_fts
+    WHERE search_tweetdocument_fts MATCH %s {condition}
+    ORDER BY rowid {order}
+    LIMIT %s
+"""
+MYSQL_SEARCH = """
+    SELECT tweet_id FROM search_tweetdocument
+    WHERE MATCH (content) AGAINST (%s IN BOOLEAN MODE) {condition}
+    ORDER BY tweet_id {order}
+    LIMIT %s
+"""
+ID_BOUNDS = """
+    SELECT MIN(tweet_id), MAX(tweet_id) FROM search_tweetdocument
+"""
+
+
+class SearchService(object):
+
+    @classmethod
+    def get_terms(cls, query):
+        """
+        The words of the query, lower cased and without duplicates. Only
+        letters, digits and underscores are kept, the operators of FTS5 and
+        of the boolean mode of MySQL cannot be injected.
+        """
+        terms = []
+        for term in re.findall(r'\w+', query.lower()):
+            if len(term) < settings.SEARCH_MIN_TERM_LENGTH:
+                continue
+            if term not in terms:
+                terms.append(term)
+        return terms[:settings.SEARCH_MAX_TERMS]
+
+    @classmethod
+    def search_tweet_ids(cls, query, limit, before_id=None, after_id=None):
+        """
+        Return the ids of at most limit tweets which contain all the terms of
+        the query, newest first, older than before_id. With after_id, the
+        tweets newer than after_id are returned oldest first.
+
+        Ranked by recency, the tweet id grows with the time of the tweet.
+        FTS5 walks the inverted index in rowid order and stops after limit
+        rows, so a page costs the same however many tweets match. MySQL
+        sorts the ids it reads from the FULLTEXT index, see
+        search_id_ranges.
+        """
+        terms = cls.get_terms(query)
+        if not terms:
+            return []
+
+        if connection.vendor == 'mysql':
+            # every term is required
+            match = ' '.join('+' + term for term in terms)
+            return cls.search_id_ranges(
+                MYSQL_SEARCH,
+                'tweet_id',
+                match,
+                limit,
+                before_id,
+                after_id,
+            )
+        if connection.vendor != 'sqlite':
+            raise NotImplementedError(
+                'Search is not supported on {}.'.format(connection.vendor),
+            )
+
+        # quoted strings separated by spaces, every term is required
+        match = ' '.join('"{}"'.format(term) for term in terms)
+        params = [match]
+        condition, order = '', 'DESC'
+        if after_id is not None:
+            condition, order = 'AND rowid > %s', 'ASC'
+            params.append(after_id)
+        elif before_id is not None:
+            condition = 'AND rowid < %s'
+            params.append(before_id)
+        params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SQLITE_SEARCH.format(condition=condition, order=order),
+                params,
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    @classmethod
+    def search_id_ranges(
+        cls,
+        sql,
+        column,
+        match,
+        limit,
+        before_id=None,
+        after_id=None,
+    ):
+        """
+        MySQL sorts every id matching the query before the LIMIT, a common
+        word would sort most of the table for every page. The ids are
+        snowflake ids, a range of ids is a range of time: the search walks
+        back from before_id (or forward from after_id) one range at a time
+        until the page is full, each query only sorts the matches of its
+        range. A range starts at SEARCH_RANGE_SECONDS and doubles every step,
+        a rare word reaches the oldest tweets in a few queries.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(ID_BOUNDS)
+            lowest, highest = cursor.fetchone()
+        if lowest is None:
+            return []
+
+        span = int(settings.SEARCH_RANGE_SECONDS * 1000) << (
+            WORKER_ID_BITS + SEQUENCE_BITS
+        )
+        span = max(span, 1)
+        descending = after_id is None
+        if descending:
+            # the range is [start - span, start)
+            start = highest + 1 if before_id is None else before_id
+        else:
+            # the range is (start, start + span]
+            start = after_id
+
+        ids = []
+        while len(ids) < limit:
+            if descending:
+                if start <= lowest:
+                    break
+                end = max(start - span, lowest)
+                condition = 'AND {column} >= %s AND {column} < %s'
+                bounds, order = [end, start], 'DESC'
+            else:
+                if start >= highest:
+                    break
+                end = min(start + span, highest)
+                condition = 'AND {column} > %s AND {column} <= %s'
+                bounds, order = [start, end], 'ASC'
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    sql.format(
+                        condition=condition.format(column=column),
+                        order=order,
+                    ),
+                    [match] + bounds + [limit - len(ids)],
+                )
+                ids.extend(row[0] for row in cursor.fetchall())
+            start = end
+            span *= 2
+        return ids
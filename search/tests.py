@@ -0,0 +1,124 @@
+from django.core.management import call_command
+from django.test import override_settings
+from io import StringIO
+from search.models import TweetDocument
+from search.services import SQLITE_SEARCH, SearchService
+from testing.testcases import TransactionTestCase
+from tweets.models import Tweet
+from utils.snowflake import get_generator
+
+
+class SearchServiceTests(TransactionTestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+
+    def search(self, query, limit=10, **kwargs):
+        return SearchService.search_tweet_ids(query, limit, **kwargs)
+
+    def test_get_terms(self):
+        self.assertEqual(
+            SearchService.get_terms('Hello, WORLD hello "OR" -a* NEAR(x)'),
+            ['hello', 'world', 'near'],
+        )
+        self.assertEqual(SearchService.get_terms('a b'), [])
+
+    def test_search(self):
+        hello = self.create_tweet(self.lucky, 'hello world')
+        django = self.create_tweet(self.lucky, 'Hello Django world')
+        self.create_tweet(self.lucky, 'good morning')
+
+        # newest first, every term is required
+        self.assertEqual(self.search('hello'), [django.id, hello.id])
+        self.assertEqual(self.search('WORLD hello'), [django.id, hello.id])
+        self.assertEqual(self.search('hello django'), [django.id])
+        self.assertEqual(self.search('hello morning'), [])
+        self.assertEqual(self.search('  '), [])
+
+        # cursors
+        self.assertEqual(self.search('hello', limit=1), [django.id])
+        self.assertEqual(
+            self.search('hello', before_id=django.id),
+            [hello.id],
+        )
+        self.assertEqual(self.search('hello', after_id=hello.id), [django.id])
+
+    def test_incremental_index(self):
+        tweet = self.create_tweet(self.lucky, 'hello world')
+        self.assertEqual(self.search('hello'), [tweet.id])
+
+        tweet.content = 'goodbye world'
+        tweet.save()
+        self.assertEqual(self.search('hello'), [])
+        self.assertEqual(self.search('goodbye'), [tweet.id])
+
+        tweet_id = tweet.id
+        tweet.delete()
+        self.assertEqual(self.search('goodbye'), [])
+        self.assertEqual(TweetDocument.objects.filter(
+            tweet_id=tweet_id,
+        ).exists(), False)
+
+    def test_rebuild_search_index(self):
+        # bulk_create skips the listeners
+        Tweet.objects.bulk_create([
+            Tweet(user=self.lucky, content='hello {}'.format(i))
+            for i in range(5)
+        ])
+        TweetDocument.objects.create(tweet_id=10000, content='deleted tweet')
+        self.assertEqual(self.search('hello'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', chunk_size=2, stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            '5 tweets indexed\n1 documents deleted\n',
+        )
+        self.assertEqual(
+            self.search('hello'),
+            list(Tweet.objects.order_by('-id').values_list('id', flat=True)),
+        )
+        self.assertEqual(self.search('deleted'), [])
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertEqual(
+            out.getvalue(),
+            '0 tweets indexed\n0 documents deleted\n',
+        )
+
+    @override_settings(SEARCH_RANGE_SECONDS=1)
+    def test_search_id_ranges(self):
+        # the MySQL walk over id ranges, run against the FTS5 table
+        def search(limit, **kwargs):
+            return SearchService.search_id_ranges(
+                SQLITE_SEARCH,
+                'rowid',
+                '"hello"',
+                limit,
+                **kwargs,
+            )
+
+        self.assertEqual(search(10), [])
+        # one tweet per second, a match every 3 seconds
+        generator = get_generator()
+        start_ms = generator.get_milliseconds()
+        tweets = [
+            Tweet.objects.create(
+                id=generator.make_id(start_ms + i * 1000, 0),
+                user=self.lucky,
+                content='hello' if i % 3 == 0 else 'good morning',
+            )
+            for i in range(10)
+        ]
+        ids = [tweet.id for tweet in tweets if tweet.content == 'hello']
+
+        # the bounds, then ranges of 1, 2 and 4 seconds: tweets 9 and 6
+        with self.assertNumQueries(4):
+            self.assertEqual(search(2), [ids[3], ids[2]])
+        self.assertEqual(search(10), ids[::-1])
+        self.assertEqual(search(10, before_id=ids[2]), [ids[1], ids[0]])
+        self.assertEqual(search(10, before_id=tweets[0].id), [])
+        self.assertEqual(search(2, after_id=tweets[0].id), [ids[1], ids[2]])
+        self.assertEqual(search(10, after_id=ids[2]), [ids[3]])
+        self.assertEqual(search(10, after_id=ids[3]), [])
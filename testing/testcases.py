@@ -1,14 +1,63 @@
 from comments.models import Comment
+from contextlib import contextmanager
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.test import TestCase as DjangoTestCase
+from django.test import TransactionTestCase as DjangoTransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from functools import wraps
 from likes.models import Like
 from newsfeeds.models import NewsFeed
+from newsfeeds.services import NewsFeedService
 from rest_framework.test import APIClient
 from tweets.models import Tweet
 
 
-class TestCase(DjangoTestCase):
+class TestCaseMixin(object):
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        # the cache is not rolled back with the database after each test
+        self.clear_cache()
+
+    def clear_cache(self):
+        cache.clear()
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, using=DEFAULT_DB_ALIAS):
+        """
+        with self.assertQueryBudget(5): fails if the block runs more than 5
+        queries, the captured SQL is listed in the failure so that the query
+        which shouldn't be there is easy to spot.
+        """
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        if len(context) <= max_queries:
+            return
+        self.fail('{} queries executed, the budget is {}\n{}'.format(
+            len(context),
+            max_queries,
+            '\n'.join(
+                '{}. {}'.format(i, query['sql'])
+                for i, query in enumerate(context.captured_queries, start=1)
+            ),
+        ))
+
+    @staticmethod
+    def query_budget(max_queries):
+        """
+        @TestCase.query_budget(5) puts the whole test method under
+        assertQueryBudget(5).
+        """
+        def decorator(test_func):
+            @wraps(test_func)
+            def _wrapped_test(self, *args, **kwargs):
+                with self.assertQueryBudget(max_queries):
+                    return test_func(self, *args, **kwargs)
+            return _wrapped_test
+        return decorator
 
     @property
     def anonymous_client(self):
@@ -33,7 +82,19 @@ class TestCase(DjangoTestCase):
         return Tweet.objects.create(user=user, content=content)
 
     def create_newsfeed(self, user, tweet):
-        return NewsFeed.objects.create(user=user, tweet=tweet)
+        newsfeed = NewsFeed.objects.create(
+            user=user,
+            tweet=tweet,
+            created_at=tweet.created_at,
+        )
+        # the newsfeed is pushed into the cached list of the user, as the
+        # fanout does
+        NewsFeedService.push_to_cached_lists(
+            tweet,
+            NewsFeedService.get_active_cached_lists([user.id]),
+            {user.id: newsfeed.id},
+        )
+        return newsfeed
 
     def create_comment(self, user, tweet, content=None):
         if content is None:
@@ -54,3 +115,14 @@ class TestCase(DjangoTestCase):
         client = APIClient()
         client.force_authenticate(user)
         return user, client
+
+
+class TestCase(TestCaseMixin, DjangoTestCase):
+    pass
+
+
+class TransactionTestCase(TestCaseMixin, DjangoTransactionTestCase):
+    # The data of a test is committed, for the features which only see the
+    # committed rows, e.g. the FULLTEXT index of MySQL. It is slower, the
+    # tables are emptied after every test.
+    pass
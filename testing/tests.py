@@ -0,0 +1,189 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from friendships.models import Friendship
+from testing.testcases import TestCase
+from tweets.models import TweetMention
+
+
+TWEET_LIST_URL = '/api/tweets/'
+NEWSFEED_LIST_URL = '/api/newsfeeds/'
+COMMENT_LIST_URL = '/api/comments/'
+FOLLOWERS_URL = '/api/friendships/{}/followers/'
+FOLLOWINGS_URL = '/api/friendships/{}/followings/'
+MENTIONS_URL = '/api/tweets/mentions/'
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every list endpoint is read with 1, 10 and 100 items under a query
+    budget, and has to run the same number of queries for all of them. A
+    serializer which starts to query per item fails here.
+    """
+    ITEM_COUNTS = (1, 10, 100)
+
+    def setUp(self):
+        self.lucky, self.lucky_client = self.create_user_and_client('lucky')
+        self.users_count = 0
+
+    def create_users(self, count):
+        # no password hashing, the users are only there to own the rows
+        users = [
+            User(username='user_{}'.format(self.users_count + i))
+            for i in range(count)
+        ]
+        self.users_count += count
+        User.objects.bulk_create(users)
+        return list(User.objects.order_by('-id')[:count])
+
+    def assertQueriesConstant(self, url, params, create_items, budget):
+        """
+        Grow the items to every count of ITEM_COUNTS with create_items(n),
+        read the url with a cold cache every time, and check the queries.
+        """
+        counts = []
+        total = 0
+        for items_count in self.ITEM_COUNTS:
+            create_items(items_count - total)
+            total = items_count
+            self.clear_cache()
+            with self.assertQueryBudget(budget) as context:
+                response = self.lucky_client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(context))
+        self.assertEqual(
+            len(set(counts)),
+            1,
+            'queries grow with the items: {}'.format(
+                dict(zip(self.ITEM_COUNTS, counts)),
+            ),
+        )
+
+    def test_tweets_list(self):
+        def create_items(count):
+            for i in range(count):
+                tweet = self.create_tweet(self.lucky)
+                self.create_like(self.lucky, tweet)
+                self.create_comment(self.lucky, tweet)
+
+        self.assertQueriesConstant(
+            TWEET_LIST_URL,
+            {'user_id': self.lucky.id},
+            create_items,
+            budget=3,
+        )
+
+    def test_newsfeeds_list(self):
+        def create_items(count):
+            for user in self.create_users(count):
+                tweet = self.create_tweet(user)
+                self.create_newsfeed(self.lucky, tweet)
+                self.create_like(self.lucky, tweet)
+
+        self.assertQueriesConstant(
+            NEWSFEED_LIST_URL,
+            {},
+            create_items,
+            budget=6,
+        )
+
+    @override_settings(NEWSFEED_PUSH_MAX_FOLLOWERS=0)
+    def test_newsfeeds_list_with_pulled_followings(self):
+        # every followed account has a follower and is pulled, the queries
+        # do not grow with the number of pulled accounts
+        def create_items(count):
+            for user in self.create_users(count):
+                Friendship.objects.create(from_user=self.lucky, to_user=user)
+                tweet = self.create_tweet(user)
+                self.create_like(self.lucky, tweet)
+
+        self.assertQueriesConstant(
+            NEWSFEED_LIST_URL,
+            {},
+            create_items,
+            budget=8,
+        )
+
+    def test_comments_list(self):
+        tweet = self.create_tweet(self.lucky)
+
+        def create_items(count):
+            for user in self.create_users(count):
+                comment = self.create_comment(user, tweet)
+                self.create_like(self.lucky, comment)
+
+        self.assertQueriesConstant(
+            COMMENT_LIST_URL,
+            {'tweet_id': tweet.id},
+            create_items,
+            budget=4,
+        )
+
+    def test_mentions_list(self):
+        def create_items(count):
+            for user in self.create_users(count):
+                tweet = self.create_tweet(user, '@lucky hello')
+                TweetMention.objects.create(
+                    mentioned_user=self.lucky,
+                    tweet=tweet,
+                    created_at=tweet.created_at,
+                )
+                self.create_like(self.lucky, tweet)
+
+        self.assertQueriesConstant(
+            MENTIONS_URL,
+            {'size': 100},
+            create_items,
+            budget=4,
+        )
+
+    def test_followers_list(self):
+        def create_items(count):
+            Friendship.objects.bulk_create([
+                Friendship(from_user=user, to_user=self.lucky)
+                for user in self.create_users(count)
+            ])
+
+        self.assertQueriesConstant(
+            FOLLOWERS_URL.format(self.lucky.id),
+            {},
+            create_items,
+            budget=2,
+        )
+
+    def test_followings_list(self):
+        def create_items(count):
+            Friendship.objects.bulk_create([
+                Friendship(from_user=self.lucky, to_user=user)
+                for user in self.create_users(count)
+            ])
+
+        self.assertQueriesConstant(
+            FOLLOWINGS_URL.format(self.lucky.id),
+            {},
+            create_items,
+            budget=2,
+        )
+
+
+class QueryBudgetAssertionTests(TestCase):
+
+    def test_assert_query_budget(self):
+        lucky = self.create_user('lucky')
+        with self.assertQueryBudget(1):
+            User.objects.filter(id=lucky.id).first()
+
+        with self.assertRaises(AssertionError) as context:
+            with self.assertQueryBudget(1):
+                User.objects.filter(id=lucky.id).first()
+                User.objects.filter(username='lucky').first()
+        # the captured SQL is listed
+        self.assertEqual(
+            'the budget is 1' in str(context.exception),
+            True,
+        )
+        self.assertEqual('auth_user' in str(context.exception), True)
+
+    @TestCase.query_budget(2)
+    def test_query_budget_decorator(self):
+        User.objects.count()
+        User.objects.exists()
@@ -0,0 +1,54 @@
+from rest_framework.exceptions import ValidationError
+from utils.paginations import EndlessPagination
+
+
+class TweetPagination(EndlessPagination):
+    # the timeline of a user is sorted by the tweet id, which is ordered by
+    # time, through the index of (user, id)
+    cursor_fields = ('id',)
+
+
+class MentionPagination(EndlessPagination):
+    # the mentions of a user are sorted by the time of the tweet, through the
+    # index of (mentioned_user, created_at)
+    cursor_fields = ('created_at', 'id')
+
+
+class TweetSearchPagination(EndlessPagination):
+    """
+    The search results are sorted by the tweet id desc, the id grows with
+    the time of the tweet, and the cursor is the tweet id:
+
+    GET /api/tweets/search/?q=hello             -> the newest matches
+    GET /api/tweets/search/?q=hello&before=<id> -> older matches
+    GET /api/tweets/search/?q=hello&after=<id>  -> newer matches
+    """
+
+    def encode_cursor(self, tweet_id):
+        return str(tweet_id)
+
+    def decode_cursor(self, cursor):
+        try:
+            return int(cursor)
+        except ValueError:
+            raise ValidationError({'message': 'Invalid cursor.'})
+
+    def paginate_ids(self, search, request):
+        """
+        search(limit, before_id, after_id) returns the ids of the page from
+        the search index, one extra id tells if there is a next page.
+        """
+        page_size = self.get_page_size(request)
+        before_id = after_id = None
+        if 'after' in request.query_params:
+            after_id = self.decode_cursor(request.query_params['after'])
+        elif 'before' in request.query_params:
+            before_id = self.decode_cursor(request.query_params['before'])
+
+        ids = search(page_size + 1, before_id, after_id)
+        self.has_next_page = len(ids) > page_size
+        self.page = ids[:page_size]
+        # the page of ?after= is read bottom-up, flip it to keep the desc order
+        if after_id is not None:
+            self.page.reverse()
+        return self.page
@@ -1,16 +1,19 @@
 from accounts.api.serializers import UserSerializer, UserSerializerForTweet
 from comments.api.serializers import CommentSerializer
+from hashtags.services import HashtagService
 from likes.api.serializers import LikeSerializer
 from likes.services import LikeService
 from rest_framework import serializers
 from tweets.models import Tweet
+from tweets.services import MentionService
 
 
 class TweetSerializer(serializers.ModelSerializer):
-    user = UserSerializerForTweet()
+    # snowflake ids go past 2 ** 53, a JavaScript number would round them
+    id = serializers.CharField(read_only=True)
+    # the author is read through the cache, not queried for every tweet
+    user = UserSerializerForTweet(source='cached_user')
     has_liked = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
-    likes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Tweet
@@ -24,18 +27,18 @@ class TweetSerializer(serializers.ModelSerializer):
             'has_liked',
         )
 
-    def get_comments_count(self, obj):
-        return obj.comment_set.count()
-
-    def get_likes_count(self, obj):
-        return obj.like_set.count()
-
+    # The list APIs load the tweets liked by the current user for the whole
+    # page into the context with TweetService.get_serializer_context, a
+    # single tweet falls back to the query
     def get_has_liked(self, obj):
-        return LikeService.has_liked(self.context['request'].user, obj)
+        liked_tweets = self.context.get('liked_tweets')
+        if liked_tweets is None:
+            return LikeService.has_liked(self.context['request'].user, obj)
+        return obj in liked_tweets
 
 
 class TweetSerializerForDetail(TweetSerializer):
-    user = UserSerializer()
+    user = UserSerializer(source='cached_user')
     comments = CommentSerializer(source='comment_set', many=True)
     likes = LikeSerializer(source='like_set', many=True)
 
@@ -72,5 +75,11 @@ class TweetSerializerForCreate(serializers.ModelSerializer):
     def create(self, validated_data):
         user = self.context['request'].user
         content = validated_data['content']
+        # TweetViewSet.create saves the tweet in a transaction, the tweet, the
+        # tweets_count of the author and the fanout job are committed together
         tweet = Tweet.objects.create(user=user, content=content)
+        # the tag -> tweet index, the mention index and the jobs which count
+        # the tags and notify the mentioned users are committed with the tweet
+        HashtagService.index_tweet(tweet)
+        MentionService.index_tweet(tweet)
         return tweet
\ No newline at end of file
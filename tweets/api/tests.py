@@ -1,7 +1,14 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from jobs.models import Job
+from notifications.models import Notification
+from newsfeeds.models import NewsFeed
 from rest_framework.test import APIClient
 from rest_framework import status
-from testing.testcases import TestCase
-from tweets.models import Tweet
+from testing.testcases import TestCase, TransactionTestCase
+from tweets.models import Tweet, TweetMention
+import json
 
 
 # need to add '/' at the end, otherwise status.HTTP_301_MOVED_PERMANENTLY
@@ -9,6 +16,8 @@ from tweets.models import Tweet
 TWEET_LIST_API = '/api/tweets/'
 TWEET_CREATE_API = '/api/tweets/'
 TWEET_RETRIEVE_API = '/api/tweets/{}/'
+TWEET_SEARCH_API = '/api/tweets/search/'
+TWEET_MENTIONS_API = '/api/tweets/mentions/'
 
 
 class TweetApiTests(TestCase):
@@ -44,9 +53,63 @@ class TweetApiTests(TestCase):
         response = self.anonymous_client.get(TWEET_LIST_API, {'user_id': self.user2.id})
         self.assertEqual(len(response.data['tweets']), 2)
         # test order by created_at desc, the newest tweet displayed first
-        self.assertEqual(response.data['tweets'][0]['id'], self.tweets2[1].id)
-        self.assertEqual(response.data['tweets'][1]['id'], self.tweets2[0].id)
+        self.assertEqual(
+            response.data['tweets'][0]['id'],
+            str(self.tweets2[1].id),
+        )
+        self.assertEqual(
+            response.data['tweets'][1]['id'],
+            str(self.tweets2[0].id),
+        )
+
+    def test_list_api_pagination(self):
+        tweets = self.tweets1 + [
+            self.create_tweet(self.user1)
+            for i in range(3)
+        ]
+        # the ids are ordered by time, the newest tweet has the largest id
+        self.assertEqual([tweet.id for tweet in tweets], sorted(
+            tweet.id for tweet in tweets
+        ))
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.user1.id,
+            'size': 4,
+        })
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(tweet.id) for tweet in tweets[:1:-1]],
+        )
+        # the cursor is the id alone
+        self.assertEqual(response.data['before_cursor'], str(tweets[2].id))
+        self.assertEqual(response.data['after_cursor'], str(tweets[5].id))
 
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.user1.id,
+            'size': 4,
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(tweets[1].id), str(tweets[0].id)],
+        )
+
+        new_tweet = self.create_tweet(self.user1)
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.user1.id,
+            'after': tweets[5].id,
+        })
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(new_tweet.id)],
+        )
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.user1.id,
+            'before': '1_2',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
     def test_create_api(self):
         # must login user
@@ -76,6 +139,18 @@ class TweetApiTests(TestCase):
         self.assertEqual(response.data['user']['id'], self.user1.id)
         self.assertEqual(Tweet.objects.count(), tweets_count + 1)
 
+    @override_settings(JOBS_ALWAYS_EAGER=False)
+    def test_create_api_writes_fanout_job(self):
+        response = self.user1_client.post(TWEET_CREATE_API, {
+            'content': 'Hello World, this is my first tweet!'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # the fanout is left to the worker, only the job is written
+        job = Job.objects.get()
+        self.assertEqual(job.name, 'fanout_newsfeeds')
+        self.assertEqual(job.payload, {'tweet_id': int(response.data['id'])})
+        self.assertEqual(NewsFeed.objects.count(), 0)
+
     def test_retrieve(self):
         # tweet with id=-1 does not exist
         url = TWEET_RETRIEVE_API.format(-1)
@@ -97,4 +172,202 @@ class TweetApiTests(TestCase):
             'hmm...this comment won not show under the current tweet',
         )
         response = self.anonymous_client.get(url)
-        self.assertEqual(len(response.data['comments']), 2)
\ No newline at end of file
+        self.assertEqual(len(response.data['comments']), 2)
+
+    def test_ids_are_json_strings(self):
+        # a snowflake id is past 2 ** 53, the largest integer a JavaScript
+        # number holds exactly
+        tweet = self.create_tweet(self.user1)
+        comment = self.create_comment(self.user2, tweet)
+        self.assertGreater(tweet.id, 2 ** 53)
+        response = self.anonymous_client.get(
+            TWEET_RETRIEVE_API.format(tweet.id),
+        )
+        data = json.loads(response.content)
+        self.assertEqual(data['id'], str(tweet.id))
+        self.assertEqual(data['comments'][0]['id'], comment.id)
+        self.assertEqual(data['comments'][0]['tweet_id'], str(tweet.id))
+
+        response = self.anonymous_client.get(TWEET_LIST_API, {
+            'user_id': self.user1.id,
+        })
+        data = json.loads(response.content)
+        self.assertEqual(data['tweets'][0]['id'], str(tweet.id))
+
+    def test_list_queries_do_not_grow_with_tweets_count(self):
+        def get_queries_count():
+            # compare the queries with a cold cache
+            self.clear_cache()
+            with CaptureQueriesContext(connection) as context:
+                response = self.user1_client.get(TWEET_LIST_API, {
+                    'user_id': self.user2.id,
+                })
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context)
+
+        queries_count = get_queries_count()
+        for i in range(5):
+            tweet = self.create_tweet(self.user2)
+            self.create_comment(self.user1, tweet)
+            self.create_like(self.user1, tweet)
+        self.assertEqual(get_queries_count(), queries_count)
+
+
+class TweetSearchApiTests(TransactionTestCase):
+
+    def setUp(self):
+        self.lucky, self.lucky_client = self.create_user_and_client('lucky')
+        self.cosmo = self.create_user('cosmo')
+        self.tweets = [
+            self.create_tweet(self.lucky, 'hello world {}'.format(i))
+            for i in range(5)
+        ]
+        self.create_tweet(self.cosmo, 'good morning')
+
+    def test_search(self):
+        response = self.anonymous_client.get(TWEET_SEARCH_API)
+        self.assertEqual(response.status_code, 400)
+
+        response = self.anonymous_client.get(TWEET_SEARCH_API, {
+            'q': 'Hello',
+            'size': 2,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(self.tweets[4].id), str(self.tweets[3].id)],
+        )
+        self.assertEqual(
+            response.data['tweets'][0]['user']['username'],
+            'lucky',
+        )
+
+        # scroll down to the end
+        response = self.anonymous_client.get(TWEET_SEARCH_API, {
+            'q': 'Hello',
+            'size': 2,
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(self.tweets[2].id), str(self.tweets[1].id)],
+        )
+        response = self.anonymous_client.get(TWEET_SEARCH_API, {
+            'q': 'Hello',
+            'size': 2,
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(self.tweets[0].id)],
+        )
+
+        # the tweets posted since the first page
+        tweet = self.create_tweet(self.cosmo, 'hello again')
+        response = self.lucky_client.get(TWEET_SEARCH_API, {
+            'q': 'hello',
+            'after': self.tweets[4].id,
+        })
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(tweet.id)],
+        )
+        self.assertEqual(response.data['tweets'][0]['has_liked'], False)
+
+        response = self.anonymous_client.get(TWEET_SEARCH_API, {
+            'q': 'hello',
+            'before': 'x',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_deleted_tweet(self):
+        self.tweets[4].delete()
+        response = self.anonymous_client.get(TWEET_SEARCH_API, {'q': 'hello'})
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(tweet.id) for tweet in reversed(self.tweets[:4])],
+        )
+
+
+class TweetMentionApiTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.lucky_client = APIClient()
+        self.lucky_client.force_authenticate(self.lucky)
+        self.cosmo = self.create_user('cosmo')
+        self.cosmo_client = APIClient()
+        self.cosmo_client.force_authenticate(self.cosmo)
+
+    def test_create_sends_notifications(self):
+        fans = [self.create_user('fan_{}'.format(i)) for i in range(3)]
+        response = self.cosmo_client.post(TWEET_CREATE_API, {
+            'content': 'hi @lucky @fan_0 @fan_1 @fan_2 @cosmo',
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            TweetMention.objects.filter(tweet_id=response.data['id']).count(),
+            4,
+        )
+        # the author mentioning themselves is not notified
+        self.assertEqual(Notification.objects.count(), 4)
+        for user in [self.lucky] + fans:
+            notification = Notification.objects.get(recipient=user)
+            self.assertEqual(notification.actor, self.cosmo)
+            self.assertEqual(notification.verb, 'mentioned you in a tweet')
+            self.assertEqual(str(notification.target.id), response.data['id'])
+
+    def test_mentions(self):
+        # login required
+        response = self.anonymous_client.get(TWEET_MENTIONS_API)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        tweet_ids = []
+        for i in range(3):
+            response = self.cosmo_client.post(TWEET_CREATE_API, {
+                'content': 'hello @lucky {}'.format(i),
+            })
+            tweet_ids.append(response.data['id'])
+        self.cosmo_client.post(TWEET_CREATE_API, {'content': 'no mention'})
+        self.lucky_client.post(TWEET_CREATE_API, {'content': 'hi @cosmo'})
+
+        response = self.lucky_client.get(TWEET_MENTIONS_API, {'size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['has_next_page'], True)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [tweet_ids[2], tweet_ids[1]],
+        )
+        self.assertEqual(
+            response.data['tweets'][0]['user']['id'],
+            self.cosmo.id,
+        )
+        after_cursor = response.data['after_cursor']
+
+        response = self.lucky_client.get(TWEET_MENTIONS_API, {
+            'size': 2,
+            'before': response.data['before_cursor'],
+        })
+        self.assertEqual(response.data['has_next_page'], False)
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [tweet_ids[0]],
+        )
+
+        # pull to refresh
+        response = self.cosmo_client.post(TWEET_CREATE_API, {
+            'content': 'again @lucky',
+        })
+        response = self.lucky_client.get(TWEET_MENTIONS_API, {
+            'after': after_cursor,
+        })
+        self.assertEqual(
+            [tweet['id'] for tweet in response.data['tweets']],
+            [str(TweetMention.objects.latest('id').tweet_id)],
+        )
+
+        response = self.cosmo_client.get(TWEET_MENTIONS_API)
+        self.assertEqual(len(response.data['tweets']), 1)
+        self.assertEqual(response.data['tweets'][0]['content'], 'hi @cosmo')
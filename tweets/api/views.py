@@ -1,15 +1,26 @@
+from django.db import transaction
+from functools import partial
 from newsfeeds.services import NewsFeedService
 from rest_framework import status
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from search.services import SearchService
+from tweets.api.paginations import (
+    MentionPagination,
+    TweetPagination,
+    TweetSearchPagination,
+)
 from tweets.api.serializers import (
     TweetSerializer,
     TweetSerializerForCreate,
     TweetSerializerForDetail,
 )
-from tweets.models import Tweet
+from tweets.models import Tweet, TweetMention
+from tweets.services import TweetService
 from utils.decorators import required_params
+from utils.memcached_helper import MemcachedHelper
 
 
 class TweetViewSet(viewsets.GenericViewSet):
@@ -17,8 +28,11 @@ class TweetViewSet(viewsets.GenericViewSet):
     API endpoint that allows users to create, list tweets
 
     POST /api/tweets/ -> create
-    GET /api/tweets/?user_id=1 -> list
+    GET /api/tweets/?user_id=1 -> list, newest first
+    GET /api/tweets/?user_id=1&before=<cursor> -> older tweets
     GET /api/tweets/1/ -> retrieve tweet.id=1 with comments
+    GET /api/tweets/search/?q=hello -> the newest tweets with the words
+    GET /api/tweets/mentions/ -> the newest tweets mentioning the current user
     """
     # queryset will be called in self.get_queryset()
     #     def list(self):
@@ -29,7 +43,7 @@ class TweetViewSet(viewsets.GenericViewSet):
     serializer_class = TweetSerializerForCreate
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search']:
             return [AllowAny()]
         return [IsAuthenticated()]
 
@@ -44,21 +58,82 @@ class TweetViewSet(viewsets.GenericViewSet):
         #This query will be translated as
         #
         # select * from twitter_tweets
-        # where user_id = xxx
-        # order by created_at desc
+        # where user_id = xxx and id < <before cursor>
+        # order by id desc
+        # limit 21
         #
-        # This SQL query will use the compound index of user and created_at
-        # A simple user index is not enough
-        tweets = Tweet.objects.filter(user_id=user_id).order_by('-created_at')
+        # The id of a tweet is ordered by time, the newest tweets come first
+        # through the compound index of user and id
+        paginator = TweetPagination()
+        tweets = paginator.paginate_queryset(
+            Tweet.objects.filter(user_id=user_id),
+            request,
+        )
 
         # many=True will return a list of dict
+        # The authors, counts and likes of all the tweets are loaded before
+        # serializing, the number of queries does not grow with the tweets
         serializer = TweetSerializer(
             tweets,
-            context={'request': request},
+            context=TweetService.get_serializer_context(request, tweets),
             many=True,
         )
         # Return response in json format
-        return Response({'tweets': serializer.data})
+        return paginator.get_paginated_response(serializer.data, key='tweets')
+
+    @action(methods=['GET'], detail=False)
+    @required_params(params=['q'])
+    def search(self, request):
+        """
+        The tweets which contain all the words of ?q=, newest first. The ids
+        come from the full text index, see search/services.py, the tweets of
+        the page are read through the cache, the tweets table is never
+        scanned.
+        """
+        query = request.query_params['q']
+        paginator = TweetSearchPagination()
+        tweet_ids = paginator.paginate_ids(
+            partial(SearchService.search_tweet_ids, query),
+            request,
+        )
+        tweets = MemcachedHelper.get_objects_through_cache(Tweet, tweet_ids)
+        # a tweet deleted since the search is left out
+        tweets = [
+            tweets[tweet_id]
+            for tweet_id in tweet_ids
+            if tweet_id in tweets
+        ]
+        serializer = TweetSerializer(
+            tweets,
+            context=TweetService.get_serializer_context(request, tweets),
+            many=True,
+        )
+        return paginator.get_paginated_response(serializer.data, key='tweets')
+
+    @action(methods=['GET'], detail=False)
+    def mentions(self, request):
+        """
+        The tweets which mention the current user, newest first, with
+        ?before= and ?after= cursors. The page is read from the mention index
+        and the tweets of the page through the cache.
+        """
+        paginator = MentionPagination()
+        mentions = paginator.paginate_queryset(
+            TweetMention.objects.filter(mentioned_user=request.user),
+            request,
+        )
+        # a tweet deleted since is left out, its mentions are deleted with it
+        tweets = [
+            tweet
+            for tweet in TweetService.load_tweets(mentions)
+            if tweet is not None
+        ]
+        serializer = TweetSerializer(
+            tweets,
+            context=TweetService.get_serializer_context(request, tweets),
+            many=True,
+        )
+        return paginator.get_paginated_response(serializer.data, key='tweets')
 
     def retrieve(self, request, *args, **kwargs):
         tweet = self.get_object()
@@ -86,8 +161,12 @@ class TweetViewSet(viewsets.GenericViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         # save will call create method in TweetSerializerForCreate
-        tweet = serializer.save()
-        NewsFeedService.fanout_to_followers(tweet)
+        # The fanout job is written in the same transaction as the tweet, it
+        # is never lost if the tweet is committed, and the request does not
+        # wait for the fanout
+        with transaction.atomic():
+            tweet = serializer.save()
+            NewsFeedService.fanout_to_followers(tweet)
         serializer = TweetSerializer(tweet, context={'request': request})
         return Response(
             serializer.data,
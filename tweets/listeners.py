@@ -0,0 +1,22 @@
+from accounts.models import UserStats
+from django.db.models import F
+from utils.memcached_helper import MemcachedHelper
+
+
+def incr_tweets_count(sender, instance, created, **kwargs):
+    if not created or instance.user_id is None:
+        return
+    UserStats.objects.filter(user_id=instance.user_id).update(
+        tweets_count=F('tweets_count') + 1,
+    )
+    # update() does not send post_save, delete the cached stats by hand
+    MemcachedHelper.invalidate_cached_object(UserStats, instance.user_id)
+
+
+def decr_tweets_count(sender, instance, **kwargs):
+    if instance.user_id is None:
+        return
+    UserStats.objects.filter(user_id=instance.user_id).update(
+        tweets_count=F('tweets_count') - 1,
+    )
+    MemcachedHelper.invalidate_cached_object(UserStats, instance.user_id)
@@ -0,0 +1,71 @@
+from comments.models import Comment
+from comments.services import CommentService
+from django.core.management.base import BaseCommand
+from likes.services import LikeService
+from tweets.models import Tweet
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill likes_count and comments_count of tweets and likes_count '
+        'of comments, and fix the counts which have drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='How many rows are checked in one round.',
+        )
+
+    def handle(self, *args, **options):
+        fixed = self.reconcile(
+            Tweet,
+            ('likes_count', 'comments_count'),
+            options['chunk_size'],
+        )
+        self.stdout.write('{} tweets fixed'.format(fixed))
+        fixed = self.reconcile(
+            Comment,
+            ('likes_count',),
+            options['chunk_size'],
+        )
+        self.stdout.write('{} comments fixed'.format(fixed))
+
+    def get_counts_maps(self, model_class, ids):
+        counts_maps = {
+            'likes_count': LikeService.get_likes_count_map(model_class, ids),
+        }
+        if model_class == Tweet:
+            counts_maps['comments_count'] = \
+                CommentService.get_comments_count_map(ids)
+        return counts_maps
+
+    def reconcile(self, model_class, count_fields, chunk_size):
+        """
+        Walk the table in chunks ordered by id, every chunk is counted with
+        one GROUP BY query per count, only the drifted rows are updated.
+        """
+        fixed = 0
+        last_id = 0
+        while True:
+            rows = list(
+                model_class.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', *count_fields)[:chunk_size]
+            )
+            if not rows:
+                return fixed
+            ids = [row[0] for row in rows]
+            counts_maps = self.get_counts_maps(model_class, ids)
+            for row in rows:
+                counts = {
+                    field: counts_maps[field].get(row[0], 0)
+                    for field in count_fields
+                }
+                if tuple(counts.values()) == row[1:]:
+                    continue
+                model_class.objects.filter(id=row[0]).update(**counts)
+                fixed += 1
+            last_id = ids[-1]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0003_denormalized_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TweetMention',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('mentioned_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL)),
+                ('tweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tweets.tweet')),
+            ],
+            options={
+                'unique_together': {('mentioned_user', 'tweet')},
+                'index_together': {('mentioned_user', 'created_at')},
+            },
+        ),
+    ]
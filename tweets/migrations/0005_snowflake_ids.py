@@ -0,0 +1,29 @@
+# Generated by Django 3.1.3 on 2026-10-18 21:20
+
+from django.conf import settings
+from django.db import migrations, models
+import utils.snowflake
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tweets', '0004_tweet_mentions'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='tweet',
+            options={'ordering': ('user', '-id')},
+        ),
+        migrations.AlterField(
+            model_name='tweet',
+            name='id',
+            field=models.BigIntegerField(default=utils.snowflake.generate_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterIndexTogether(
+            name='tweet',
+            index_together={('user', 'id')},
+        ),
+    ]
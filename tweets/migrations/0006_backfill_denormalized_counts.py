@@ -0,0 +1,75 @@
+from django.db import migrations
+from django.db.models import Count
+
+CHUNK_SIZE = 1000
+
+
+def count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{field + '__in': ids})
+        .values_list(field)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+
+def backfill_tweet_counts(apps, schema_editor):
+    # likes_count and comments_count were added with a default of 0, the
+    # tweets created before would show no likes and no comments until
+    # reconcile_counts runs. They are counted here the same way, a chunk of
+    # tweets at a time, only the tweets with likes or comments are updated.
+    Tweet = apps.get_model('tweets', 'Tweet')
+    Comment = apps.get_model('comments', 'Comment')
+    Like = apps.get_model('likes', 'Like')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type = ContentType.objects.filter(
+        app_label='tweets',
+        model='tweet',
+    ).first()
+
+    last_id = 0
+    while True:
+        rows = list(
+            Tweet.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'likes_count', 'comments_count')[:CHUNK_SIZE]
+        )
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        last_id = ids[-1]
+        # no content type yet, nothing has been liked
+        likes_counts = {}
+        if content_type is not None:
+            likes_counts = count_by(
+                Like.objects.filter(content_type=content_type),
+                'object_id',
+                ids,
+            )
+        comments_counts = count_by(Comment.objects.all(), 'tweet_id', ids)
+        for tweet_id, likes_count, comments_count in rows:
+            counts = (
+                likes_counts.get(tweet_id, 0),
+                comments_counts.get(tweet_id, 0),
+            )
+            if counts == (likes_count, comments_count):
+                continue
+            Tweet.objects.filter(id=tweet_id).update(
+                likes_count=counts[0],
+                comments_count=counts[1],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('comments', '0002_denormalized_counts'),
+        ('likes', '0002_snowflake_ids'),
+        ('tweets', '0005_snowflake_ids'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tweet_counts, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,22 @@
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
+from django.db.models.signals import post_delete, post_save
 from likes.models import Like
+from tweets.listeners import decr_tweets_count, incr_tweets_count
+from utils.memcached_helper import MemcachedHelper, invalidate_object_cache
+from utils.snowflake import generate_id
 from utils.time_helpers import utc_now
 
 
 class Tweet(models.Model):
+    # a snowflake id, ordered by time: the timelines are sorted and paginated
+    # by the id alone, see utils/snowflake.py
+    id = models.BigIntegerField(
+        primary_key=True,
+        default=generate_id,
+        editable=False,
+    )
     user = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -14,10 +25,18 @@ class Tweet(models.Model):
     )
     content = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
+    # denormalized counts, so that rendering a tweet does not run COUNT(*)
+    # queries. They are maintained by likes/listeners.py and
+    # comments/listeners.py, `manage.py reconcile_counts` fixes the drift
+    likes_count = models.IntegerField(default=0)
+    comments_count = models.IntegerField(default=0)
 
     class Meta:
-        index_together = (('user', 'created_at'),)
-        ordering = ('user', '-created_at')
+        # the timeline of a user is read newest first through the index of
+        # (user, id), the id is not the rowid of SQLite, it is not implicitly
+        # part of the index of user
+        index_together = (('user', 'id'),)
+        ordering = ('user', '-id')
 
     @property
     def hours_to_now(self):
@@ -30,6 +49,40 @@ class Tweet(models.Model):
             object_id=self.id,
         ).order_by('-created_at')
 
+    @property
+    def cached_user(self):
+        # the user loaded in a batch by TweetService.load_users is used as is
+        if Tweet.user.is_cached(self):
+            return self.user
+        return MemcachedHelper.get_object_through_cache(User, self.user_id)
+
     def __str__(self):
         return f'{self.created_at} {self.user}: {self.content}'
 
+
+class TweetMention(models.Model):
+    # The mention index, one row per user mentioned by a tweet, written by
+    # MentionService.index_tweet when the tweet is created. created_at is the
+    # time of the tweet, the mentions of a user are read newest first through
+    # the index of (mentioned_user, created_at) and never by scanning the
+    # content of the tweets.
+    mentioned_user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='mentions',
+    )
+    tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        index_together = (('mentioned_user', 'created_at'),)
+        unique_together = (('mentioned_user', 'tweet'),)
+
+    def __str__(self):
+        return f'{self.created_at} {self.mentioned_user_id} in {self.tweet_id}'
+
+
+post_save.connect(invalidate_object_cache, sender=Tweet)
+post_delete.connect(invalidate_object_cache, sender=Tweet)
+post_save.connect(incr_tweets_count, sender=Tweet)
+post_delete.connect(decr_tweets_count, sender=Tweet)
@@ -0,0 +1,111 @@
+from django.contrib.auth.models import User
+from jobs.services import JobService
+from likes.services import LikeService
+from tweets.models import Tweet, TweetMention
+from utils.memcached_helper import MemcachedHelper
+import re
+
+# an @ which does not follow a word character, e.g. not in an email address
+MENTION_RE = re.compile(r'(?<![\w@])@(\w+)')
+
+
+class TweetService(object):
+
+    @classmethod
+    def load_tweets(cls, objects):
+        """
+        Set obj.tweet of every object (newsfeeds) with one cache get_many,
+        the objects which already hold their tweet are skipped.
+        """
+        if not objects:
+            return []
+        tweet_field = objects[0]._meta.get_field('tweet')
+        missing_tweet_ids = {
+            obj.tweet_id
+            for obj in objects
+            if obj.tweet_id is not None and not tweet_field.is_cached(obj)
+        }
+        tweets = MemcachedHelper.get_objects_through_cache(
+            Tweet,
+            missing_tweet_ids,
+        )
+        for obj in objects:
+            if tweet_field.is_cached(obj):
+                continue
+            # a newsfeed served from the cache can point to a deleted tweet
+            obj.tweet = tweets.get(obj.tweet_id)
+        return [obj.tweet for obj in objects]
+
+    @classmethod
+    def load_users(cls, tweets):
+        """
+        Set tweet.user of every tweet with one cache get_many instead of one
+        query per tweet.
+        """
+        users = MemcachedHelper.get_objects_through_cache(
+            User,
+            {tweet.user_id for tweet in tweets},
+        )
+        for tweet in tweets:
+            tweet.user = users.get(tweet.user_id)
+
+    @classmethod
+    def get_serializer_context(cls, request, tweets):
+        """
+        Load everything TweetSerializer needs for a list of tweets in a
+        constant number of queries: the authors and the tweets liked by the
+        current user. The serializer reads them from the context instead of
+        querying for every tweet. The comments count and the likes count are
+        columns of the tweet.
+        """
+        tweets = [tweet for tweet in tweets if tweet is not None]
+        cls.load_users(tweets)
+        return {
+            'request': request,
+            'liked_tweets': LikeService.has_liked_batch(request.user, tweets),
+        }
+
+
+class MentionService(object):
+
+    @classmethod
+    def extract_usernames(cls, content):
+        """
+        The mentioned usernames without the @, lower cased like the usernames
+        of the accounts, without duplicates.
+        """
+        usernames = []
+        for username in MENTION_RE.findall(content):
+            username = username.lower()
+            if username not in usernames:
+                usernames.append(username)
+        return usernames
+
+    @classmethod
+    def index_tweet(cls, tweet):
+        """
+        Resolve the mentions of a new tweet with one User query, write the
+        mention index with one bulk_create and enqueue the notifications.
+        Call it in the transaction of the tweet. An author who mentions
+        themselves is left out. Return the mentioned user ids.
+        """
+        usernames = cls.extract_usernames(tweet.content)
+        if not usernames:
+            return []
+        user_ids = list(
+            User.objects.filter(username__in=usernames)
+            .exclude(id=tweet.user_id)
+            .values_list('id', flat=True)
+        )
+        if not user_ids:
+            return []
+        TweetMention.objects.bulk_create([
+            TweetMention(
+                mentioned_user_id=user_id,
+                tweet=tweet,
+                created_at=tweet.created_at,
+            )
+            for user_id in user_ids
+        ])
+        JobService.enqueue('send_mention_notifications', tweet_id=tweet.id)
+        return user_ids
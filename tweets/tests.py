@@ -1,5 +1,10 @@
+from comments.models import Comment
 from datetime import timedelta
+from django.core.management import call_command
+from io import StringIO
 from testing.testcases import TestCase
+from tweets.models import Tweet, TweetMention
+from tweets.services import MentionService
 from utils.time_helpers import utc_now
 
 
@@ -25,3 +30,83 @@ class TweetTests(TestCase):
         self.create_like(cosmo, self.tweet)
         self.assertEqual(self.tweet.like_set.count(), 2)
 
+    def test_denormalized_counts(self):
+        cosmo = self.create_user('cosmo')
+        like = self.create_like(cosmo, self.tweet)
+        self.create_like(self.lucky, self.tweet)
+        comment = self.create_comment(cosmo, self.tweet)
+        self.create_like(self.lucky, comment)
+        self.tweet.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 2)
+        self.assertEqual(self.tweet.comments_count, 1)
+        self.assertEqual(comment.likes_count, 1)
+
+        like.delete()
+        comment.delete()
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 0)
+
+    def test_reconcile_counts(self):
+        comment = self.create_comment(self.lucky, self.tweet)
+        self.create_like(self.lucky, self.tweet)
+        self.create_like(self.lucky, comment)
+        another_tweet = self.create_tweet(self.lucky)
+        # the counts drifted
+        Tweet.objects.update(likes_count=5, comments_count=5)
+        Comment.objects.update(likes_count=0)
+
+        out = StringIO()
+        call_command('reconcile_counts', chunk_size=1, stdout=out)
+        self.assertEqual('2 tweets fixed' in out.getvalue(), True)
+        self.assertEqual('1 comments fixed' in out.getvalue(), True)
+        self.tweet.refresh_from_db()
+        another_tweet.refresh_from_db()
+        comment.refresh_from_db()
+        self.assertEqual(self.tweet.likes_count, 1)
+        self.assertEqual(self.tweet.comments_count, 1)
+        self.assertEqual(another_tweet.likes_count, 0)
+        self.assertEqual(another_tweet.comments_count, 0)
+        self.assertEqual(comment.likes_count, 1)
+
+
+class MentionServiceTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.cosmo = self.create_user('cosmo')
+        self.fan = self.create_user('fan_of_lucky')
+
+    def test_extract_usernames(self):
+        self.assertEqual(
+            MentionService.extract_usernames(
+                'hi @Cosmo and @fan_of_lucky, @cosmo mail me at a@b.com @@x',
+            ),
+            ['cosmo', 'fan_of_lucky'],
+        )
+        self.assertEqual(MentionService.extract_usernames('no mention'), [])
+
+    def test_index_tweet(self):
+        tweet = self.create_tweet(
+            self.lucky,
+            '@cosmo @FAN_OF_LUCKY @lucky @nobody hello',
+        )
+        # one query for the users, one INSERT for the mentions and one for
+        # the job which sends the notifications
+        with self.assertNumQueries(3):
+            with self.settings(JOBS_ALWAYS_EAGER=False):
+                user_ids = MentionService.index_tweet(tweet)
+        # the author and the unknown username are left out
+        self.assertEqual(set(user_ids), {self.cosmo.id, self.fan.id})
+        mentions = TweetMention.objects.filter(tweet=tweet)
+        self.assertEqual(
+            set(mentions.values_list('mentioned_user_id', flat=True)),
+            {self.cosmo.id, self.fan.id},
+        )
+        self.assertEqual(mentions.first().created_at, tweet.created_at)
+
+        tweet = self.create_tweet(self.lucky, 'just @lucky and @nobody')
+        with self.assertNumQueries(1):
+            self.assertEqual(MentionService.index_tweet(tweet), [])
+        self.assertEqual(TweetMention.objects.count(), 2)
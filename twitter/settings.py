@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 from pathlib import Path
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,6 +26,8 @@ SECRET_KEY = 'e#@acan60f)jeee7o@0%yvj-r=le(q-4_5p4kb47-lajyy=7*8'
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
+TESTING = ((" ".join(sys.argv)).find('manage.py test') != -1)
+
 # VM IP
 ALLOWED_HOSTS = ['127.0.0.1', '192.168.56.16', 'localhost']
 # Remote address
@@ -55,6 +58,11 @@ INSTALLED_APPS = [
     'comments',
     'likes',
     'inbox',
+    'jobs',
+    'search',
+    'hashtags',
+    'benchmarks',
+    'utils',
 ]
 
 REST_FRAMEWORK = {
@@ -70,6 +78,12 @@ MIDDLEWARE = [
     # but must come after any other middlewares that encodes the response
     # content, such as 'GZipMiddleware'
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    # latency histograms by view served by /metrics, see utils/metrics.py
+    'utils.middlewares.MetricsMiddleware',
+    # count the queries of every request, see utils/middlewares.py
+    'utils.middlewares.SQLInstrumentationMiddleware',
+    # profile the sampled requests, see utils/middlewares.py
+    'utils.middlewares.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -153,6 +167,167 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# memcached in production, local memory in unit tests
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+        'TIMEOUT': 86400,
+    },
+}
+if TESTING:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'TIMEOUT': 86400,
+    }
+
+# Tweets and users cached by utils.memcached_helper expire after this many
+# seconds, they are also deleted when they change
+OBJECT_CACHE_TIMEOUT = 86400
+
+
+# Background jobs
+# Jobs are stored in the database and executed by `python manage.py run_jobs`,
+# in unit tests they are executed right away in the same process
+JOBS_ALWAYS_EAGER = TESTING
+# A failed job is retried after JOBS_RETRY_BACKOFF seconds, the delay doubles
+# on every attempt, it is marked as failed after JOBS_MAX_ATTEMPTS attempts
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10
+# A job claimed by a worker which does not finish it in this many seconds is
+# claimed by another worker
+JOBS_LEASE_SECONDS = 300
+
+# Fanout walks the followers of the tweet author in chunks of this size and
+# writes each chunk with its own bulk_create
+NEWSFEED_FANOUT_CHUNK_SIZE = 1000
+# Max number of rows in one INSERT statement of the bulk_create
+NEWSFEED_FANOUT_BATCH_SIZE = 500
+# The tweets of the accounts with more followers than this are not pushed to
+# the newsfeeds of the followers, they are pulled when reading the newsfeeds
+NEWSFEED_PUSH_MAX_FOLLOWERS = 10000
+# The pulled followings of a user are cached for at most this many seconds,
+# it bounds how long an account which crossed NEWSFEED_PUSH_MAX_FOLLOWERS in
+# a race with the followers count stays on the wrong side
+NEWSFEED_PULLED_USERS_TIMEOUT = 3600
+# The newest newsfeeds of a user are cached as a list of at most this size,
+# the pages beyond it are read from the database
+NEWSFEED_CACHE_LIMIT = 200
+# A user who has not read the newsfeeds for this many seconds is inactive,
+# fanout stops writing to the cached list of the user and it expires
+NEWSFEED_CACHE_ACTIVE_TIMEOUT = 86400
+# The cached list is reloaded from the database when it is older than this
+NEWSFEED_CACHE_MAX_AGE = 3600
+# A fanout job waits at most this many seconds for the lock of a cached list
+# before deleting the list, a lock left by a crashed worker expires after it
+NEWSFEED_CACHE_LOCK_TIMEOUT = 2
+
+# Notifications
+# The notifications with the same recipient, verb and target within this many
+# seconds of each other are aggregated into one row, 0 turns it off
+NOTIFICATION_AGGREGATION_WINDOW = 3600
+# How many of the latest actors an aggregated notification keeps
+NOTIFICATION_LATEST_ACTORS = 3
+# The cached unread count of a user is counted again after this many seconds,
+# it bounds the drift of the counter from the races between a count and the
+# notifications committed meanwhile
+NOTIFICATION_UNREAD_COUNT_TIMEOUT = 300
+
+# SQL instrumentation
+# Return the query count and the database time of every request as X-DB-*
+# response headers
+SQL_INSTRUMENTATION_HEADERS = False
+# The slowest statement of a request is logged up to this length
+SQL_INSTRUMENTATION_MAX_SQL_LENGTH = 1000
+
+# Search
+# The terms of a query shorter than this are left out, the same as the
+# default innodb_ft_min_token_size of the MySQL FULLTEXT index
+SEARCH_MIN_TERM_LENGTH = 3
+# The terms of a query after this many are left out
+SEARCH_MAX_TERMS = 8
+# A MySQL search reads the tweets of this many seconds first, and of twice
+# as many at every next step, until the page is full
+SEARCH_RANGE_SECONDS = 3600
+
+# Snowflake ids
+# Tweet and NewsFeed ids are 64 bits integers made of the milliseconds since
+# SNOWFLAKE_EPOCH_MS, the worker id and a sequence, see utils/snowflake.py.
+# Every host needs its own SNOWFLAKE_WORKER_ID between 0 and 1023, the
+# processes of a host share SNOWFLAKE_STATE_FILE to never make the same id.
+# Never change SNOWFLAKE_EPOCH_MS once ids have been made
+SNOWFLAKE_EPOCH_MS = 1577836800000  # 2020-01-01 00:00:00 UTC
+SNOWFLAKE_WORKER_ID = 0
+SNOWFLAKE_STATE_FILE = '/tmp/twitter-snowflake.state'
+
+# Trends
+# The hashtags of the last TRENDS_WINDOW_MINUTES minutes are counted in one
+# cached bucket per minute, see hashtags/services.py
+TRENDS_WINDOW_MINUTES = 60
+# A bucket is a count-min sketch of TRENDS_SKETCH_DEPTH rows of
+# TRENDS_SKETCH_WIDTH 4 bytes counters, 16KB, and the TRENDS_TOP_K tags with
+# the highest counts. The counts are above the real ones by at most
+# 2 / TRENDS_SKETCH_WIDTH of the tags of the minute, with a probability of
+# 1 - 1 / 2 ** TRENDS_SKETCH_DEPTH
+TRENDS_SKETCH_WIDTH = 1024
+TRENDS_SKETCH_DEPTH = 4
+TRENDS_TOP_K = 50
+# /api/trends/ is computed from the buckets at most once per this many seconds
+TRENDS_CACHE_TIMEOUT = 30
+# A worker waits at most this many seconds for the lock of a bucket, a lock
+# left by a crashed worker expires after it
+TRENDS_LOCK_TIMEOUT = 5
+
+# Profiling
+# Fraction of the requests profiled by ProfilingMiddleware, 0 turns sampling
+# off. A request with a valid X-Profile header (`manage.py profile_token`) is
+# always profiled
+PROFILING_SAMPLE_RATE = 0
+# Also list the top allocations of a profiled request, with tracemalloc
+PROFILING_TRACEMALLOC = False
+# The profiles go to <PROFILING_DIR>/<view name>/, only the newest
+# PROFILING_MAX_FILES profiles of every view are kept
+PROFILING_DIR = '/tmp/twitter-profiles'
+PROFILING_MAX_FILES = 50
+# How many functions and allocation sites a profile summary lists
+PROFILING_TOP_N = 30
+# An X-Profile token expires after this many seconds
+PROFILING_TOKEN_MAX_AGE = 3600
+
+# Metrics
+# Served at /metrics in the Prometheus text format. With METRICS_DIR set, every
+# process writes its metrics to an mmap file in the directory, and /metrics
+# adds up the files of all the processes, e.g. of all the gunicorn workers.
+# Empty the directory before the service starts. Without METRICS_DIR every
+# process only serves its own metrics
+METRICS_DIR = None
+# /metrics is only served to the staff users and to the requests with an
+# `Authorization: Bearer <METRICS_TOKEN>` header, the bearer_token of the
+# Prometheus scrape config. No token is accepted when it is empty
+METRICS_TOKEN = None
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # one JSON line per request from SQLInstrumentationMiddleware
+        'twitter.sql': {
+            'handlers': ['console'],
+            'level': 'WARNING' if TESTING else 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 try:
     from .local_settings import *
 except:
@@ -19,10 +19,13 @@ from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from friendships.api.views import FriendshipViewSet
+from hashtags.api.views import TrendViewSet
+from inbox.api.views import NotificationViewSet
 from likes.api.views import LikeViewSet
 from newsfeeds.api.views import NewsFeedViewSet
 from rest_framework import routers
 from tweets.api.views import TweetViewSet
+from utils.views import metrics
 
 
 router = routers.DefaultRouter()
@@ -33,11 +36,18 @@ router.register(r'api/friendships', FriendshipViewSet, basename='friendships')
 router.register(r'api/newsfeeds', NewsFeedViewSet, basename='newsfeeds')
 router.register(r'api/comments', CommentViewSet, basename='comments')
 router.register(r'api/likes', LikeViewSet, basename='likes')
+router.register(
+    r'api/notifications',
+    NotificationViewSet,
+    basename='notifications',
+)
+router.register(r'api/trends', TrendViewSet, basename='trends')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include(router.urls)),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework')),
+    path('metrics', metrics),
 ]
 
 if settings.DEBUG:
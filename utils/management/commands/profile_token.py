@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from utils.middlewares import make_profile_token
+
+
+class Command(BaseCommand):
+    help = (
+        'Print a signed value of the X-Profile header, a request sent with '
+        'it is profiled by utils.middlewares.ProfilingMiddleware.'
+    )
+
+    def handle(self, *args, **options):
+        self.stdout.write(make_profile_token())
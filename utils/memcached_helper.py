@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from utils.metrics import record_cache_reads
+
+
+class MemcachedHelper(object):
+    """
+    Read through cache of model objects by id. An object is cached as the
+    dict of its column values, the objects of a page are fetched with one
+    get_many and the missing ones with one IN query.
+
+    The cached object is deleted in post_save / post_delete of the model and
+    again after the commit, connect invalidate_object_cache to the signals of
+    every cached model.
+    """
+
+    @classmethod
+    def get_key(cls, model_class, object_id):
+        return '{}:{}'.format(model_class._meta.label_lower, object_id)
+
+    @classmethod
+    def serialize(cls, obj):
+        return {
+            field.attname: getattr(obj, field.attname)
+            for field in obj._meta.concrete_fields
+        }
+
+    @classmethod
+    def deserialize(cls, model_class, payload):
+        return model_class.from_db(
+            DEFAULT_DB_ALIAS,
+            list(payload.keys()),
+            list(payload.values()),
+        )
+
+    @classmethod
+    def get_objects_through_cache(cls, model_class, object_ids):
+        """
+        Return {object_id: object}, the ids which do not exist are left out.
+        """
+        keys = {
+            object_id: cls.get_key(model_class, object_id)
+            for object_id in object_ids
+            if object_id is not None
+        }
+        cached = cache.get_many(keys.values())
+        objects = {
+            object_id: cls.deserialize(model_class, cached[key])
+            for object_id, key in keys.items()
+            if key in cached
+        }
+
+        missing_ids = [
+            object_id
+            for object_id in keys
+            if object_id not in objects
+        ]
+        record_cache_reads(
+            model_class._meta.label_lower,
+            len(objects),
+            len(missing_ids),
+        )
+        if not missing_ids:
+            return objects
+        missing_objects = model_class.objects.in_bulk(missing_ids)
+        cache.set_many({
+            keys[object_id]: cls.serialize(obj)
+            for object_id, obj in missing_objects.items()
+        }, timeout=settings.OBJECT_CACHE_TIMEOUT)
+        objects.update(missing_objects)
+        return objects
+
+    @classmethod
+    def get_object_through_cache(cls, model_class, object_id):
+        return cls.get_objects_through_cache(
+            model_class,
+            [object_id],
+        ).get(object_id)
+
+    @classmethod
+    def invalidate_cached_object(cls, model_class, object_id):
+        key = cls.get_key(model_class, object_id)
+        cache.delete(key)
+        # A read between the delete and the commit loads the old row from the
+        # database and caches it again, it would stay stale until it expires.
+        # The key is deleted once more after the commit.
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_object_cache(sender, instance, **kwargs):
+    MemcachedHelper.invalidate_cached_object(sender, instance.pk)
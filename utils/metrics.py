@@ -0,0 +1,367 @@
+from django.conf import settings
+import json
+import mmap
+import os
+import struct
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# seconds
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# bytes
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+
+class MemoryBackend(object):
+    """
+    The values of the current process, enough for runserver and the tests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def collect(self):
+        with self.lock:
+            return dict(self.values)
+
+
+class MmapFile(object):
+    # The values of one process, laid out as an 8 bytes header holding the
+    # number of bytes in use, followed by one entry per key: the length of
+    # the key (4 bytes), the key, the padding which aligns the value, and the
+    # value as a double (8 bytes). A process only writes its own file, the
+    # other processes only read it.
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        size = os.fstat(self.file.fileno()).st_size
+        if size == 0:
+            size = self.INITIAL_SIZE
+            self.file.truncate(size)
+        self.capacity = size
+        self.mmap = mmap.mmap(self.file.fileno(), self.capacity)
+        # a process whose pid is reused goes on with the values of the file
+        self.used = struct.unpack_from('i', self.mmap, 0)[0] or 8
+        self.positions = {
+            key: position
+            for key, _, position in self.read_entries(self.mmap, self.used)
+        }
+
+    @classmethod
+    def read_entries(cls, data, used=None):
+        """
+        Yield (key, value, position of the value) of the entries in data.
+        """
+        if used is None:
+            used = struct.unpack_from('i', data, 0)[0]
+        used = min(used, len(data))
+        position = 8
+        while position < used:
+            key_length = struct.unpack_from('i', data, position)[0]
+            key_end = position + 4 + key_length
+            key = bytes(data[position + 4:key_end]).decode('utf-8')
+            value_position = key_end + (-key_end % 8)
+            value = struct.unpack_from('d', data, value_position)[0]
+            yield key, value, value_position
+            position = value_position + 8
+
+    def add_key(self, key):
+        encoded = key.encode('utf-8')
+        entry = struct.pack('i', len(encoded)) + encoded
+        entry += b' ' * (-len(entry) % 8) + struct.pack('d', 0.0)
+        while self.used + len(entry) > self.capacity:
+            self.capacity *= 2
+            self.file.truncate(self.capacity)
+            self.mmap.close()
+            self.mmap = mmap.mmap(self.file.fileno(), self.capacity)
+        self.mmap[self.used:self.used + len(entry)] = entry
+        self.positions[key] = self.used + len(entry) - 8
+        self.used += len(entry)
+        # the readers stop at the used size, the entry is complete by now
+        struct.pack_into('i', self.mmap, 0, self.used)
+
+    def inc(self, key, amount):
+        if key not in self.positions:
+            self.add_key(key)
+        position = self.positions[key]
+        value = struct.unpack_from('d', self.mmap, position)[0]
+        # an aligned 8 bytes write, a reader never sees half of it
+        struct.pack_into('d', self.mmap, position, value + amount)
+
+
+class MmapBackend(object):
+    """
+    Every process writes its values to its own mmap file in the directory,
+    the writes are plain memory writes with no lock shared between the
+    processes. collect() adds up the files of all the processes, so /metrics
+    served by any gunicorn worker shows the totals of all the workers. The
+    files of the workers which have exited are still counted, the counters
+    never go down.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.pid = None
+        self.file = None
+
+    def get_file(self):
+        # a worker forked after the backend was used, e.g. gunicorn --preload,
+        # must not write to the file of its parent
+        pid = os.getpid()
+        if self.pid != pid:
+            os.makedirs(self.directory, exist_ok=True)
+            self.file = MmapFile(os.path.join(
+                self.directory,
+                'metrics_{}.db'.format(pid),
+            ))
+            self.pid = pid
+        return self.file
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.get_file().inc(key, amount)
+
+    def collect(self):
+        values = {}
+        if not os.path.isdir(self.directory):
+            return values
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.db'):
+                continue
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                data = f.read()
+            if len(data) < 8:
+                continue
+            for key, value, _ in MmapFile.read_entries(data):
+                values[key] = values.get(key, 0) + value
+        return values
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.metrics = []
+        self.backend = None
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def get_backend(self):
+        if self.backend is None:
+            with self.lock:
+                if self.backend is None:
+                    self.backend = self.create_backend()
+        return self.backend
+
+    def create_backend(self):
+        if settings.METRICS_DIR:
+            return MmapBackend(settings.METRICS_DIR)
+        return MemoryBackend()
+
+    def set_backend(self, backend):
+        self.backend = backend
+
+    def inc(self, sample_name, labels, amount):
+        key = json.dumps([sample_name, labels], sort_keys=True)
+        self.get_backend().inc(key, amount)
+
+    def render(self):
+        """
+        All the metrics in the Prometheus text exposition format.
+        """
+        samples = {}
+        for key, value in self.get_backend().collect().items():
+            sample_name, labels = json.loads(key)
+            samples.setdefault(sample_name, []).append((labels, value))
+
+        lines = []
+        for metric in self.metrics:
+            lines.append('# HELP {} {}'.format(
+                metric.name,
+                metric.documentation,
+            ))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for sample_name, labels, value in metric.get_samples(samples):
+                lines.append('{}{} {}'.format(
+                    sample_name,
+                    format_labels(labels),
+                    format_value(value),
+                ))
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label_value(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(name, escape_label_value(labels[name]))
+        for name in sorted(labels)
+    ) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.registry.register(self)
+
+    def check_labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError('{} takes the labels {}, got {}'.format(
+                self.name,
+                self.labelnames,
+                tuple(labels),
+            ))
+        return {name: str(value) for name, value in labels.items()}
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError('A counter only goes up.')
+        self.registry.inc(self.name, self.check_labels(labels), amount)
+
+    def get_samples(self, samples):
+        for labels, value in sorted(
+            samples.get(self.name, []),
+            key=lambda sample: sorted(sample[0].items()),
+        ):
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(
+        self,
+        name,
+        documentation,
+        labelnames=(),
+        buckets=None,
+        registry=None,
+    ):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets or LATENCY_BUCKETS))
+
+    def observe(self, value, **labels):
+        labels = self.check_labels(labels)
+        # only the bucket the value falls into is written, 3 writes per
+        # observation, the buckets are made cumulative when rendered
+        for bucket in self.buckets:
+            if value <= bucket:
+                self.registry.inc(
+                    self.name + '_bucket',
+                    dict(labels, le=format_value(bucket)),
+                    1,
+                )
+                break
+        self.registry.inc(self.name + '_sum', labels, value)
+        self.registry.inc(self.name + '_count', labels, 1)
+
+    def get_samples(self, samples):
+        series = {}
+        for labels, value in samples.get(self.name + '_count', []):
+            series[tuple(sorted(labels.items()))] = {'count': value}
+        for labels, value in samples.get(self.name + '_sum', []):
+            series.setdefault(tuple(sorted(labels.items())), {})['sum'] = value
+        buckets = {}
+        for labels, value in samples.get(self.name + '_bucket', []):
+            labels = dict(labels)
+            le = labels.pop('le')
+            buckets[(tuple(sorted(labels.items())), le)] = value
+
+        for key in sorted(series):
+            labels = dict(key)
+            cumulative = 0
+            for bucket in self.buckets:
+                le = format_value(bucket)
+                cumulative += buckets.get((key, le), 0)
+                yield self.name + '_bucket', dict(labels, le=le), cumulative
+            count = series[key].get('count', 0)
+            yield self.name + '_bucket', dict(labels, le='+Inf'), count
+            yield self.name + '_sum', labels, series[key].get('sum', 0)
+            yield self.name + '_count', labels, count
+
+
+REGISTRY = Registry()
+
+# The view label is the DRF action which handled the request, e.g.
+# TweetViewSet.list, see utils.middlewares.get_view_name
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests by view, method and status code.',
+    ('view', 'method', 'status'),
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling a request.',
+    ('view', 'method'),
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds',
+    'Time spent in the database by a request.',
+    ('view', 'method'),
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of the response body.',
+    ('view', 'method'),
+    buckets=SIZE_BUCKETS,
+)
+FANOUT_ROWS = Counter(
+    'newsfeeds_fanout_rows_total',
+    'Newsfeeds written by the fanout of tweets to the followers.',
+)
+NOTIFICATIONS_SENT = Counter(
+    'notifications_sent_total',
+    'Notification events, written as a new row or aggregated into one.',
+    ('result',),
+)
+# hit ratio: rate(cache_requests_total{result="hit"}[5m]) /
+# rate(cache_requests_total[5m])
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache reads by cache and result, hit or miss.',
+    ('cache', 'result'),
+)
+
+
+def record_cache_reads(cache_name, hits, misses):
+    if hits:
+        CACHE_REQUESTS.inc(hits, cache=cache_name, result='hit')
+    if misses:
+        CACHE_REQUESTS.inc(misses, cache=cache_name, result='miss')
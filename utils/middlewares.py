@@ -0,0 +1,346 @@
+from contextlib import ExitStack
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from utils import metrics
+from utils.time_helpers import utc_now
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+logger = logging.getLogger('twitter.sql')
+profiling_logger = logging.getLogger('twitter.profiling')
+
+PROFILE_TOKEN_SALT = 'utils.middlewares.ProfilingMiddleware'
+PROFILE_TOKEN_VALUE = 'profile'
+
+
+class QueryCollector(object):
+    """
+    Installed with connection.execute_wrapper, it times every SQL statement
+    of a request. Only the statement is kept, never the parameters, they can
+    hold user data.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest_sql = None
+        self.slowest_duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slowest_duration:
+                self.slowest_duration = duration
+                self.slowest_sql = sql
+
+
+def get_view_name(view_func):
+    """
+    TweetViewSet.list for the DRF viewsets, the module and the name of the
+    function for the other views.
+    """
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if view_class is None:
+        return '{}.{}'.format(view_func.__module__, view_func.__name__)
+    if actions is None:
+        return view_class.__name__
+    # the same view function serves several methods, e.g. list and create,
+    # the action is picked when the request comes in
+    return view_class.__name__ + '.{action}'
+
+
+def set_request_view(request, view_func):
+    # called from process_view, by then the url has been resolved
+    request._view_name = get_view_name(view_func)
+    request._view_actions = getattr(view_func, 'actions', None) or {}
+
+
+def get_request_view_name(request):
+    view_name = getattr(request, '_view_name', None)
+    if view_name is None:
+        # not routed to a view, e.g. 404
+        return 'unknown'
+    action = request._view_actions.get(request.method.lower())
+    return view_name.format(action=action or request.method.lower())
+
+
+class SQLInstrumentationMiddleware(object):
+    """
+    Count the queries and the time spent in the database by every request,
+    tagged with the view that handled it, e.g. NewsFeedViewSet.list. Every
+    request is logged as one JSON line to the 'twitter.sql' logger, and
+    when SQL_INSTRUMENTATION_HEADERS is on the numbers are also returned as
+    X-DB-* response headers. A serializer which starts to run one query per
+    item shows up as a query count that grows with the page size.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        # read by MetricsMiddleware
+        request._sql_collector = collector
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+
+        view_name = get_request_view_name(request)
+        self.log(request, response, view_name, collector)
+        if settings.SQL_INSTRUMENTATION_HEADERS:
+            response['X-DB-View'] = view_name
+            response['X-DB-Query-Count'] = collector.count
+            response['X-DB-Time-Ms'] = '{:.2f}'.format(
+                collector.duration * 1000,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_request_view(request, view_func)
+
+    def log(self, request, response, view_name, collector):
+        logger.info(json.dumps({
+            'view': view_name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'query_count': collector.count,
+            'db_time_ms': round(collector.duration * 1000, 2),
+            'slowest_query_ms': round(collector.slowest_duration * 1000, 2),
+            'slowest_query': (collector.slowest_sql or '')[
+                :settings.SQL_INSTRUMENTATION_MAX_SQL_LENGTH
+            ],
+        }))
+
+
+class MetricsMiddleware(object):
+    """
+    Record the latency, the database time and the response size of every
+    request by view, e.g. TweetViewSet.list, served by /metrics. It goes
+    before SQLInstrumentationMiddleware, whose query collector gives the
+    database time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view_name = get_request_view_name(request)
+        metrics.REQUESTS.inc(
+            view=view_name,
+            method=request.method,
+            status=response.status_code,
+        )
+        metrics.REQUEST_LATENCY.observe(
+            duration,
+            view=view_name,
+            method=request.method,
+        )
+        collector = getattr(request, '_sql_collector', None)
+        if collector is not None:
+            metrics.REQUEST_DB_TIME.observe(
+                collector.duration,
+                view=view_name,
+                method=request.method,
+            )
+        # the size of a streaming response is not known
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(
+                len(response.content),
+                view=view_name,
+                method=request.method,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_request_view(request, view_func)
+
+
+def make_profile_token():
+    """
+    A value of the X-Profile header which makes a request profiled, signed
+    with the SECRET_KEY and valid for PROFILING_TOKEN_MAX_AGE seconds.
+    `manage.py profile_token` prints one.
+    """
+    signer = signing.TimestampSigner(salt=PROFILE_TOKEN_SALT)
+    return signer.sign(PROFILE_TOKEN_VALUE)
+
+
+def is_valid_profile_token(token):
+    signer = signing.TimestampSigner(salt=PROFILE_TOKEN_SALT)
+    try:
+        value = signer.unsign(
+            token,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        # also raised when the token has expired
+        return False
+    return value == PROFILE_TOKEN_VALUE
+
+
+class ProfilingMiddleware(object):
+    """
+    Profile a sampled request with cProfile, and with tracemalloc when
+    PROFILING_TRACEMALLOC is on. PROFILING_SAMPLE_RATE of the requests are
+    sampled, and so is any request with a valid X-Profile header, e.g.
+
+        curl -H "X-Profile: $(python manage.py profile_token)" ...
+
+    The .prof file (for pstats or snakeviz) and a text summary of the top
+    functions go to PROFILING_DIR/<view name>/, e.g.
+    TweetViewSet.retrieve/, and only the newest PROFILING_MAX_FILES of every
+    view are kept. The profile is named by the X-Profile-Id response header.
+    A request which is not sampled costs a header lookup and a random().
+    """
+    # tracemalloc traces the whole process, only one request at a time can
+    # use it
+    tracemalloc_lock = threading.Lock()
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        set_request_view(request, view_func)
+
+    def should_profile(self, request):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token is not None and is_valid_profile_token(token):
+            return True
+        sample_rate = settings.PROFILING_SAMPLE_RATE
+        return sample_rate > 0 and random.random() < sample_rate
+
+    def start_tracemalloc(self):
+        if not settings.PROFILING_TRACEMALLOC:
+            return False
+        if not self.tracemalloc_lock.acquire(blocking=False):
+            return False
+        # traced by some other code, it is not ours to stop
+        if tracemalloc.is_tracing():
+            self.tracemalloc_lock.release()
+            return False
+        tracemalloc.start()
+        return True
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        trace_memory = self.start_tracemalloc()
+        snapshot = None
+        try:
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            duration = time.perf_counter() - start
+            if trace_memory:
+                snapshot = tracemalloc.take_snapshot()
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+                self.tracemalloc_lock.release()
+
+        try:
+            profile_id = self.save(
+                request,
+                response,
+                profiler,
+                snapshot,
+                duration,
+            )
+        except OSError:
+            # a full disk must not fail the request
+            profiling_logger.exception('Cannot save the profile')
+            return response
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, request, response, profiler, snapshot, duration):
+        view_name = get_request_view_name(request)
+        directory = os.path.join(settings.PROFILING_DIR, view_name)
+        os.makedirs(directory, exist_ok=True)
+        # the names sort by time, the random suffix keeps the requests of the
+        # same microsecond in different processes apart
+        name = '{}-{}'.format(
+            utc_now().strftime('%Y%m%dT%H%M%S.%f'),
+            uuid.uuid4().hex[:8],
+        )
+        path = os.path.join(directory, name)
+        profiler.dump_stats(path + '.prof')
+        with open(path + '.txt', 'w') as f:
+            f.write(self.summarize(
+                request,
+                response,
+                view_name,
+                profiler,
+                snapshot,
+                duration,
+            ))
+        self.rotate(directory)
+        return '{}/{}'.format(view_name, name)
+
+    def summarize(
+        self,
+        request,
+        response,
+        view_name,
+        profiler,
+        snapshot,
+        duration,
+    ):
+        top_n = settings.PROFILING_TOP_N
+        out = io.StringIO()
+        out.write('{} {} {} {}\n'.format(
+            view_name,
+            request.method,
+            request.get_full_path(),
+            response.status_code,
+        ))
+        out.write('{:.2f} ms\n\n'.format(duration * 1000))
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats('cumulative').print_stats(top_n)
+        if snapshot is not None:
+            out.write('Top {} allocations by line\n'.format(top_n))
+            for statistic in snapshot.statistics('lineno')[:top_n]:
+                out.write('{}\n'.format(statistic))
+        return out.getvalue()
+
+    def rotate(self, directory):
+        names = sorted({
+            os.path.splitext(filename)[0]
+            for filename in os.listdir(directory)
+        })
+        for name in names[:-settings.PROFILING_MAX_FILES]:
+            for extension in ('.prof', '.txt'):
+                try:
+                    os.remove(os.path.join(directory, name + extension))
+                except FileNotFoundError:
+                    # removed by a concurrent request
+                    pass
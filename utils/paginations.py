@@ -0,0 +1,237 @@
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from utils.time_helpers import (
+    datetime_to_microseconds,
+    microseconds_to_datetime,
+)
+import heapq
+
+
+class CachedRows(object):
+    """
+    The newest rows of a queryset kept in the cache, sorted desc by the
+    cursor fields. EndlessPagination serves a page from them, and reads the
+    queryset only when the page goes past the end of the cached rows.
+    """
+
+    def __init__(self, objects, queryset, is_complete):
+        self.objects = objects
+        self.queryset = queryset
+        # all the rows of the queryset are cached
+        self.is_complete = is_complete
+
+
+class EndlessPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for endless scrolling lists.
+
+    Rows are ordered by (created_at, id) desc and the cursor of a row is
+    built from these two values, so every page is a single index range scan:
+
+    GET /api/newsfeeds/?size=20                 -> the newest page
+    GET /api/newsfeeds/?before=<cursor>&size=20 -> older rows, scroll down
+    GET /api/newsfeeds/?after=<cursor>&size=20  -> newer rows, pull to refresh
+
+    There is no OFFSET, so the cost of a page does not depend on how far the
+    client has scrolled, and rows inserted on top of the list (e.g. by
+    fanout) never shift the rows behind a cursor.
+
+    The rows whose ids are ordered by time (snowflake ids, see
+    utils/snowflake.py) are ordered and paginated by the id alone, the
+    cursor is the id.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'size'
+    cursor_separator = '_'
+    # the rows are sorted by these fields desc, either a datetime and an id
+    # which breaks the ties, or an id alone
+    cursor_fields = ('created_at', 'id')
+    # the rows are sorted asc when False, e.g. the oldest comments first,
+    # ?before= then walks down to the newer rows. Not for CachedRows
+    descending = True
+    # rows with the same value of this field are only returned once when
+    # several querysets are merged into one list
+    unique_field = None
+
+    def __init__(self):
+        self.has_next_page = False
+        self.page = []
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor_values(self, obj):
+        return tuple(getattr(obj, field) for field in self.cursor_fields)
+
+    def encode_cursor(self, obj):
+        values = self.get_cursor_values(obj)
+        if len(values) == 2:
+            values = (datetime_to_microseconds(values[0]), values[1])
+        return self.cursor_separator.join(str(value) for value in values)
+
+    def decode_cursor(self, cursor):
+        try:
+            values = [
+                int(value)
+                for value in cursor.split(self.cursor_separator)
+            ]
+            if len(values) != len(self.cursor_fields):
+                raise ValueError(cursor)
+            if len(values) == 2:
+                values[0] = microseconds_to_datetime(values[0])
+            return tuple(values)
+        except (ValueError, OverflowError):
+            raise ValidationError({'message': 'Invalid cursor.'})
+
+    def get_keyset_filter(self, cursor, lookup):
+        """
+        (field1, field2) < (value1, value2) with lookup='lt', as
+        field1 < value1 OR (field1 = value1 AND field2 < value2).
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.cursor_fields, cursor):
+            condition |= Q(**equal, **{field + '__' + lookup: value})
+            equal[field] = value
+        return condition
+
+    def get_ordering(self, reverse=False):
+        prefix = '-' if self.descending != reverse else ''
+        return [prefix + field for field in self.cursor_fields]
+
+    def slice_queryset(self, queryset, request, page_size):
+        """
+        Return at most page_size + 1 rows of the queryset right next to the
+        cursor, the extra row tells if there is a next page without a COUNT
+        query. The rows are sorted in the list order, or in reverse when
+        ?after= is given.
+        """
+        down, up = ('lt', 'gt') if self.descending else ('gt', 'lt')
+
+        if 'after' in request.query_params:
+            cursor = self.decode_cursor(request.query_params['after'])
+            # walk up from the cursor so that the rows right above it are
+            # returned first
+            queryset = queryset.filter(
+                self.get_keyset_filter(cursor, up),
+            ).order_by(*self.get_ordering(reverse=True))
+            return list(queryset[:page_size + 1])
+
+        if 'before' in request.query_params:
+            cursor = self.decode_cursor(request.query_params['before'])
+            queryset = queryset.filter(self.get_keyset_filter(cursor, down))
+
+        # select * from table
+        # where user_id = xxx and (created_at, id) < (xxx, xxx)
+        # order by created_at desc, id desc
+        # limit page_size + 1
+        #
+        # The order is always the index order of the cursor fields, so the
+        # database stops reading after page_size + 1 rows
+        queryset = queryset.order_by(*self.get_ordering())
+        return list(queryset[:page_size + 1])
+
+    def slice_cached_rows(self, rows, request, page_size):
+        """
+        Same as slice_queryset, but the rows come from the cache when the
+        cached rows cover the page.
+        """
+        objects = rows.objects
+
+        if 'after' in request.query_params:
+            cursor = self.decode_cursor(request.query_params['after'])
+            # every row above the cursor is cached only if the cursor is not
+            # below the oldest cached row
+            if not rows.is_complete and (
+                not objects or self.get_cursor_values(objects[-1]) > cursor
+            ):
+                return self.slice_queryset(rows.queryset, request, page_size)
+            newer_objects = [
+                obj
+                for obj in objects
+                if self.get_cursor_values(obj) > cursor
+            ]
+            newer_objects.reverse()
+            return newer_objects[:page_size + 1]
+
+        if 'before' in request.query_params:
+            cursor = self.decode_cursor(request.query_params['before'])
+            objects = [
+                obj
+                for obj in objects
+                if self.get_cursor_values(obj) < cursor
+            ]
+        if len(objects) > page_size or rows.is_complete:
+            return objects[:page_size + 1]
+        return self.slice_queryset(rows.queryset, request, page_size)
+
+    def slice(self, source, request, page_size):
+        if isinstance(source, CachedRows):
+            return self.slice_cached_rows(source, request, page_size)
+        return self.slice_queryset(source, request, page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request)
+
+    def paginate_querysets(self, querysets, request):
+        """
+        k-way merge several querysets which are sorted by the same cursor
+        fields into one page. Every queryset is read with its own keyset
+        query, so the page behaves as if all the rows were in one table.
+        A queryset can also be given as CachedRows.
+        """
+        page_size = self.get_page_size(request)
+        is_after = 'after' in request.query_params
+
+        objects = heapq.merge(
+            *[
+                self.slice(queryset, request, page_size)
+                for queryset in querysets
+            ],
+            key=self.get_cursor_values,
+            reverse=self.descending != is_after,
+        )
+        objects = self.unique_objects(objects, page_size + 1)
+        self.has_next_page = len(objects) > page_size
+        self.page = objects[:page_size]
+        # the page of ?after= is read bottom-up, flip it to keep the desc order
+        if is_after:
+            self.page.reverse()
+        return self.page
+
+    def unique_objects(self, objects, limit):
+        results = []
+        seen = set()
+        for obj in objects:
+            if len(results) == limit:
+                break
+            if self.unique_field is not None:
+                value = getattr(obj, self.unique_field)
+                if value in seen:
+                    continue
+                seen.add(value)
+            results.append(obj)
+        return results
+
+    def get_paginated_response(self, data, key='results'):
+        return Response({
+            'has_next_page': self.has_next_page,
+            # pass before_cursor as ?before= to load the older rows and
+            # after_cursor as ?after= to load the newer rows
+            'before_cursor': (
+                self.encode_cursor(self.page[-1]) if self.page else None
+            ),
+            'after_cursor': (
+                self.encode_cursor(self.page[0]) if self.page else None
+            ),
+            key: data,
+        })
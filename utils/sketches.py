@@ -0,0 +1,103 @@
+from array import array
+import hashlib
+import heapq
+
+
+class CountMinSketch(object):
+    """
+    Approximate counts of any number of distinct items in a fixed size:
+    depth rows of width counters, an item adds to one counter of every row
+    and its count is the smallest of them. The count is never below the
+    real one, and above it by at most 2 / width of the total with a
+    probability of 1 - 1 / 2 ** depth.
+    """
+
+    def __init__(self, width, depth, counts=None):
+        self.width = width
+        self.depth = depth
+        if counts is None:
+            # 32 bits counters, 4 bytes each
+            counts = array('i', [0]) * (width * depth)
+        self.counts = counts
+
+    def get_indexes(self, item):
+        # the hashes must be the same in every process, hash() is not.
+        # The rows are derived from two hashes (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little')
+        return [
+            row * self.width + (h1 + row * h2) % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, item, count=1):
+        """
+        Add count to the item, return the new estimated count.
+        """
+        estimate = None
+        for index in self.get_indexes(item):
+            self.counts[index] += count
+            if estimate is None or self.counts[index] < estimate:
+                estimate = self.counts[index]
+        return estimate
+
+    def estimate(self, item):
+        return min(self.counts[index] for index in self.get_indexes(item))
+
+    def to_bytes(self):
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, width, depth, data):
+        counts = array('i')
+        counts.frombytes(data)
+        if len(counts) != width * depth:
+            # written with another size, the counts cannot be reused
+            return cls(width, depth)
+        return cls(width, depth, counts)
+
+
+class TopK(object):
+    """
+    The k items with the highest counts seen so far, in a min heap of at
+    most k items: a new item replaces the smallest one when its count is
+    higher. The counts are the ones given to push(), e.g. the estimates of
+    a CountMinSketch.
+    """
+
+    def __init__(self, k, counts=None):
+        self.k = k
+        # item -> count, the heap holds (count, item) of the same items
+        self.counts = {}
+        self.heap = []
+        for item, count in (counts or {}).items():
+            self.push(item, count)
+
+    def push(self, item, count):
+        if item in self.counts:
+            # the count of an item only grows, its heap entry is updated in
+            # place and the heap repaired
+            index = self.heap.index((self.counts[item], item))
+            self.heap[index] = (count, item)
+            heapq.heapify(self.heap)
+            self.counts[item] = count
+            return
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (count, item))
+            self.counts[item] = count
+            return
+        if count <= self.heap[0][0]:
+            return
+        _, evicted = heapq.heapreplace(self.heap, (count, item))
+        del self.counts[evicted]
+        self.counts[item] = count
+
+    def items(self):
+        """
+        [(item, count)], the highest count first.
+        """
+        return [
+            (item, count)
+            for count, item in sorted(self.heap, reverse=True)
+        ]
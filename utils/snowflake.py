@@ -0,0 +1,139 @@
+from datetime import timedelta
+from django.conf import settings
+from utils.time_helpers import EPOCH
+import fcntl
+import os
+import struct
+import threading
+import time
+
+# 1 unused sign bit, 41 bits of milliseconds (69 years), 10 bits of worker id
+# and 12 bits of sequence (4096 ids per millisecond and worker)
+TIMESTAMP_BITS = 41
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+# the last (milliseconds, sequence) handed out on the host
+STATE_FORMAT = 'qq'
+STATE_SIZE = struct.calcsize(STATE_FORMAT)
+
+
+class SnowflakeGenerator(object):
+    """
+    64 bits ids ordered by time, (milliseconds since epoch_ms, worker id,
+    sequence) from the high bits to the low bits: sorting by id sorts by the
+    millisecond the id was made, across all the workers.
+
+    The worker id is unique per host. The processes of a host share the last
+    (milliseconds, sequence) in the state file and take ids under an flock of
+    it, two processes never make the same id. The threads of a process also
+    take a lock, an flock does not exclude the threads sharing the file.
+    """
+
+    def __init__(self, worker_id, state_path, epoch_ms):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError('The worker id must be between 0 and {}.'.format(
+                MAX_WORKER_ID,
+            ))
+        self.worker_id = worker_id
+        self.state_path = state_path
+        self.epoch_ms = epoch_ms
+        self.lock = threading.Lock()
+        self.pid = None
+        self.fd = None
+
+    def get_fd(self):
+        # a forked process shares the open file of its parent, and its flock,
+        # it opens the file again
+        pid = os.getpid()
+        if self.pid != pid:
+            directory = os.path.dirname(self.state_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self.pid = pid
+        return self.fd
+
+    def get_milliseconds(self):
+        return time.time_ns() // 10 ** 6 - self.epoch_ms
+
+    def make_id(self, milliseconds, sequence):
+        return (
+            milliseconds << (WORKER_ID_BITS + SEQUENCE_BITS)
+            | self.worker_id << SEQUENCE_BITS
+            | sequence
+        )
+
+    def next_ids(self, count):
+        """
+        count increasing ids, taken with one flock. The clock never goes
+        back: a clock set back goes on from the last millisecond, and a
+        millisecond out of sequences borrows the next one, the clock catches
+        up with it.
+        """
+        with self.lock:
+            fd = self.get_fd()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(fd, STATE_SIZE, 0)
+                if len(data) == STATE_SIZE:
+                    last_ms, sequence = struct.unpack(STATE_FORMAT, data)
+                else:
+                    last_ms, sequence = -1, MAX_SEQUENCE
+                now_ms = self.get_milliseconds()
+                ids = []
+                for _ in range(count):
+                    if now_ms > last_ms:
+                        last_ms, sequence = now_ms, 0
+                    elif sequence < MAX_SEQUENCE:
+                        sequence += 1
+                    else:
+                        last_ms, sequence = last_ms + 1, 0
+                    ids.append(self.make_id(last_ms, sequence))
+                os.pwrite(fd, struct.pack(STATE_FORMAT, last_ms, sequence), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        return ids
+
+    def get_datetime(self, snowflake_id):
+        """
+        The time an id was made, to the millisecond.
+        """
+        milliseconds = snowflake_id >> (WORKER_ID_BITS + SEQUENCE_BITS)
+        return EPOCH + timedelta(milliseconds=milliseconds + self.epoch_ms)
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = SnowflakeGenerator(
+                    settings.SNOWFLAKE_WORKER_ID,
+                    settings.SNOWFLAKE_STATE_FILE,
+                    settings.SNOWFLAKE_EPOCH_MS,
+                )
+    return _generator
+
+
+def generate_id():
+    """
+    The default of the id of a model which opts in, e.g.
+    id = models.BigIntegerField(primary_key=True, default=generate_id)
+    """
+    return get_generator().next_ids(1)[0]
+
+
+def generate_ids(count):
+    """
+    The ids of the rows of a bulk_create, with one flock instead of one per
+    row.
+    """
+    if count <= 0:
+        return []
+    return get_generator().next_ids(count)
@@ -0,0 +1,607 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import override_settings
+from io import StringIO
+from newsfeeds.models import NewsFeed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from testing.testcases import TestCase, TransactionTestCase
+from tweets.models import Tweet
+from unittest import mock
+from utils.memcached_helper import MemcachedHelper
+from utils.metrics import (
+    REGISTRY,
+    Counter,
+    Histogram,
+    MemoryBackend,
+    MmapBackend,
+    Registry,
+)
+from utils.middlewares import QueryCollector, make_profile_token
+from utils.paginations import EndlessPagination
+from utils.sketches import CountMinSketch, TopK
+from utils.snowflake import MAX_SEQUENCE, SnowflakeGenerator
+from utils.time_helpers import utc_now
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+
+
+class MemcachedHelperTests(TestCase):
+
+    def setUp(self):
+        self.lucky = self.create_user('lucky')
+        self.cosmo = self.create_user('cosmo')
+        self.tweets = [self.create_tweet(self.lucky) for i in range(3)]
+
+    def test_get_objects_through_cache(self):
+        tweet_ids = [tweet.id for tweet in self.tweets]
+        # cache miss, one IN query for all the tweets
+        with self.assertNumQueries(1):
+            tweets = MemcachedHelper.get_objects_through_cache(
+                Tweet,
+                tweet_ids + [-1],
+            )
+        self.assertEqual(set(tweets.keys()), set(tweet_ids))
+
+        # cache hit, no query
+        with self.assertNumQueries(0):
+            tweets = MemcachedHelper.get_objects_through_cache(Tweet, tweet_ids)
+        for tweet in self.tweets:
+            self.assertEqual(tweets[tweet.id], tweet)
+            self.assertEqual(tweets[tweet.id].content, tweet.content)
+            self.assertEqual(tweets[tweet.id].created_at, tweet.created_at)
+        with self.assertNumQueries(0):
+            user = self.tweets[0].cached_user
+        self.assertEqual(user, self.lucky)
+
+    def test_invalidate_object_cache(self):
+        MemcachedHelper.get_object_through_cache(User, self.lucky.id)
+        self.lucky.username = 'lucky_star'
+        self.lucky.save()
+        user = MemcachedHelper.get_object_through_cache(User, self.lucky.id)
+        self.assertEqual(user.username, 'lucky_star')
+
+        tweet = self.tweets[0]
+        MemcachedHelper.get_object_through_cache(Tweet, tweet.id)
+        self.create_like(self.cosmo, tweet)
+        self.create_comment(self.cosmo, tweet)
+        cached_tweet = MemcachedHelper.get_object_through_cache(Tweet, tweet.id)
+        self.assertEqual(cached_tweet.likes_count, 1)
+        self.assertEqual(cached_tweet.comments_count, 1)
+
+        tweet.delete()
+        self.assertEqual(
+            MemcachedHelper.get_object_through_cache(Tweet, tweet.id),
+            None,
+        )
+
+
+class MemcachedHelperCommitTests(TransactionTestCase):
+
+    def test_invalidate_after_commit(self):
+        lucky = self.create_user('lucky')
+        tweet = self.create_tweet(lucky)
+        with transaction.atomic():
+            self.create_like(lucky, tweet)
+            # a read before the commit caches the tweet again
+            MemcachedHelper.get_object_through_cache(Tweet, tweet.id)
+            self.assertNotEqual(
+                cache.get(MemcachedHelper.get_key(Tweet, tweet.id)),
+                None,
+            )
+        # deleted again after the commit
+        self.assertEqual(
+            cache.get(MemcachedHelper.get_key(Tweet, tweet.id)),
+            None,
+        )
+
+
+class EndlessPaginationTests(TestCase):
+
+    def test_ties_are_broken_by_the_cursor_id(self):
+        # newsfeeds of the same time, their ids are in the reverse order of
+        # their tweet ids
+        lucky = self.create_user('lucky')
+        tweets = [self.create_tweet(lucky) for i in range(4)]
+        created_at = utc_now()
+        for newsfeed_id, tweet in zip(range(40, 0, -10), tweets):
+            NewsFeed.objects.create(
+                id=newsfeed_id,
+                user=lucky,
+                tweet=tweet,
+                created_at=created_at,
+            )
+
+        class TimePagination(EndlessPagination):
+            cursor_fields = ('created_at', 'tweet_id')
+
+        def paginate(params):
+            paginator = TimePagination()
+            request = Request(APIRequestFactory().get('/', params))
+            page = paginator.paginate_queryset(NewsFeed.objects.all(), request)
+            return paginator, [newsfeed.tweet_id for newsfeed in page]
+
+        tweet_ids = [tweet.id for tweet in reversed(tweets)]
+        paginator, page = paginate({'size': 2})
+        self.assertEqual(page, tweet_ids[:2])
+        _, page = paginate({
+            'size': 2,
+            'before': paginator.encode_cursor(paginator.page[-1]),
+        })
+        self.assertEqual(page, tweet_ids[2:])
+        _, page = paginate({
+            'size': 1,
+            'after': paginator.encode_cursor(paginator.page[-1]),
+        })
+        self.assertEqual(page, tweet_ids[:1])
+
+
+class SQLInstrumentationMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.lucky, self.lucky_client = self.create_user_and_client('lucky')
+        self.create_tweet(self.lucky)
+
+    @override_settings(SQL_INSTRUMENTATION_HEADERS=True)
+    def test_headers(self):
+        response = self.lucky_client.get(
+            '/api/tweets/',
+            {'user_id': self.lucky.id},
+        )
+        self.assertEqual(response['X-DB-View'], 'TweetViewSet.list')
+        self.assertEqual(int(response['X-DB-Query-Count']) > 0, True)
+        self.assertEqual(float(response['X-DB-Time-Ms']) >= 0, True)
+
+        # the action of a POST
+        response = self.lucky_client.post('/api/tweets/', {
+            'content': 'hello world',
+        })
+        self.assertEqual(response['X-DB-View'], 'TweetViewSet.create')
+
+        # the extra actions of a viewset
+        response = self.lucky_client.get('/api/notifications/unread-count/')
+        self.assertEqual(
+            response['X-DB-View'],
+            'NotificationViewSet.unread_count',
+        )
+
+    def test_headers_are_opt_in(self):
+        response = self.lucky_client.get(
+            '/api/tweets/',
+            {'user_id': self.lucky.id},
+        )
+        self.assertEqual(response.has_header('X-DB-Query-Count'), False)
+
+    def test_log(self):
+        statements = []
+
+        def record_statement(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record_statement):
+            with self.assertLogs('twitter.sql', level='INFO') as logs:
+                self.lucky_client.get(
+                    '/api/tweets/',
+                    {'user_id': self.lucky.id},
+                )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'TweetViewSet.list')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['query_count'], len(statements))
+        # which statement is the slowest depends on the timing, see
+        # test_slowest_query, but it is one of the request
+        self.assertIn(record['slowest_query'], statements)
+        self.assertLessEqual(record['slowest_query_ms'], record['db_time_ms'])
+
+    def test_slowest_query(self):
+        # a clock which only moves when a statement runs
+        durations = {'SELECT 1': 0.002, 'SELECT 2': 0.005, 'SELECT 3': 0.001}
+        clock = [0.0]
+
+        def execute(sql, params, many, context):
+            clock[0] += durations[sql]
+
+        collector = QueryCollector()
+        perf_counter = mock.patch(
+            'utils.middlewares.time.perf_counter',
+            lambda: clock[0],
+        )
+        with perf_counter:
+            for sql in durations:
+                collector(execute, sql, None, False, None)
+        self.assertEqual(collector.count, 3)
+        self.assertAlmostEqual(collector.duration, 0.008)
+        self.assertEqual(collector.slowest_sql, 'SELECT 2')
+        self.assertAlmostEqual(collector.slowest_duration, 0.005)
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.lucky, self.lucky_client = self.create_user_and_client('lucky')
+        self.tweet = self.create_tweet(self.lucky)
+        self.url = '/api/tweets/{}/'.format(self.tweet.id)
+        self.profiling_dir = tempfile.mkdtemp()
+
+    def get(self, **extra):
+        with override_settings(PROFILING_DIR=self.profiling_dir):
+            return self.lucky_client.get(self.url, **extra)
+
+    def test_not_sampled(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.has_header('X-Profile-Id'), False)
+        self.assertEqual(os.listdir(self.profiling_dir), [])
+
+        # an invalid token
+        response = self.get(HTTP_X_PROFILE='profile:forged:signature')
+        self.assertEqual(response.has_header('X-Profile-Id'), False)
+
+    def test_profile_token(self):
+        out = StringIO()
+        call_command('profile_token', stdout=out)
+        response = self.get(HTTP_X_PROFILE=out.getvalue().strip())
+        self.assertEqual(response.status_code, 200)
+
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(profile_id.startswith('TweetViewSet.retrieve/'), True)
+        path = os.path.join(self.profiling_dir, profile_id)
+        self.assertEqual(os.path.exists(path + '.prof'), True)
+        with open(path + '.txt') as f:
+            summary = f.read()
+        self.assertEqual(
+            summary.startswith('TweetViewSet.retrieve GET ' + self.url),
+            True,
+        )
+        self.assertEqual('function calls' in summary, True)
+
+        # the token expires
+        with override_settings(PROFILING_TOKEN_MAX_AGE=-1):
+            response = self.get(HTTP_X_PROFILE=make_profile_token())
+        self.assertEqual(response.has_header('X-Profile-Id'), False)
+
+    @override_settings(
+        PROFILING_SAMPLE_RATE=0.5,
+        PROFILING_TRACEMALLOC=True,
+        PROFILING_MAX_FILES=2,
+    )
+    def test_sampling_and_rotation(self):
+        with mock.patch('utils.middlewares.random.random', return_value=0.7):
+            response = self.get()
+        self.assertEqual(response.has_header('X-Profile-Id'), False)
+
+        profile_ids = []
+        with mock.patch('utils.middlewares.random.random', return_value=0.3):
+            for _ in range(3):
+                profile_ids.append(self.get()['X-Profile-Id'])
+        with open(os.path.join(
+            self.profiling_dir,
+            profile_ids[-1] + '.txt',
+        )) as f:
+            self.assertEqual('allocations' in f.read(), True)
+
+        # only the newest 2 profiles are kept
+        directory = os.path.join(self.profiling_dir, 'TweetViewSet.retrieve')
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            sorted(
+                os.path.basename(profile_id) + extension
+                for profile_id in profile_ids[1:]
+                for extension in ('.prof', '.txt')
+            ),
+        )
+
+
+def inc_in_process(backend, counter_name, times):
+    registry = Registry()
+    registry.set_backend(backend)
+    counter = Counter(counter_name, 'test', registry=registry)
+    for _ in range(times):
+        counter.inc()
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.registry.set_backend(MemoryBackend())
+
+    def test_render(self):
+        counter = Counter(
+            'jobs_total',
+            'Jobs.',
+            ('name',),
+            registry=self.registry,
+        )
+        counter.inc(name='fanout')
+        counter.inc(2, name='say "hi"')
+        with self.assertRaises(ValueError):
+            counter.inc(other='label')
+        with self.assertRaises(ValueError):
+            counter.inc(-1, name='fanout')
+
+        histogram = Histogram(
+            'latency_seconds',
+            'Latency.',
+            buckets=(0.1, 1),
+            registry=self.registry,
+        )
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual(self.registry.render(), '\n'.join([
+            '# HELP jobs_total Jobs.',
+            '# TYPE jobs_total counter',
+            'jobs_total{name="fanout"} 1',
+            'jobs_total{name="say \\"hi\\""} 2',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.55',
+            'latency_seconds_count 3',
+        ]) + '\n')
+
+    def test_mmap_backend(self):
+        directory = tempfile.mkdtemp()
+        backend = MmapBackend(directory)
+        self.registry.set_backend(backend)
+        counter = Counter(
+            'requests_total',
+            'Requests.',
+            ('view',),
+            registry=self.registry,
+        )
+
+        # threads of the same process
+        def inc():
+            for _ in range(1000):
+                counter.inc(view='TweetViewSet.list')
+
+        threads = [threading.Thread(target=inc) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # more keys than the initial size of the file
+        for i in range(3000):
+            counter.inc(view='view_{}'.format(i))
+
+        # forked processes write their own files, like gunicorn workers
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(
+                target=inc_in_process,
+                args=(backend, 'requests_total', 100),
+            )
+            for _ in range(2)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(len(os.listdir(directory)), 3)
+
+        text = self.registry.render()
+        self.assertEqual(
+            'requests_total{view="TweetViewSet.list"} 4000' in text,
+            True,
+        )
+        self.assertEqual('requests_total{view="view_2999"} 1' in text, True)
+        self.assertEqual('requests_total 200' in text, True)
+
+    def test_metrics_endpoint(self):
+        REGISTRY.set_backend(MemoryBackend())
+        self.addCleanup(REGISTRY.set_backend, None)
+        lucky, lucky_client = self.create_user_and_client('lucky')
+        cosmo, cosmo_client = self.create_user_and_client('cosmo')
+        cosmo_client.post('/api/friendships/{}/follow/'.format(lucky.id))
+        lucky_client.post('/api/tweets/', {'content': 'hello world'})
+        tweet = Tweet.objects.get(user=lucky)
+        cosmo_client.post('/api/likes/', {
+            'content_type': 'tweet',
+            'object_id': tweet.id,
+        })
+        cosmo_client.get('/api/newsfeeds/')
+        cosmo_client.get('/api/newsfeeds/')
+
+        # the metrics are not public
+        response = self.anonymous_client.get('/metrics')
+        self.assertEqual(response.status_code, 403)
+        response = cosmo_client.get('/metrics')
+        self.assertEqual(response.status_code, 403)
+        # a staff user logged in through the admin
+        User.objects.filter(id=lucky.id).update(is_staff=True)
+        lucky_client.force_login(lucky)
+        response = lucky_client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        with override_settings(METRICS_TOKEN='secret'):
+            response = self.anonymous_client.get(
+                '/metrics',
+                HTTP_AUTHORIZATION='Bearer wrong',
+            )
+            self.assertEqual(response.status_code, 403)
+            response = self.anonymous_client.get(
+                '/metrics',
+                HTTP_AUTHORIZATION='Bearer secret',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Type'].startswith('text/plain'),
+            True,
+        )
+        text = response.content.decode()
+        for line in [
+            'http_requests_total{method="GET",status="200",'
+            'view="NewsFeedViewSet.list"} 2',
+            'http_requests_total{method="POST",status="201",'
+            'view="TweetViewSet.create"} 1',
+            'http_request_duration_seconds_count{method="GET",'
+            'view="NewsFeedViewSet.list"} 2',
+            'http_request_db_seconds_count{method="GET",'
+            'view="NewsFeedViewSet.list"} 2',
+            'http_response_size_bytes_count{method="GET",'
+            'view="NewsFeedViewSet.list"} 2',
+            'newsfeeds_fanout_rows_total 1',
+            'notifications_sent_total{result="created"} 1',
+            'cache_requests_total{cache="newsfeeds",result="hit"} 1',
+            'cache_requests_total{cache="newsfeeds",result="miss"} 1',
+        ]:
+            self.assertEqual(line in text, True, line)
+
+
+class SketchTests(TestCase):
+
+    def test_count_min_sketch(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        counts = {'tag{}'.format(i): i % 7 + 1 for i in range(200)}
+        for item, count in counts.items():
+            self.assertGreaterEqual(sketch.add(item, count), count)
+        # never below the real count
+        for item, count in counts.items():
+            self.assertGreaterEqual(sketch.estimate(item), count)
+
+        small = CountMinSketch(width=1024, depth=4)
+        small.add('django', 3)
+        small.add('python')
+        self.assertEqual(small.estimate('django'), 3)
+        self.assertEqual(small.estimate('python'), 1)
+        self.assertEqual(small.estimate('flask'), 0)
+
+        # the indexes do not depend on the process, the sketch can be shared
+        restored = CountMinSketch.from_bytes(1024, 4, small.to_bytes())
+        self.assertEqual(restored.estimate('django'), 3)
+        self.assertEqual(len(small.to_bytes()), 1024 * 4 * 4)
+        # written with another size
+        resized = CountMinSketch.from_bytes(512, 4, small.to_bytes())
+        self.assertEqual(resized.estimate('django'), 0)
+
+    def test_top_k(self):
+        top = TopK(3)
+        for item, count in [('a', 1), ('b', 5), ('c', 2), ('d', 3)]:
+            top.push(item, count)
+        # a had the lowest count
+        self.assertEqual(top.items(), [('b', 5), ('d', 3), ('c', 2)])
+        # too low to get in
+        top.push('e', 1)
+        self.assertEqual(top.items(), [('b', 5), ('d', 3), ('c', 2)])
+        # the count of an item already in is updated
+        top.push('c', 6)
+        self.assertEqual(top.items(), [('c', 6), ('b', 5), ('d', 3)])
+        top.push('a', 4)
+        self.assertEqual(top.items(), [('c', 6), ('b', 5), ('a', 4)])
+        self.assertEqual(top.counts, {'c': 6, 'b': 5, 'a': 4})
+        self.assertEqual(len(top.heap), 3)
+
+        restored = TopK(3, top.counts)
+        self.assertEqual(restored.items(), top.items())
+
+
+def make_ids_in_process(generator, count, path):
+    with open(path, 'w') as f:
+        for _ in range(count):
+            f.write('{}\n'.format(generator.next_ids(1)[0]))
+
+
+class SnowflakeTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generator = self.create_generator(worker_id=3)
+
+    def create_generator(self, worker_id):
+        return SnowflakeGenerator(
+            worker_id,
+            os.path.join(self.directory, 'snowflake.state'),
+            settings.SNOWFLAKE_EPOCH_MS,
+        )
+
+    def test_next_ids(self):
+        before = utc_now()
+        ids = self.generator.next_ids(10000)
+        # increasing, more ids than one millisecond holds
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(len(ids), 10000)
+        self.assertEqual(ids[0] >> 12 & 1023, 3)
+        self.assertEqual(ids[-1] < 2 ** 63, True)
+        created_at = self.generator.get_datetime(ids[0])
+        self.assertEqual(
+            abs((created_at - before).total_seconds()) < 1,
+            True,
+        )
+        # the next call goes on after the last id
+        self.assertEqual(self.generator.next_ids(1)[0] > ids[-1], True)
+
+        with self.assertRaises(ValueError):
+            self.create_generator(worker_id=1024)
+
+    def test_clock_set_back(self):
+        now_ms = self.generator.get_milliseconds()
+        with mock.patch.object(
+            self.generator,
+            'get_milliseconds',
+            return_value=now_ms,
+        ):
+            first = self.generator.next_ids(MAX_SEQUENCE + 2)
+        # the clock goes back by a second
+        with mock.patch.object(
+            self.generator,
+            'get_milliseconds',
+            return_value=now_ms - 1000,
+        ):
+            second = self.generator.next_ids(2)
+        ids = first + second
+        self.assertEqual(ids, sorted(set(ids)))
+        # the millisecond out of sequences borrowed the next one
+        self.assertEqual(first[-1] >> 22, now_ms + 1)
+        self.assertEqual(second[-1] >> 22, now_ms + 1)
+
+    def test_processes_share_the_state(self):
+        # two generators of the same host, e.g. two gunicorn workers, and
+        # forked processes never make the same id
+        other = self.create_generator(worker_id=3)
+        ids = self.generator.next_ids(100) + other.next_ids(100)
+
+        threads = [
+            threading.Thread(
+                target=lambda: ids.extend(self.generator.next_ids(500)),
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        context = multiprocessing.get_context('fork')
+        paths = [
+            os.path.join(self.directory, 'ids_{}'.format(i))
+            for i in range(3)
+        ]
+        processes = [
+            context.Process(
+                target=make_ids_in_process,
+                args=(self.generator, 2000, path),
+            )
+            for path in paths
+        ]
+        for process in processes:
+            process.start()
+        ids.extend(self.generator.next_ids(2000))
+        for process in processes:
+            process.join()
+        for path in paths:
+            with open(path) as f:
+                ids.extend(int(line) for line in f)
+
+        self.assertEqual(len(ids), 200 + 4 * 500 + 2000 + 3 * 2000)
+        self.assertEqual(len(set(ids)), len(ids))
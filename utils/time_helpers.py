@@ -1,5 +1,18 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+
 def utc_now():
-    return datetime.now(tz=pytz.utc)
\ No newline at end of file
+    return datetime.now(tz=pytz.utc)
+
+
+def datetime_to_microseconds(value):
+    # exact integer arithmetic, float timestamps lose the microseconds
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def microseconds_to_datetime(microseconds):
+    return EPOCH + timedelta(microseconds=microseconds)
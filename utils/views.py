@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from utils.metrics import CONTENT_TYPE, REGISTRY
+import hmac
+
+
+def can_read_metrics(request):
+    # Prometheus sends METRICS_TOKEN as a bearer token, staff users can read
+    # the metrics from a browser
+    if request.user.is_staff:
+        return True
+    if not settings.METRICS_TOKEN:
+        return False
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(
+        authorization.encode(),
+        'Bearer {}'.format(settings.METRICS_TOKEN).encode(),
+    )
+
+
+def metrics(request):
+    # scraped by Prometheus
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)